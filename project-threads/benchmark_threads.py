@@ -0,0 +1,847 @@
+import argparse
+import asyncio
+import glob
+import os
+import tempfile
+import json
+import random
+import re
+import subprocess
+import sys
+import threading
+import time
+import warnings
+from html.parser import HTMLParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import threads_parser
+import scroll_scheduler
+import text_only_mode
+import grab_data_threads
+import grab_data_threads_no_login
+import threads_session
+from threads_common import JsonlSink, Post, PostDeduper, iter_jsonl, normalize_post
+
+# Threads 解析效能測試
+# 預設讀取爬蟲存下的 *_threads_debug.html；沒有的話就產生一個模擬的頁面
+
+
+def legacy_extract_posts_from_page_source(page_source):
+    """
+    舊版 (多次 regex 掃描) 的實作，作為比較基準
+    """
+    posts_data = []
+    
+    # 尋找各種可能的 JSON 資料格式
+    patterns = [
+        r'__NEXT_DATA__\s*=\s*({.+?});',
+        r'window\.__initialData__\s*=\s*({.+?});',
+        r'"thread_items":\s*(\[.+?\])',
+    ]
+    
+    for pattern in patterns:
+        matches = re.finditer(pattern, page_source, re.DOTALL)
+        for match in matches:
+            try:
+                json_str = match.group(1)
+                data = json.loads(json_str)
+                posts = legacy_extract_posts_from_json(data)
+                if posts:
+                    posts_data.extend(posts)
+            except:
+                continue
+    
+    # 更積極地尋找所有包含 "text" 的 JSON 物件
+    # 尋找所有可能的貼文文字
+    text_pattern = r'"text"\s*:\s*"((?:[^"\\]|\\.)+)"'
+    text_matches = re.finditer(text_pattern, page_source)
+    for match in text_matches:
+        try:
+            text = match.group(1)
+            # 解碼 Unicode 轉義序列，處理錯誤
+            try:
+                text = text.encode('utf-8').decode('unicode_escape')
+            except:
+                # 如果解碼失敗，嘗試其他方法
+                try:
+                    text = text.encode('latin-1').decode('utf-8', errors='ignore')
+                except:
+                    pass
+            
+            # 清理代理對（surrogate pairs）問題
+            text = text.encode('utf-8', errors='ignore').decode('utf-8', errors='ignore')
+            
+            # 過濾太短或明顯不是貼文的文字
+            if len(text) > 15 and not text.startswith('http') and 'text' not in text.lower()[:10]:
+                posts_data.append({
+                    'text': text,
+                    'id': None,
+                    'like_count': None,
+                    'reply_count': None,
+                    'timestamp': None
+                })
+        except:
+            continue
+    
+    # 去重（基於文字內容）
+    seen = set()
+    unique_posts = []
+    for post in posts_data:
+        text = post.get('text', '').strip()
+        # 使用文字的前 100 個字符作為唯一標識
+        text_key = text[:100] if len(text) > 100 else text
+        if text and text_key not in seen and len(text) > 15:
+            seen.add(text_key)
+            unique_posts.append(post)
+    
+    return unique_posts
+
+
+def legacy_extract_posts_from_json(data, posts_data=None):
+    if posts_data is None:
+        posts_data = []
+    
+    if isinstance(data, dict):
+        if 'text' in data or ('caption' in data and isinstance(data.get('caption'), dict) and 'text' in data.get('caption')):
+            text = data.get('text') or (data.get('caption', {}).get('text', '') if isinstance(data.get('caption'), dict) else '')
+            if text and len(text) > 20:
+                post = {
+                    'id': data.get('id') or data.get('pk'),
+                    'text': text,
+                    'like_count': data.get('like_count') or data.get('num_likes'),
+                    'reply_count': data.get('reply_count') or data.get('num_replies'),
+                    'timestamp': data.get('taken_at') or data.get('created_at')
+                }
+                posts_data.append(post)
+        
+        for value in data.values():
+            legacy_extract_posts_from_json(value, posts_data)
+    
+    elif isinstance(data, list):
+        for item in data:
+            legacy_extract_posts_from_json(item, posts_data)
+    
+    return posts_data
+
+
+def make_synthetic_page(size_mb, seed=0):
+    """
+    產生模擬 Threads 頁面：大量 JS 程式碼 + 內嵌 application/json 的貼文資料
+    """
+    rng = random.Random(seed)
+    words = ['threads', 'instagram', '今天', '分享', 'photo', 'video', '好看', 'new', 'story', '🎉']
+    parts = ['<html><head>']
+    size = 0
+    post_id = 0
+    while size < size_mb * 1024 * 1024:
+        items = []
+        for _ in range(20):
+            post_id += 1
+            text = ' '.join(rng.choice(words) for _ in range(rng.randint(5, 30)))
+            # 真實的回應裡，每則貼文旁邊還有大量跟文字無關的子樹 (使用者、圖片版本...)
+            user = {'pk': str(rng.randint(1, 10**9)), 'username': 'instagram', 'is_verified': True,
+                    'friendship_status': {'following': False, 'blocking': False}}
+            images = {'candidates': [{'url': f'https://cdn.example/{post_id}_{w}.jpg', 'width': w, 'height': w}
+                                     for w in (150, 320, 640, 1080)]}
+            items.append({'post': {'pk': str(post_id), 'caption': {'text': text}, 'user': user,
+                                   'image_versions2': images, 'like_count': rng.randint(0, 9999),
+                                   'taken_at': 1700000000 + post_id}})
+        payload = json.dumps({'data': {'thread_items': items}}, ensure_ascii=False)
+        script = 'function f(a){return a.map(function(x){return x*2})};' * 50
+        chunk = f'<script>{script}</script><script type="application/json" data-sjs>{payload}</script>'
+        parts.append(chunk)
+        size += len(chunk.encode('utf-8'))
+    parts.append('</head><body></body></html>')
+    return ''.join(parts)
+
+
+def timed(func, *args, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def bench_page_source(pages):
+    print("== extract_posts_from_page_source: 單次掃描 vs 舊版 regex ==")
+    for name, page_source in pages:
+        size_mb = len(page_source.encode('utf-8')) / 1024 / 1024
+        new_posts, t_new = timed(threads_parser.extract_posts_from_page_source, page_source)
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            old_posts, t_old = timed(legacy_extract_posts_from_page_source, page_source)
+        print(f"{name} ({size_mb:.1f} MB)")
+        print(f"  單次掃描 {size_mb / t_new:8.1f} MB/s  {len(new_posts)} 則貼文")
+        print(f"  舊版     {size_mb / t_old:8.1f} MB/s  {len(old_posts)} 則貼文")
+
+
+def recursive_extract_posts_from_json(data, posts_data=None):
+    """
+    改成迭代版之前的遞迴實作，作為比較基準
+    """
+    if posts_data is None:
+        posts_data = []
+
+    if isinstance(data, dict):
+        if 'text' in data or ('caption' in data and isinstance(data.get('caption'), dict) and 'text' in data.get('caption')):
+            text = data.get('text') or (data.get('caption', {}).get('text', '') if isinstance(data.get('caption'), dict) else '')
+            if text and isinstance(text, str):
+                post = {
+                    'id': data.get('id') or data.get('pk'),
+                    'text': text,
+                    'like_count': data.get('like_count') or data.get('num_likes'),
+                    'reply_count': data.get('reply_count') or data.get('num_replies'),
+                    'timestamp': data.get('taken_at') or data.get('created_at')
+                }
+                posts_data.append(post)
+
+        for value in data.values():
+            recursive_extract_posts_from_json(value, posts_data)
+
+    elif isinstance(data, list):
+        for item in data:
+            recursive_extract_posts_from_json(item, posts_data)
+
+    return posts_data
+
+
+def bench_json_extract(pages):
+    print("== extract_posts_from_json: 遞迴 vs 迭代 vs 路徑索引 ==")
+    for name, page_source in pages:
+        payloads = [value for kind, value in threads_parser.iter_json_payloads(page_source) if kind != 'text']
+        if not payloads:
+            print(f"{name}: 沒有內嵌 JSON 資料")
+            continue
+
+        run = lambda extract: [post for payload in payloads for post in extract(payload)]
+        old_posts, t_old = timed(run, recursive_extract_posts_from_json)
+        new_posts, t_new = timed(run, threads_parser.extract_posts_from_json)
+
+        # 用第一個 payload 學習貼文路徑，再套用到整個頁面
+        index = threads_parser.compile_post_paths(threads_parser.learn_post_paths(payloads[0]))
+        indexed_posts, t_indexed = timed(run, lambda payload: threads_parser.extract_posts_from_json(payload, index=index))
+
+        print(f"{name} ({len(payloads)} 個 payload)")
+        print(f"  遞迴     {t_old * 1000:8.1f} ms  {len(old_posts)} 則")
+        print(f"  迭代     {t_new * 1000:8.1f} ms  {len(new_posts)} 則  結果相同={new_posts == old_posts}")
+        print(f"  路徑索引 {t_indexed * 1000:8.1f} ms  {len(indexed_posts)} 則  結果相同={indexed_posts == old_posts}")
+
+    # 深層巢狀：遞迴版會超過遞迴上限，迭代版不受影響
+    deep = {'caption': {'text': '在很深的地方的一則貼文，測試遞迴上限'}}
+    for _ in range(50000):
+        deep = {'items': [deep]}
+    try:
+        recursive_extract_posts_from_json(deep)
+        recursive_result = 'OK'
+    except RecursionError:
+        recursive_result = 'RecursionError'
+    print(f"50000 層巢狀: 遞迴 {recursive_result}，迭代找到 {len(threads_parser.extract_posts_from_json(deep))} 則")
+
+
+# 模擬無限滾動的本機頁面：捲到底時向 /posts 要下一批，伺服器延遲 delay 秒才回應
+INFINITE_SCROLL_PAGE = """<!doctype html>
+<html><head><meta charset="utf-8"><style>article { height: 300px; }</style></head>
+<body><script>
+let offset = 0, loading = false, done = false;
+async function load() {
+    if (loading || done) return;
+    loading = true;
+    const response = await fetch('/posts' + location.search + '&offset=' + offset);
+    const texts = await response.json();
+    for (const text of texts) {
+        const article = document.createElement('article');
+        article.innerText = text;
+        document.body.appendChild(article);
+    }
+    offset += texts.length;
+    done = texts.length === 0;
+    loading = false;
+}
+window.addEventListener('scroll', () => {
+    if (innerHeight + scrollY >= document.body.scrollHeight - 10) load();
+});
+load();
+</script></body></html>
+"""
+
+
+class InfiniteScrollHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path != '/posts':
+            body = INFINITE_SCROLL_PAGE.encode('utf-8')
+            content_type = 'text/html; charset=utf-8'
+        else:
+            query = {key: values[0] for key, values in parse_qs(url.query).items()}
+            time.sleep(float(query.get('delay', 0.3)))
+            offset, batch, total = (int(query.get(key, default)) for key, default in
+                                    (('offset', 0), ('batch', 10), ('total', 50)))
+            texts = [f"第 {i} 則模擬貼文，用來測試滾動等待時間" for i in range(offset, min(offset + batch, total))]
+            body = json.dumps(texts, ensure_ascii=False).encode('utf-8')
+            content_type = 'application/json'
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def fixed_scroll(page, scroll_count, wait=3):
+    """
+    改成自適應之前的做法：一開始等 3 秒，之後每次滾動固定等 3 秒
+    """
+    time.sleep(wait)
+    for _ in range(scroll_count):
+        page.evaluate(scroll_scheduler.SCROLL_JS)
+        time.sleep(wait)
+
+
+def bench_scroll(delays, total, batch):
+    from playwright.sync_api import sync_playwright
+
+    print("== 滾動等待: 固定 sleep vs 自適應 ==")
+    server = ThreadingHTTPServer(('127.0.0.1', 0), InfiniteScrollHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}/"
+    scroll_count = -(-total // batch)
+    count_js = "() => document.querySelectorAll('article').length"
+
+    with sync_playwright() as p:
+        browser = p.chromium.launch(headless=True)
+        for delay in delays:
+            url = f"{base_url}?delay={delay}&batch={batch}&total={total}"
+
+            page = browser.new_page()
+            page.goto(url, wait_until='domcontentloaded')
+            start = time.perf_counter()
+            fixed_scroll(page, scroll_count)
+            t_fixed = time.perf_counter() - start
+            fixed_count = page.evaluate(count_js)
+            page.close()
+
+            page = browser.new_page()
+            page.goto(url, wait_until='domcontentloaded')
+            stats = scroll_scheduler.adaptive_scroll(
+                probe=lambda: page.evaluate(scroll_scheduler.PROBE_JS, 'article'),
+                scroll=lambda: page.evaluate(scroll_scheduler.SCROLL_JS),
+                max_scrolls=scroll_count * 2,
+            )
+            adaptive_count = page.evaluate(count_js)
+            page.close()
+
+            print(f"延遲 {delay:.2f}s ({total} 則，每批 {batch} 則)")
+            print(f"  固定 sleep {t_fixed:6.1f} s  {fixed_count} 則")
+            print(f"  自適應     {stats['elapsed']:6.1f} s  {adaptive_count} 則  {scroll_scheduler.format_stats(stats)}")
+        browser.close()
+    server.shutdown()
+
+
+# 模擬錄下來的 Threads 頁面：每則貼文附一張圖片，另有 CSS、字型、動畫與第三方追蹤腳本
+# 追蹤腳本從 localhost 載入 (頁面本身在 127.0.0.1)，當作第三方網域
+HEAVY_ASSETS = {
+    '/image.jpg': ('image/jpeg', 80 * 1024),
+    '/style.css': ('text/css', 40 * 1024),
+    '/font.woff2': ('font/woff2', 60 * 1024),
+    '/tracker.js': ('application/javascript', 30 * 1024),
+}
+
+
+def make_heavy_page(post_count, tracker_port):
+    parts = ['<!doctype html><html><head><meta charset="utf-8">',
+             '<link rel="stylesheet" href="/style.css">',
+             '<style>@font-face { font-family: f; src: url(/font.woff2); } body { font-family: f; }',
+             '@keyframes spin { to { transform: rotate(360deg); } } img { animation: spin 2s infinite; }</style>',
+             f'<script src="http://localhost:{tracker_port}/tracker.js"></script></head><body>']
+    for i in range(post_count):
+        parts.append(f'<article>第 {i} 則模擬貼文，測試只抓文字模式 <img src="/image.jpg?{i}"></article>')
+    parts.append('</body></html>')
+    return ''.join(parts)
+
+
+def make_heavy_handler(post_count):
+    class HeavyPageHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            path = urlparse(self.path).path
+            if path in HEAVY_ASSETS:
+                content_type, size = HEAVY_ASSETS[path]
+                body = b'/' * size if path.endswith(('.css', '.js')) else bytes(size)
+            else:
+                content_type = 'text/html; charset=utf-8'
+                body = make_heavy_page(post_count, self.server.server_address[1]).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return HeavyPageHandler
+
+
+def bench_text_only(post_count, repeat=3):
+    from playwright.sync_api import sync_playwright
+
+    print("== 只抓文字模式: 傳輸量與載入時間 ==")
+    server = ThreadingHTTPServer(('127.0.0.1', 0), make_heavy_handler(post_count))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/"
+
+    with sync_playwright() as p:
+        browser = p.chromium.launch(headless=True)
+        for text_only in (False, True):
+            best = None
+            for _ in range(repeat):
+                context = browser.new_context(**(text_only_mode.CONTEXT_OPTIONS if text_only else {}))
+                page = context.new_page()
+                traffic = text_only_mode.new_traffic()
+                text_only_mode.track_traffic(page, traffic)
+                if text_only:
+                    text_only_mode.install_text_only(page, traffic, tracker_hosts=('localhost',))
+                start = time.perf_counter()
+                page.goto(url, wait_until='load')
+                elapsed = time.perf_counter() - start
+                posts = page.evaluate("() => document.querySelectorAll('article').length")
+                # 模擬頁面的圖片有 spin 動畫，關閉動畫後 animationName 會是 none
+                animation = page.evaluate("() => getComputedStyle(document.querySelector('img')).animationName")
+                context.close()
+                if best is None or elapsed < best[0]:
+                    best = (elapsed, traffic, posts, animation)
+            elapsed, traffic, posts, animation = best
+            label = '只抓文字' if text_only else '完整載入'
+            print(f"  {label} {elapsed * 1000:8.1f} ms  {posts} 則  {text_only_mode.format_traffic(traffic)}  "
+                  f"動畫: {animation}")
+        browser.close()
+    server.shutdown()
+
+
+class FakeThreadsAPI:
+    """
+    模擬 ThreadsAPI：每次呼叫等待 latency 秒，每個帳號有 pages 頁貼文，用 next_max_id 翻頁
+    """
+    def __init__(self, latency=0.2, pages=5, page_size=10):
+        self.latency = latency
+        self.pages = pages
+        self.page_size = page_size
+        self.calls = {'user_id': 0, 'threads': 0}
+
+    async def get_user_id_from_username(self, username):
+        self.calls['user_id'] += 1
+        await asyncio.sleep(self.latency)
+        return sum(map(ord, username)) * 1000 + len(username)
+
+    async def get_user_threads(self, user_id, count=10, max_id=None):
+        self.calls['threads'] += 1
+        await asyncio.sleep(self.latency)
+        page = int(max_id or 0)
+        # 每則貼文用不同的隨機字，避免被當成近似重複
+        rng = random.Random(f"{user_id}_{page}")
+        threads = [{'thread_items': [{'post': {
+            'id': f"{user_id}_{page}_{i}", 'caption': {'text': ''.join(chr(rng.randint(0x4e00, 0x9fa5)) for _ in range(20))},
+            'like_count': i, 'reply_count': 0, 'taken_at': 1700000000 + page * 100 + i}}]}
+            for i in range(self.page_size)]
+        return {'threads': threads, 'next_max_id': str(page + 1) if page + 1 < self.pages else None}
+
+
+class PagedThreadsAPI:
+    """
+    依 pages 回傳固定內容的模擬 ThreadsAPI：pages 是每頁 (id, 文字) 列表 (文字 None 代表只有圖片)，
+    用 next_max_id 翻頁
+    """
+    def __init__(self, pages):
+        self.pages = pages
+        self.requested = []
+
+    async def get_user_threads(self, user_id, count=10, max_id=None):
+        page = int(max_id or 0)
+        self.requested.append(page)
+        threads = [{'thread_items': [{'post': {'id': post_id, 'caption': {'text': text} if text else None}}]}
+                   for post_id, text in self.pages[page]]
+        return {'threads': threads, 'next_max_id': str(page + 1) if page + 1 < len(self.pages) else None}
+
+
+def check_short_posts():
+    print("== API 翻頁: 短貼文、重複的置頂貼文、只有圖片的頁面 ==")
+    pinned = ('100', '置頂：新影片上線了！')
+    pages = [
+        [pinned, ('1', '早安'), ('2', '今天好冷喔')],
+        [pinned, ('1', '早安')],
+        [('5', None), ('6', None)],
+        [pinned, ('3', '早安'), ('4', '新影片上線了！')],
+        # 空頁之後就停止，即使還有游標
+        [],
+        [('7', '空頁之後的貼文')],
+    ]
+    api = PagedThreadsAPI(pages)
+    posts = asyncio.run(grab_data_threads.crawl_user(api, 'user', max_posts=50))
+    ids = [post.id for post in posts]
+    print(f"抓取頁面 {api.requested}，保留 {len(posts)} 則: {[post.text for post in posts]}")
+    assert api.requested == [0, 1, 2, 3, 4]
+    assert ids == ['100', '1', '2', '3', '4']
+
+
+async def serial_first_page(api, usernames):
+    """
+    改版前的做法：逐一查 User ID、只抓第一頁
+    """
+    results = {}
+    for username in usernames:
+        user_id = await api.get_user_id_from_username(username)
+        results[username] = grab_data_threads.posts_from_threads(await api.get_user_threads(user_id))
+    return results
+
+
+def bench_api(accounts, latency, pages, concurrency):
+    print(f"== Threads API: {accounts} 個帳號，每次呼叫延遲 {latency * 1000:.0f} ms，每個帳號 {pages} 頁 ==")
+    usernames = [f"user{i}" for i in range(accounts)]
+    max_posts = pages * 10
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cache_path = os.path.join(tmp_dir, 'user_ids.json')
+        runs = [('逐一、只抓第一頁', lambda api: serial_first_page(api, usernames))]
+        for label in ('並行 + 翻頁 (無快取)', '並行 + 翻頁 (有快取)'):
+            runs.append((label, lambda api: grab_data_threads.fetch_threads_data(
+                usernames, max_posts=max_posts, concurrency=concurrency, api=api,
+                cache_path=cache_path, save=False)))
+        for label, run in runs:
+            api = FakeThreadsAPI(latency, pages)
+            start = time.perf_counter()
+            results = asyncio.run(run(api))
+            elapsed = time.perf_counter() - start
+            posts = sum(len(posts) for posts in results.values())
+            print(f"  {label:<14} {elapsed:7.2f} 秒  {posts:>6} 則貼文 (應為 {accounts * max_posts})  "
+                  f"查詢 User ID {api.calls['user_id']:>4} 次  抓取貼文 {api.calls['threads']:>5} 次")
+
+
+class FakeLoginThreadsAPI(FakeThreadsAPI):
+    """
+    需要登入的模擬 ThreadsAPI：login 要等 login_latency 秒，
+    token 被撤銷 (不在 valid_tokens 中) 時請求回報 login_required
+    """
+    valid_tokens = set()
+    logins = 0
+
+    def __init__(self, latency=0.05, login_latency=1.5):
+        super().__init__(latency)
+        self.login_latency = login_latency
+        self.username = self.token = self.user_id = self.auth_headers = None
+        self.is_logged_in = False
+
+    async def login(self, username, password):
+        await asyncio.sleep(self.login_latency)
+        FakeLoginThreadsAPI.logins += 1
+        self.username, self.token = username, f"token{FakeLoginThreadsAPI.logins}"
+        self.auth_headers = {'Authorization': f"Bearer IGT:2:{self.token}"}
+        self.user_id, self.is_logged_in = 42, True
+        FakeLoginThreadsAPI.valid_tokens.add(self.token)
+        return True
+
+    async def get_user_id_from_username(self, username):
+        if self.token not in FakeLoginThreadsAPI.valid_tokens:
+            raise Exception("{'message': 'login_required', 'status': 'fail'}")
+        return await super().get_user_id_from_username(username)
+
+
+def bench_session(login_latency):
+    print(f"== 登入狀態重複使用: 啟動到第一個請求完成 (模擬登入 {login_latency:.1f} 秒) ==")
+    factory = lambda: FakeLoginThreadsAPI(login_latency=login_latency)
+
+    async def first_request(session_path, key=None):
+        start = time.perf_counter()
+        store = threads_session.SessionStore(session_path, password='password', key=key)
+        session = threads_session.ThreadsSession('me', 'password', store=store, api_factory=factory)
+        await session.start()
+        started = time.perf_counter() - start
+        await session.get_user_id_from_username('instagram')
+        return started, time.perf_counter() - start
+
+    def report(label, session_path, key=None):
+        logins = FakeLoginThreadsAPI.logins
+        started, elapsed = asyncio.run(first_request(session_path, key))
+        print(f"  {label:<22} 登入/還原 {started * 1000:8.1f} ms  第一個請求完成 {elapsed * 1000:8.1f} ms  "
+              f"登入 {FakeLoginThreadsAPI.logins - logins} 次")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        session_path = os.path.join(tmp_dir, 'session.enc')
+        report('首次執行 (登入並儲存)', session_path)
+        report('沿用登入狀態', session_path)
+
+        key_path = os.path.join(tmp_dir, 'session_key.enc')
+        key = threads_session.Fernet.generate_key()
+        asyncio.run(first_request(key_path, key))
+        report('沿用 (THREADS_SESSION_KEY)', key_path, key)
+
+        FakeLoginThreadsAPI.valid_tokens.clear()
+        report('token 失效 (自動重新登入)', session_path)
+
+
+class FakeModel:
+    """
+    模擬 threads_api 的 pydantic 物件 (屬性存取)
+    """
+    def __init__(self, **fields):
+        self.__dict__.update(fields)
+
+
+def make_thread_items(count, as_objects, seed=0):
+    rng = random.Random(seed)
+    threads = []
+    for i in range(count):
+        caption = {'text': f"第 {i} 則模擬貼文 {rng.random():.6f}"} if rng.random() > 0.1 else None
+        post = {'id': f"{i}_{seed}", 'caption': caption, 'like_count': rng.randint(0, 1000),
+                'taken_at': 1700000000 + i}
+        if as_objects:
+            # threads_api 的 Post 沒有 reply_count
+            post['caption'] = FakeModel(**caption) if caption else None
+            threads.append(FakeModel(thread_items=[FakeModel(post=FakeModel(**post))]))
+        else:
+            post['reply_count'] = rng.randint(0, 50)
+            threads.append({'thread_items': [{'post': post}]})
+    return threads
+
+
+def bench_normalize(count, page_size=25, repeat=3):
+    print(f"== API 回應解析: {count} 則 thread，每頁 {page_size} 則 ==")
+    for label, as_objects in (('dict', False), ('物件', True)):
+        items = make_thread_items(count, as_objects)
+        pages = [{'threads': items[i:i + page_size]} for i in range(0, count, page_size)]
+        timings = {}
+        for name, parse in (('逐項檢查', lambda page: grab_data_threads.posts_from_threads_generic(page['threads'])),
+                            ('依結構分派', grab_data_threads.posts_from_threads)):
+            best = None
+            for _ in range(repeat):
+                start = time.perf_counter()
+                results = [post for page in pages for post in parse(page)]
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            timings[name] = (best, [post.to_dict() for post in results])
+        (t_old, old), (t_new, new) = timings['逐項檢查'], timings['依結構分派']
+        print(f"  {label:<4} 逐項檢查 {count / t_old:>12,.0f} 則/秒  依結構分派 {count / t_new:>12,.0f} 則/秒  "
+              f"加速 {t_old / t_new:4.1f}x  結果相同={old == new}")
+
+    # 混合結構的頁面改走逐項檢查，結果仍然相同
+    mixed = make_thread_items(50, False) + make_thread_items(50, True, seed=1)
+    print(f"  混合結構結果相同={grab_data_threads.posts_from_threads(mixed) == grab_data_threads.posts_from_threads_generic(mixed)}")
+
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+# fixtures/threads_profile_instagram.html 中的貼文 (依頁面順序)
+FIXTURE_POST_IDS = ['3301_25025320', '3302_25025320', '3303_25025320', '3304_25025320', '3305_25025320']
+
+
+def make_fixture_handler(stats):
+    """
+    /@{username} 回傳 fixtures/threads_profile_{username}.html，沒有錄製頁面的帳號回傳 404；
+    每個頁面第一次請求先回 503，測試重試
+    """
+    class FixtureHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            username = urlparse(self.path).path.lstrip('/').lstrip('@')
+            path = os.path.join(FIXTURE_DIR, f'threads_profile_{username}.html')
+            stats['requests'] += 1
+            if not os.path.exists(path):
+                self.send_error(404)
+                return
+            if username not in stats['seen']:
+                stats['seen'].add(username)
+                self.send_error(503)
+                return
+            with open(path, 'rb') as f:
+                body = f.read()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return FixtureHandler
+
+
+def check_no_login():
+    print("== 免登入爬蟲: 本機伺服器 + 錄製頁面 ==")
+    stats = {'requests': 0, 'seen': {'instagram'}}
+    server = ThreadingHTTPServer(('127.0.0.1', 0), make_fixture_handler(stats))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    cwd = os.getcwd()
+    try:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            os.chdir(tmp_dir)
+            posts = grab_data_threads_no_login.fetch_threads_data_no_login('instagram', base_url=base_url)
+            ids = [post.id for post in posts]
+            with open('instagram_threads.jsonl', encoding='utf-8') as f:
+                saved = [json.loads(line)['id'] for line in f]
+            print(f"同步版: {len(posts)} 則貼文，順序正確={ids == FIXTURE_POST_IDS}，已寫入檔案={saved == ids}")
+            assert ids == FIXTURE_POST_IDS and saved == ids
+            assert posts[0].like_count == 15234 and posts[0].timestamp == 1717000000
+
+            stats['seen'] = set()
+            os.remove('instagram_threads.jsonl')
+            results = asyncio.run(grab_data_threads_no_login.fetch_threads_data_async(
+                ['instagram', 'missing_account'], base_url=base_url, retries=2))
+            ids = [post.id for post in results['instagram']]
+            print(f"非同步版: 503 後重試成功={ids == FIXTURE_POST_IDS}，404 帳號沒有貼文={results['missing_account'] == []}，"
+                  f"共 {stats['requests']} 次請求")
+            with open('instagram_threads.jsonl', encoding='utf-8') as f:
+                saved = [json.loads(line)['id'] for line in f]
+            assert ids == FIXTURE_POST_IDS and saved == ids and results['missing_account'] == []
+    finally:
+        os.chdir(cwd)
+        server.shutdown()
+        server.server_close()
+
+
+class CollectorEmulator(HTMLParser):
+    """
+    模擬 COLLECT_NEW_POSTS_JS：依文件順序找出 class 含 Post 或 dir="auto" 的節點，
+    文字為所有子孫節點的文字；和 COLLECT_NEW_POSTS_JS 一樣略過包含其他符合節點的容器
+    """
+    def __init__(self):
+        super().__init__()
+        self.stack = []
+        self.matched = []
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        node = {'text': [], 'id': attrs.get('id') or attrs.get('data-id'), 'nested': False}
+        if 'Post' in (attrs.get('class') or '') or attrs.get('dir') == 'auto':
+            self.matched.append(node)
+        self.stack.append(node)
+
+    def handle_endtag(self, tag):
+        node = self.stack.pop()
+        if self.stack:
+            self.stack[-1]['text'].extend(node['text'])
+            if node['nested'] or any(node is matched for matched in self.matched):
+                self.stack[-1]['nested'] = True
+
+    def handle_data(self, data):
+        if self.stack and data.strip():
+            self.stack[-1]['text'].append(data.strip())
+
+    def results(self):
+        results = []
+        for node in self.matched:
+            if node['nested']:
+                continue
+            text = '\n'.join(node['text'])
+            if len(text) > 15:
+                results.append({'text': text, 'id': node['id']})
+        return results
+
+
+def check_nested_dom():
+    print("== DOM 去重: 父節點包含子節點的貼文 ==")
+    with open(os.path.join(FIXTURE_DIR, 'threads_nested_dom.html'), encoding='utf-8') as f:
+        collector = CollectorEmulator()
+        collector.feed(f.read())
+    records = collector.results()
+    deduper = PostDeduper()
+    kept = [post.text for post in map(normalize_post, records) if deduper.add(post)]
+    children = ['今天去了新開的咖啡店，拿鐵的奶泡很綿密，推薦給大家', '週末的登山行程因為下雨取消了，只好在家追劇一整天',
+                '新影片上線了！這次介紹三款平價藍牙耳機的實際使用心得']
+    containers = [text for text in kept if sum(child in text for child in children) > 1]
+    print(f"收集 {len(records)} 個節點，保留 {len(kept)} 則，子節點貼文全部保留={all(text in kept for text in children)}，"
+          f"保留的容器 {len(containers)} 個")
+    assert kept == children and not containers
+
+
+# 寫入 start..end 則貼文 (每 10 則 flush 一次) 後直接結束行程，模擬爬蟲被中斷
+CRASH_WRITER = """
+import os, sys
+from threads_common import JsonlSink, Post
+sink = JsonlSink(sys.argv[1], flush_every=10)
+for i in range(int(sys.argv[2]), int(sys.argv[3])):
+    sink.write(Post(f'第 {i} 則貼文', str(i)))
+os._exit(0)
+"""
+
+
+def check_jsonl_crash():
+    print("== .jsonl.gz 中斷後重跑 ==")
+    here = os.path.dirname(os.path.abspath(__file__))
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, 'user_threads.jsonl.gz')
+        for start, end in ((0, 25), (25, 55)):
+            subprocess.run([sys.executable, '-c', CRASH_WRITER, path, str(start), str(end)], cwd=here, check=True)
+        sink = JsonlSink(path)
+        added = sink.write(Post('中斷後的新貼文', 'new'))
+        sink.close()
+        ids = [record['id'] for record in iter_jsonl(path)]
+    # 每次中斷只會損失最後一次 flush 之後的貼文 (20..24)
+    expected = [str(i) for i in range(20)] + [str(i) for i in range(25, 55)] + ['new']
+    print(f"讀回 {len(ids)} 則，flush 過的貼文都在且沒有重複={ids == expected}")
+    assert added and ids == expected
+
+
+def load_pages(pattern, synthetic_mb):
+    pages = []
+    for path in sorted(glob.glob(pattern)):
+        with open(path, encoding='utf-8', errors='ignore') as f:
+            pages.append((path, f.read()))
+    if not pages:
+        print(f"找不到 {pattern}，改用 {synthetic_mb} MB 的模擬頁面")
+        pages.append(('synthetic', make_synthetic_page(synthetic_mb)))
+    return pages
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Threads 解析效能測試")
+    parser.add_argument('--html', default='*_threads_debug.html', help="要測試的頁面原始碼 (glob)")
+    parser.add_argument('--synthetic-mb', type=float, default=5, help="沒有頁面檔時產生的模擬頁面大小")
+
+    parser.add_argument('--scroll-delays', default='0.05,0.3,1.5', help="模擬頁面每批貼文的載入延遲 (秒，逗號分隔)")
+    parser.add_argument('--scroll-total', type=int, default=50, help="模擬頁面的貼文總數")
+    parser.add_argument('--scroll-batch', type=int, default=10, help="模擬頁面每批載入的貼文數")
+
+    parser.add_argument('--heavy-posts', type=int, default=50, help="只抓文字模式測試頁面的貼文數 (每則一張圖片)")
+
+    parser.add_argument('--api-accounts', type=int, default=20, help="API 測試的帳號數")
+    parser.add_argument('--api-latency', type=float, default=0.2, help="模擬 API 每次呼叫的延遲 (秒)")
+    parser.add_argument('--api-pages', type=int, default=5, help="模擬 API 每個帳號的頁數")
+    parser.add_argument('--api-concurrency', type=int, default=5)
+
+    parser.add_argument('--login-latency', type=float, default=1.5, help="模擬登入所需的時間 (秒)")
+
+    parser.add_argument('--normalize-items', type=int, default=100_000, help="API 回應解析測試的 thread 數")
+
+    parser.add_argument('--only', choices=['page_source', 'json', 'scroll', 'text_only', 'api', 'session', 'normalize',
+                                           'no_login', 'nested_dom', 'short_posts', 'jsonl_crash'],
+                        help="只跑其中一項")
+    args = parser.parse_args()
+
+    if args.only in (None, 'page_source', 'json'):
+        pages = load_pages(args.html, args.synthetic_mb)
+    if args.only in (None, 'page_source'):
+        bench_page_source(pages)
+    if args.only in (None, 'json'):
+        bench_json_extract(pages)
+    if args.only in (None, 'scroll'):
+        bench_scroll([float(delay) for delay in args.scroll_delays.split(',')], args.scroll_total, args.scroll_batch)
+    if args.only in (None, 'text_only'):
+        bench_text_only(args.heavy_posts)
+    if args.only in (None, 'api'):
+        bench_api(args.api_accounts, args.api_latency, args.api_pages, args.api_concurrency)
+    if args.only in (None, 'short_posts'):
+        check_short_posts()
+    if args.only in (None, 'session'):
+        bench_session(args.login_latency)
+    if args.only in (None, 'normalize'):
+        bench_normalize(args.normalize_items)
+    if args.only in (None, 'no_login'):
+        check_no_login()
+    if args.only in (None, 'nested_dom'):
+        check_nested_dom()
+    if args.only in (None, 'jsonl_crash'):
+        check_jsonl_crash()
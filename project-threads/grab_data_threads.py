@@ -1,7 +1,10 @@
+import os
 import json
 import time
 import asyncio
-from threads_api.src.threads_api import ThreadsAPI
+from operator import attrgetter
+from threads_common import OUTPUT_FORMAT, Post, PostDeduper, normalize_post, open_sink
+from threads_session import SESSION_FILE, SessionStore, ThreadsSession, default_api_factory
 
 # 設定您的免洗帳號資訊 (建議使用環境變數，不要直接寫死在程式碼中以免外洩)
 # 如果該套件支援不登入瀏覽，可嘗試註解掉登入部分，但目前 Meta 幾乎強制要求登入
@@ -9,99 +12,348 @@ MY_USERNAME = "您的免洗帳號帳號"
 MY_PASSWORD = "您的免洗帳號密碼"
 
 # 您想爬取的目標帳號 (例如: instagram 官方帳號)
-TARGET_USERNAME = "instagram"
+TARGET_USERNAMES = ["instagram"]
 
-async def fetch_threads_data():
-    api = ThreadsAPI()
+# username -> user_id 的快取檔，下次執行不必再查詢
+USER_ID_CACHE = "threads_user_ids.json"
 
-    print(f"正在登入帳號: {MY_USERNAME} ...")
-    try:
-        # 登入 (注意：這一步最容易觸發驗證挑戰，如 2FA)
-        await api.login(MY_USERNAME, MY_PASSWORD)
-        print("登入成功！")
-    except Exception as e:
-        print(f"登入失敗，請檢查帳號狀態或網路。錯誤: {e}")
-        return
 
-    try:
-        # 1. 取得目標帳號的 User ID (Threads 內部使用的是數字 ID)
-        print(f"正在取得 {TARGET_USERNAME} 的 User ID...")
-        user_id = await api.get_user_id_from_username(TARGET_USERNAME)
-        
-        if not user_id:
-            print("找不到該使用者 ID")
+class UserIdCache:
+    """
+    持久化的 username -> user_id 對照表 (JSON 檔)
+    """
+    def __init__(self, path=USER_ID_CACHE):
+        self.path = path
+        self.user_ids = {}
+        self.dirty = False
+        if path and os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self.user_ids = json.load(f)
+            except (OSError, json.JSONDecodeError) as e:
+                print(f"無法讀取 User ID 快取 {path} ({e})，重新查詢")
+
+    def get(self, username):
+        return self.user_ids.get(username)
+
+    def set(self, username, user_id):
+        self.user_ids[username] = str(user_id)
+        self.dirty = True
+
+    def discard(self, username):
+        if self.user_ids.pop(username, None) is not None:
+            self.dirty = True
+
+    def save(self):
+        if not self.path or not self.dirty:
             return
-            
-        print(f"目標 User ID: {user_id}")
-
-        # 2. 抓取該用戶的貼文 (Threads)
-        print("正在抓取貼文...")
-        # Get user threads 通常會回傳一個列表
-        threads = await api.get_user_threads(user_id)
-        
-        # 3. 解析並儲存資料
-        posts_data = []
-        
-        # 注意：回傳的資料結構很複雜，這裡簡化處理
-        # threads 可能是一個 Threads 物件，需要檢查實際結構
-        if hasattr(threads, 'threads'):
-            thread_list = threads.threads
-        elif isinstance(threads, list):
-            thread_list = threads
+        # 先寫暫存檔再取代，中斷時不會留下寫一半的快取
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.user_ids, f, ensure_ascii=False, indent=4)
+        os.replace(tmp_path, self.path)
+        self.dirty = False
+
+
+def thread_list_of(threads):
+    """
+    get_user_threads 回傳的一頁資料中的 thread 列表
+    """
+    # threads 可能是一個 Threads 物件、dict 或列表，需要檢查實際結構
+    if hasattr(threads, 'threads'):
+        return threads.threads or []
+    if isinstance(threads, dict):
+        return threads.get('threads') or []
+    if isinstance(threads, list):
+        return threads
+    return [threads]
+
+
+def posts_from_threads_generic(thread_list):
+    """
+    逐項檢查結構的解析方式，可以處理同一頁中混合的各種結構 (快速路徑不適用時使用)
+    """
+    posts_data = []
+
+    for item in thread_list:
+        # 這是概略結構，實際欄位名稱需視 API 版本而定
+        # 通常資料藏在 thread_items 裡面
+        if hasattr(item, 'thread_items'):
+            thread_items = item.thread_items or []
+        elif isinstance(item, dict):
+            thread_items = item.get('thread_items', [])
         else:
-            thread_list = [threads]
-        
-        for item in thread_list:
-            # 這是概略結構，實際欄位名稱需視 API 版本而定
-            # 通常資料藏在 thread_items 裡面
-            if hasattr(item, 'thread_items'):
-                thread_items = item.thread_items
-            elif isinstance(item, dict):
-                thread_items = item.get('thread_items', [])
+            thread_items = [item]
+
+        for post in thread_items:
+            if hasattr(post, 'post'):
+                post_content = post.post
+            elif isinstance(post, dict):
+                post_content = post.get('post', post)
             else:
-                thread_items = [item]
-            
-            for post in thread_items:
-                if hasattr(post, 'post'):
-                    post_content = post.post
-                elif isinstance(post, dict):
-                    post_content = post.get('post', post)
+                post_content = post
+
+            if hasattr(post_content, 'caption'):
+                caption = post_content.caption
+                if hasattr(caption, 'text'):
+                    text = caption.text
                 else:
-                    post_content = post
-                
-                if hasattr(post_content, 'caption'):
-                    caption = post_content.caption
-                    if hasattr(caption, 'text'):
-                        text = caption.text
-                    else:
-                        text = str(caption) if caption else ''
-                elif isinstance(post_content, dict):
-                    caption = post_content.get('caption', {})
-                    text = caption.get('text', '') if isinstance(caption, dict) else str(caption) if caption else ''
+                    text = str(caption) if caption else ''
+            elif isinstance(post_content, dict):
+                caption = post_content.get('caption', {})
+                text = caption.get('text', '') if isinstance(caption, dict) else str(caption) if caption else ''
+            else:
+                text = str(post_content) if post_content else ''
+
+            if text:
+                if isinstance(post_content, dict):
+                    field = post_content.get
                 else:
-                    text = str(post_content) if post_content else ''
-                
-                if text:
-                    data = {
-                        'id': getattr(post_content, 'id', None) if hasattr(post_content, 'id') else (post_content.get('id') if isinstance(post_content, dict) else None),
-                        'text': text,
-                        'like_count': getattr(post_content, 'like_count', None) if hasattr(post_content, 'like_count') else (post_content.get('like_count') if isinstance(post_content, dict) else None),
-                        'reply_count': getattr(post_content, 'reply_count', None) if hasattr(post_content, 'reply_count') else (post_content.get('reply_count') if isinstance(post_content, dict) else None),
-                        'timestamp': getattr(post_content, 'taken_at', None) if hasattr(post_content, 'taken_at') else (post_content.get('taken_at') if isinstance(post_content, dict) else None)
-                    }
-                    posts_data.append(data)
-
-        # 4. 存成 JSON 檔
-        output_file = f"{TARGET_USERNAME}_threads.json"
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(posts_data, f, ensure_ascii=False, indent=4)
-            
-        print(f"成功抓取 {len(posts_data)} 則貼文，已存入 {output_file}")
+                    field = lambda name: getattr(post_content, name, None)
+                posts_data.append(Post(
+                    text=text,
+                    id=field('id'),
+                    like_count=field('like_count'),
+                    reply_count=field('reply_count'),
+                    timestamp=field('taken_at'),
+                ))
+
+    return posts_data
+
+
+def _posts_from_dicts(thread_list):
+    # 整頁都是 dict (JSON 原始回應)
+    posts_data = []
+    for thread in thread_list:
+        for item in thread.get('thread_items', ()):
+            post = item.get('post', item)
+            get = post.get
+            caption = get('caption')
+            if type(caption) is dict:
+                text = caption.get('text')
+            else:
+                text = str(caption) if caption else ''
+            if text:
+                posts_data.append(Post(text, get('id'), get('like_count'), get('reply_count'), get('taken_at')))
+    return posts_data
+
+
+POST_FIELDS = ('id', 'like_count', 'reply_count', 'taken_at')
+
+
+def _missing_field(post):
+    return None
+
+
+def _posts_from_objects(thread_list):
+    # 整頁都是 threads_api 的物件 (Thread -> ThreadItem -> Post -> Caption)
+    # 依第一則貼文的型別預先建立欄位的 attrgetter，該型別沒有的欄位固定為 None
+    # (例如 threads_api 的 Post 沒有 reply_count)
+    posts_data = []
+    post_type = None
+    for thread in thread_list:
+        for item in thread.thread_items or ():
+            post = item.post
+            if post is None:
+                continue
+            if type(post) is not post_type:
+                if post_type is not None:
+                    raise TypeError("同一頁中有不同型別的貼文")
+                post_type = type(post)
+                get_id, get_likes, get_replies, get_time = (
+                    attrgetter(name) if hasattr(post, name) else _missing_field for name in POST_FIELDS)
+            caption = post.caption
+            if caption is None:
+                continue
+            text = caption.text
+            if text:
+                posts_data.append(Post(text, get_id(post), get_likes(post), get_replies(post), get_time(post)))
+    return posts_data
+
+
+def posts_from_threads(threads):
+    """
+    把 get_user_threads 回傳的一頁資料解析成 Post 列表
 
+    每頁只判斷一次結構 (dict 或 threads_api 物件)，之後用對應的快速路徑解析；
+    結構不符合預期時整頁改用逐項檢查的 posts_from_threads_generic，結果相同。
+    """
+    thread_list = thread_list_of(threads)
+    if not thread_list:
+        return []
+    first = thread_list[0]
+    if type(first) is dict:
+        parse = _posts_from_dicts
+    elif hasattr(first, 'thread_items'):
+        parse = _posts_from_objects
+    else:
+        return posts_from_threads_generic(thread_list)
+    try:
+        return parse(thread_list)
+    except (AttributeError, TypeError):
+        return posts_from_threads_generic(thread_list)
+
+
+def next_cursor(threads):
+    """
+    下一頁的游標 (next_max_id)，沒有下一頁時回傳 None
+    """
+    if isinstance(threads, dict):
+        return threads.get('next_max_id')
+    return getattr(threads, 'next_max_id', None)
+
+
+async def resolve_user_ids(api, usernames, cache, concurrency=5):
+    """
+    同時查詢多個帳號的 User ID (最多 concurrency 個同時進行)，快取中已有的直接使用
+    回傳 {username: user_id}，查不到的帳號不會出現在結果中
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def resolve(username):
+        user_id = cache.get(username)
+        if user_id:
+            return user_id
+        async with semaphore:
+            print(f"正在取得 {username} 的 User ID...")
+            try:
+                user_id = await api.get_user_id_from_username(username)
+            except Exception as e:
+                print(f"取得 {username} 的 User ID 失敗: {e}")
+                return None
+        if not user_id:
+            print(f"找不到 {username} 的 User ID")
+            return None
+        cache.set(username, user_id)
+        return str(user_id)
+
+    user_ids = await asyncio.gather(*(resolve(username) for username in usernames))
+    cache.save()
+    return {username: user_id for username, user_id in zip(usernames, user_ids) if user_id}
+
+
+async def iter_user_posts(api, user_id, page_size=10, max_pages=None):
+    """
+    依游標 (max_id) 逐頁抓取使用者的貼文，每頁產生一個 Post 列表
+    (整頁都沒有文字時是空列表)；伺服器回傳空頁或沒有下一頁時結束
+    """
+    max_id = None
+    seen_cursors = set()
+    pages = 0
+    while max_pages is None or pages < max_pages:
+        threads = await api.get_user_threads(user_id, count=page_size, max_id=max_id)
+        pages += 1
+        if not thread_list_of(threads):
+            return
+        yield posts_from_threads(threads)
+
+        max_id = next_cursor(threads)
+        # 沒有下一頁，或伺服器回傳重複的游標 (避免無限迴圈)
+        if not max_id or max_id in seen_cursors:
+            return
+        seen_cursors.add(max_id)
+
+
+async def crawl_user(api, user_id, max_posts=50, page_size=10, sink=None):
+    """
+    抓取單一帳號的貼文，通過去重後立即寫入 sink
+    回傳 Post 列表
+    """
+    posts_data = []
+    deduper = PostDeduper()
+    async for page in iter_user_posts(api, user_id, page_size=page_size):
+        for post in page:
+            if len(posts_data) >= max_posts:
+                break
+            post = normalize_post(post)
+            if deduper.add(post):
+                posts_data.append(post)
+                if sink is not None:
+                    sink.write(post)
+        # 收滿就停止；整頁都是看過的貼文 (例如重複的置頂貼文) 或沒有文字的貼文時仍繼續翻頁，
+        # 空頁或沒有下一頁時 iter_user_posts 會自己結束
+        if len(posts_data) >= max_posts:
+            break
+    return posts_data
+
+
+async def login(username, password, session_path=SESSION_FILE, api_factory=default_api_factory):
+    """
+    登入並回傳 ThreadsSession (優先沿用 session_path 中加密儲存的登入狀態)，失敗時回傳 None
+    """
+    store = SessionStore(session_path, password=password)
+    session = ThreadsSession(username, password, store=store, api_factory=api_factory)
+    try:
+        await session.start()
     except Exception as e:
-        print(f"抓取過程中發生錯誤: {e}")
-        import traceback
-        traceback.print_exc()
+        print(f"登入失敗，請檢查帳號狀態或網路。錯誤: {e}")
+        await session.close()
+        return None
+    return session
+
+
+async def fetch_threads_data(usernames=TARGET_USERNAMES, max_posts=50, page_size=10, concurrency=5,
+                             api=None, cache_path=USER_ID_CACHE, save=True, output_format=OUTPUT_FORMAT):
+    """
+    用 Threads API 抓取多個帳號的貼文
+
+    1. 同時查詢所有帳號的 User ID (快取在 cache_path，下次執行直接使用)
+    2. 每個帳號依游標逐頁抓取，最多 concurrency 個帳號同時進行，貼文邊抓邊寫入 {username}_threads.*
+    api 可傳入已登入的 ThreadsSession (或測試用的假物件)，否則以 MY_USERNAME 登入
+    (登入狀態加密存在 threads_session.enc，下次執行直接沿用)
+    回傳 {username: Post 列表}
+    """
+    results = {username: [] for username in usernames}
+    own_session = api is None
+    if own_session:
+        api = await login(MY_USERNAME, MY_PASSWORD)
+        if api is None:
+            return results
+    try:
+        await crawl_accounts(api, usernames, results, max_posts=max_posts, page_size=page_size,
+                             concurrency=concurrency, cache_path=cache_path, save=save,
+                             output_format=output_format)
+    finally:
+        if own_session:
+            await api.close()
+    return results
+
+
+async def crawl_accounts(api, usernames, results, max_posts=50, page_size=10, concurrency=5,
+                         cache_path=USER_ID_CACHE, save=True, output_format=OUTPUT_FORMAT):
+
+    # 1. 取得目標帳號的 User ID (Threads 內部使用的是數字 ID)
+    cache = UserIdCache(cache_path)
+    user_ids = await resolve_user_ids(api, usernames, cache, concurrency=concurrency)
+
+    # 2. 抓取各帳號的貼文 (Threads)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def fetch_one(username, user_id):
+        async with semaphore:
+            print(f"正在抓取 @{username} (User ID: {user_id}) 的貼文...")
+            sink = open_sink(username, output_format) if save else None
+            try:
+                posts_data = await crawl_user(api, user_id, max_posts=max_posts, page_size=page_size, sink=sink)
+            except Exception as e:
+                print(f"抓取 @{username} 時發生錯誤: {e}")
+                # User ID 可能已經失效，下次重新查詢
+                cache.discard(username)
+                return
+            finally:
+                if sink is not None:
+                    sink.close()
+        results[username] = posts_data
+        if sink is not None and posts_data:
+            print(f"@{username}: 成功抓取 {len(posts_data)} 則貼文，新增 {sink.written} 則到 {sink.path}")
+
+    await asyncio.gather(*(fetch_one(username, user_id) for username, user_id in user_ids.items()))
+    cache.save()
+
 
 if __name__ == "__main__":
-    asyncio.run(fetch_threads_data())
\ No newline at end of file
+    start = time.perf_counter()
+    results = asyncio.run(fetch_threads_data(TARGET_USERNAMES))
+    for username, posts in results.items():
+        print(f"@{username}: {len(posts)} 則貼文")
+    print(f"總耗時 {time.perf_counter() - start:.1f} 秒")
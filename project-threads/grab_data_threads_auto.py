@@ -0,0 +1,64 @@
+from threads_common import Backend, run_backends
+
+# 自動選擇爬取方式：先用最便宜的純 HTTP 請求，
+# 拿不到貼文時才改用無頭瀏覽器，大部分帳號不需要付出啟動瀏覽器的成本。
+# 各後端只回傳貼文，去重與存檔統一由 threads_common.run_backends 處理。
+
+# 您想爬取的目標帳號
+TARGET_USERNAMES = ["instagram"]
+
+
+class HttpBackend(Backend):
+    name = 'HTTP'
+
+    def fetch(self, username, max_posts):
+        from grab_data_threads_no_login import fetch_threads_data_no_login
+        return fetch_threads_data_no_login(username, save=False)
+
+
+class PlaywrightBackend(Backend):
+    name = 'Playwright'
+
+    def __init__(self, headless=True, text_only=True):
+        self.headless = headless
+        self.text_only = text_only
+
+    def fetch(self, username, max_posts):
+        # 只有真的需要瀏覽器時才載入 Playwright
+        from grab_data_threads_playwright import fetch_threads_data_playwright
+        return fetch_threads_data_playwright(username, max_posts=max_posts, headless=self.headless,
+                                             text_only=self.text_only, save=False)
+
+
+class SeleniumBackend(Backend):
+    name = 'Selenium'
+
+    def __init__(self, headless=True):
+        self.headless = headless
+
+    def fetch(self, username, max_posts):
+        from grab_data_threads_selenium import fetch_threads_data_selenium
+        return fetch_threads_data_selenium(username, max_posts=max_posts, headless=self.headless, save=False)
+
+
+# 由便宜到昂貴
+DEFAULT_BACKENDS = [HttpBackend(), PlaywrightBackend()]
+
+
+def fetch_threads_data_auto(usernames, max_posts=10, backends=None, save=True):
+    """
+    逐一爬取帳號，每個帳號從最便宜的後端開始嘗試
+    回傳 {username: (使用的後端名稱, Post 列表)}
+    """
+    backends = backends or DEFAULT_BACKENDS
+    return {username: run_backends(username, backends, max_posts=max_posts, save=save)
+            for username in usernames}
+
+
+if __name__ == "__main__":
+    print("自動選擇方式爬取 Threads 資料（不需要登入）")
+    print("=" * 50)
+
+    results = fetch_threads_data_auto(TARGET_USERNAMES, max_posts=10)
+    for username, (backend_name, posts) in results.items():
+        print(f"@{username}: {len(posts)} 則貼文 (使用 {backend_name or '無'})")
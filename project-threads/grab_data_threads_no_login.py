@@ -1,101 +1,59 @@
 import json
 import re
-import time
+import random
+import asyncio
+import aiohttp
 import requests
 from bs4 import BeautifulSoup
-from urllib.parse import urljoin
+from urllib.parse import urlparse
+from threads_parser import extract_posts_from_json
+from threads_common import save_posts as write_posts, unique_posts
 
 # 您想爬取的目標帳號 (例如: instagram 官方帳號)
 TARGET_USERNAME = "instagram"
 
-def fetch_threads_data_no_login(username):
+# 一次抓取多個帳號時使用 (非同步模式)
+TARGET_USERNAMES = [TARGET_USERNAME]
+
+THREADS_BASE_URL = "https://www.threads.net"
+
+# 設定 headers 模擬瀏覽器
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+    'Accept-Language': 'en-US,en;q=0.5',
+    'Accept-Encoding': 'gzip, deflate, br',
+    'Connection': 'keep-alive',
+    'Upgrade-Insecure-Requests': '1',
+}
+
+def fetch_threads_data_no_login(username, save=True, base_url=None):
     """
     不使用登入，直接爬取 Threads 公開頁面
+    回傳 Post 列表；save=True 時同時寫入 {username}_threads.jsonl (格式見 threads_common.OUTPUT_FORMAT)
+    base_url 可以指向本機伺服器 (測試用)
     """
-    base_url = f"https://www.threads.net/@{username}"
+    base_url = f"{base_url or THREADS_BASE_URL}/@{username}"
     
     print(f"正在訪問 {base_url} ...")
     
-    # 設定 headers 模擬瀏覽器
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-        'Accept-Language': 'en-US,en;q=0.5',
-        'Accept-Encoding': 'gzip, deflate, br',
-        'Connection': 'keep-alive',
-        'Upgrade-Insecure-Requests': '1',
-    }
-    
     try:
-        response = requests.get(base_url, headers=headers, timeout=10)
+        response = requests.get(base_url, headers=HEADERS, timeout=10)
         response.raise_for_status()
         
         print(f"成功取得頁面 (狀態碼: {response.status_code})")
         
-        # 解析 HTML
-        soup = BeautifulSoup(response.text, 'html.parser')
-        
-        # Threads 的資料通常嵌入在 JSON-LD 或 script 標籤中
-        # 尋找包含 JSON 資料的 script 標籤
-        posts_data = []
+        posts_data, user_id = parse_threads_page(response.text)
         
-        # 方法 1: 尋找 JSON-LD 或內嵌的 JSON 資料
-        scripts = soup.find_all('script', type='application/json')
-        for script in scripts:
-            try:
-                data = json.loads(script.string)
-                # 這裡需要根據實際的 JSON 結構來解析
-                # Threads 的資料結構可能在不同版本中有所不同
-                if isinstance(data, dict):
-                    # 嘗試找到貼文資料
-                    posts = extract_posts_from_json(data)
-                    if posts:
-                        posts_data.extend(posts)
-            except:
-                continue
-        
-        # 方法 2: 尋找包含 __NEXT_DATA__ 或其他內嵌資料的 script
-        scripts = soup.find_all('script')
-        for script in scripts:
-            if script.string and ('__NEXT_DATA__' in script.string or 'threads' in script.string.lower()):
-                try:
-                    # 嘗試提取 JSON 資料
-                    json_match = re.search(r'\{.*\}', script.string, re.DOTALL)
-                    if json_match:
-                        data = json.loads(json_match.group())
-                        posts = extract_posts_from_json(data)
-                        if posts:
-                            posts_data.extend(posts)
-                except:
-                    continue
-        
-        # 方法 3: 如果上述方法都失敗，嘗試使用 Meta 的公開 API
+        # 方法 4: 如果頁面中都沒有資料，嘗試使用 Meta 的公開 API
         # Threads 有時會在頁面中嵌入用戶 ID，可以用來調用公開 API
-        user_id = extract_user_id(soup, response.text)
-        
         if user_id and not posts_data:
             print(f"找到 User ID: {user_id}，嘗試使用公開 API...")
             posts_data = fetch_from_public_api(user_id, username)
         
-        if not posts_data:
-            # 如果還是沒有資料，嘗試解析 HTML 結構
-            posts_data = extract_posts_from_html(soup)
-        
-        # 儲存結果
-        if posts_data:
-            output_file = f"{username}_threads.json"
-            with open(output_file, 'w', encoding='utf-8') as f:
-                json.dump(posts_data, f, ensure_ascii=False, indent=4)
-            print(f"成功抓取 {len(posts_data)} 則貼文，已存入 {output_file}")
-        else:
-            print("未能從頁面中提取到貼文資料")
-            print("提示：Threads 可能使用動態載入，建議使用 Selenium 或 Playwright")
-            # 儲存原始 HTML 供調試
-            with open(f"{username}_threads_raw.html", 'w', encoding='utf-8') as f:
-                f.write(response.text)
-            print(f"已儲存原始 HTML 到 {username}_threads_raw.html 供調試")
-        
-        return posts_data
+        if save:
+            return save_posts(username, posts_data, response.text)
+        return list(unique_posts(posts_data))
         
     except requests.exceptions.RequestException as e:
         print(f"請求失敗: {e}")
@@ -107,37 +65,166 @@ def fetch_threads_data_no_login(username):
         return []
 
 
-def extract_posts_from_json(data, posts_data=None):
+def parse_threads_page(html_text):
     """
-    遞迴搜尋 JSON 資料中的貼文資訊
+    解析 Threads 公開頁面，回傳 (貼文列表, User ID)
     """
-    if posts_data is None:
-        posts_data = []
+    # 解析 HTML
+    soup = BeautifulSoup(html_text, 'html.parser')
     
-    if isinstance(data, dict):
-        # 檢查是否包含貼文相關的鍵
-        if 'text' in data or 'caption' in data or 'thread_items' in data:
-            post = {
-                'id': data.get('id') or data.get('pk'),
-                'text': data.get('text') or data.get('caption', {}).get('text', '') if isinstance(data.get('caption'), dict) else str(data.get('caption', '')),
-                'like_count': data.get('like_count') or data.get('num_likes'),
-                'reply_count': data.get('reply_count') or data.get('num_replies'),
-                'timestamp': data.get('taken_at') or data.get('created_at')
-            }
-            if post['text'] or post['id']:
-                posts_data.append(post)
-        
-        # 遞迴搜尋所有值
-        for value in data.values():
-            extract_posts_from_json(value, posts_data)
+    # Threads 的資料通常嵌入在 JSON-LD 或 script 標籤中
+    # 尋找包含 JSON 資料的 script 標籤
+    posts_data = []
+    
+    # 方法 1: 尋找 JSON-LD 或內嵌的 JSON 資料
+    scripts = soup.find_all('script', type='application/json')
+    for script in scripts:
+        try:
+            data = json.loads(script.string)
+            # 這裡需要根據實際的 JSON 結構來解析
+            # Threads 的資料結構可能在不同版本中有所不同
+            if isinstance(data, dict):
+                # 嘗試找到貼文資料
+                posts = extract_posts_from_json(data)
+                if posts:
+                    posts_data.extend(posts)
+        except:
+            continue
+    
+    # 方法 2: 尋找包含 __NEXT_DATA__ 或其他內嵌資料的 script
+    scripts = soup.find_all('script')
+    for script in scripts:
+        if script.string and ('__NEXT_DATA__' in script.string or 'threads' in script.string.lower()):
+            try:
+                # 嘗試提取 JSON 資料
+                json_match = re.search(r'\{.*\}', script.string, re.DOTALL)
+                if json_match:
+                    data = json.loads(json_match.group())
+                    posts = extract_posts_from_json(data)
+                    if posts:
+                        posts_data.extend(posts)
+            except:
+                continue
     
-    elif isinstance(data, list):
-        for item in data:
-            extract_posts_from_json(item, posts_data)
+    # 方法 3: 如果上述方法都失敗，嘗試解析 HTML 結構
+    if not posts_data:
+        posts_data = extract_posts_from_html(soup)
     
+    # Threads 有時會在頁面中嵌入用戶 ID
+    user_id = extract_user_id(soup, html_text)
+    
+    return posts_data, user_id
+
+
+def save_posts(username, posts_data, html_text=None):
+    """
+    儲存結果；沒有資料時儲存原始 HTML 供調試
+    回傳寫出的 Post 列表
+    """
+    posts_data = write_posts(username, posts_data)
+    if not posts_data:
+        print("未能從頁面中提取到貼文資料")
+        print("提示：Threads 可能使用動態載入，建議使用 Selenium 或 Playwright")
+        if html_text is not None:
+            # 儲存原始 HTML 供調試
+            with open(f"{username}_threads_raw.html", 'w', encoding='utf-8') as f:
+                f.write(html_text)
+            print(f"已儲存原始 HTML 到 {username}_threads_raw.html 供調試")
     return posts_data
 
 
+class AsyncRateLimiter:
+    """
+    每個主機共用的非同步節流器：兩次請求開始之間至少間隔 1 / rate 秒
+    """
+    def __init__(self, rate=None):
+        self.interval = 1.0 / rate if rate else 0.0
+        self.next_time = 0.0
+
+    async def wait(self):
+        if not self.interval:
+            return
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        wait_time = self.next_time - now
+        self.next_time = max(now, self.next_time) + self.interval
+        if wait_time > 0:
+            await asyncio.sleep(wait_time)
+
+
+async def fetch_page_async(session, url, limiter, retries=3, backoff=1.0, timeout=10):
+    """
+    抓取單一頁面，遇到 429 / 5xx / 連線錯誤時以指數退避 (含 jitter) 重試
+    """
+    for attempt in range(retries + 1):
+        await limiter.wait()
+        try:
+            async with session.get(url, timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+                if response.status == 429 or response.status >= 500:
+                    raise aiohttp.ClientResponseError(
+                        response.request_info, response.history,
+                        status=response.status, message=response.reason or ''
+                    )
+                response.raise_for_status()
+                return await response.text()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            status = getattr(e, 'status', None)
+            # 404 等用戶端錯誤重試也沒用
+            if status is not None and status != 429 and status < 500:
+                raise
+            if attempt == retries:
+                raise
+            delay = backoff * (2 ** attempt) * (0.5 + random.random())
+            print(f"請求 {url} 失敗 ({e})，{delay:.1f} 秒後重試 ({attempt + 1}/{retries})...")
+            await asyncio.sleep(delay)
+
+
+async def fetch_threads_data_async(usernames, concurrency=10, requests_per_second=None,
+                                   retries=3, base_url=None, save=True):
+    """
+    非同步抓取多個帳號的 Threads 公開頁面 (不需要登入)
+
+    所有請求共用一個 aiohttp session (keep-alive 連線池)，
+    concurrency 限制同時進行的請求數，requests_per_second 限制對每個主機的請求速率。
+    頁面解析 (BeautifulSoup) 與寫檔在執行緒中進行，不會卡住其他進行中的請求。
+    回傳 {username: Post 列表}
+    """
+    base_url = base_url or THREADS_BASE_URL
+    semaphore = asyncio.Semaphore(concurrency)
+    limiters = {}
+    results = {username: [] for username in usernames}
+
+    connector = aiohttp.TCPConnector(limit=concurrency, keepalive_timeout=30)
+    # aiohttp 只有在安裝 brotli 時才能解 br，這裡不宣告 br
+    headers = dict(HEADERS, **{'Accept-Encoding': 'gzip, deflate'})
+    async with aiohttp.ClientSession(headers=headers, connector=connector) as session:
+
+        async def fetch_one(username):
+            url = f"{base_url}/@{username}"
+            host = urlparse(url).netloc
+            limiter = limiters.setdefault(host, AsyncRateLimiter(requests_per_second))
+            async with semaphore:
+                print(f"正在訪問 {url} ...")
+                try:
+                    html_text = await fetch_page_async(session, url, limiter, retries=retries)
+                except Exception as e:
+                    print(f"請求 {url} 失敗: {e}")
+                    return
+
+            posts_data, user_id = await asyncio.to_thread(parse_threads_page, html_text)
+            if user_id and not posts_data:
+                print(f"{username}: 找到 User ID: {user_id}，但頁面中沒有貼文資料")
+            if save:
+                posts_data = await asyncio.to_thread(save_posts, username, posts_data, html_text)
+            else:
+                posts_data = list(unique_posts(posts_data))
+            results[username] = posts_data
+
+        await asyncio.gather(*(fetch_one(username) for username in usernames))
+
+    return results
+
+
 def extract_user_id(soup, html_text):
     """
     從 HTML 中提取用戶 ID
@@ -210,12 +297,19 @@ def extract_posts_from_html(soup):
 
 
 if __name__ == "__main__":
+    if len(TARGET_USERNAMES) > 1:
+        # 多個帳號：共用連線池並行抓取
+        results = asyncio.run(fetch_threads_data_async(TARGET_USERNAMES, concurrency=10, requests_per_second=2))
+        for username, posts in results.items():
+            print(f"{username}: {len(posts)} 則貼文")
+        raise SystemExit
+
     posts = fetch_threads_data_no_login(TARGET_USERNAME)
     if posts:
         print(f"\n成功抓取 {len(posts)} 則貼文")
         print("\n前 3 則貼文預覽:")
         for i, post in enumerate(posts[:3], 1):
-            print(f"\n{i}. {post.get('text', '')[:100]}...")
+            print(f"\n{i}. {post.text[:100]}...")
     else:
         print("\n未能抓取到資料。可能的原因：")
         print("1. Threads 使用 JavaScript 動態載入內容")
@@ -1,115 +1,149 @@
-import json
-import time
-import re
 from playwright.sync_api import sync_playwright
-from bs4 import BeautifulSoup
+from threads_parser import extract_posts_from_page_source
+from threads_common import OUTPUT_FORMAT, PostDeduper, collect_posts, open_sink
+from scroll_scheduler import PROBE_JS, SCROLL_JS, adaptive_scroll, format_stats
+from text_only_mode import CONTEXT_OPTIONS, format_traffic, install_text_only, new_traffic, track_traffic
 
 # 您想爬取的目標帳號
 TARGET_USERNAME = "instagram"
 
-def fetch_threads_data_playwright(username, max_posts=10, headless=True):
+USER_AGENT = 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+
+# 嘗試不同的選擇器（Threads 的常見結構）
+POST_SELECTORS = [
+    'article',
+    '[role="article"]',
+    'div[data-testid*="post"]',
+    'div[class*="thread"]',
+    'div[class*="post"]',
+    'div[class*="Thread"]',
+    'div[class*="Post"]',
+    'div[dir="auto"]',  # Threads 經常使用這個屬性
+]
+
+# 在頁面中安裝 MutationObserver，記錄新加入且符合選擇器的節點；
+# 每次呼叫只回傳上次之後新增的節點文字 (一次往返)。
+# 剛插入時還沒有文字的節點會保留到下一次 (最多 3 次)。
+# 只回傳最內層的節點：包含其他符合節點的容器 (例如整個動態牆) 文字是多則貼文接在一起，略過。
+COLLECT_NEW_POSTS_JS = """
+(selectors) => {
+    const selector = selectors.join(',');
+    if (!window.__threadsCollector) {
+        const seen = new WeakSet();
+        const pending = [];
+        const collect = (root) => {
+            if (!root || root.nodeType !== 1) return;
+            if (root.matches(selector) && !seen.has(root)) {
+                seen.add(root);
+                pending.push(root);
+            }
+            for (const el of root.querySelectorAll(selector)) {
+                if (!seen.has(el)) {
+                    seen.add(el);
+                    pending.push(el);
+                }
+            }
+        };
+        collect(document.body);
+        new MutationObserver((mutations) => {
+            for (const mutation of mutations) {
+                for (const node of mutation.addedNodes) collect(node);
+            }
+        }).observe(document.body, {childList: true, subtree: true});
+        window.__threadsCollector = {pending};
+    }
+
+    const pending = window.__threadsCollector.pending;
+    const batch = pending.splice(0, pending.length);
+    const results = [];
+    for (const el of batch) {
+        if (!el.isConnected || el.querySelector(selector)) continue;
+        const text = el.innerText || '';
+        if (text.trim().length > 15) {
+            results.push({text: text, id: el.id || el.getAttribute('data-id')});
+        } else if ((el.__threadsTries = (el.__threadsTries || 0) + 1) < 3) {
+            pending.push(el);
+        }
+    }
+    return results;
+}
+"""
+
+def fetch_threads_data_playwright(username, max_posts=10, headless=True, incremental=True,
+                                  max_empty_scrolls=3, time_budget=120, text_only=True, save=True,
+                                  output_format=OUTPUT_FORMAT):
     """
     使用 Playwright 爬取 Threads 資料（不需要登入）
     Playwright 比 Selenium 更快且更穩定
+
+    incremental=True 時，每次滾動只取回上次之後新加入的節點 (MutationObserver)，
+    每次滾動的成本不會隨著已載入的貼文數量增加；False 則每次重新查詢整個 DOM
+    連續 max_empty_scrolls 次滾動沒有新貼文、或超過 time_budget 秒就停止滾動
+    text_only=True 時不下載圖片、影片、字型、CSS 與追蹤腳本，並關閉動畫
+    回傳 Post 列表；save=True 時每則貼文通過去重後立即寫入 {username}_threads.jsonl
+    (output_format 見 threads_common.OUTPUT_FORMAT)
     """
     url = f"https://www.threads.net/@{username}"
     
     print(f"正在訪問 {url} ...")
     
     posts_data = []
+    sink = open_sink(username, output_format) if save else None
     
     with sync_playwright() as p:
         try:
             # 啟動瀏覽器
             browser = p.chromium.launch(headless=headless)
-            context = browser.new_context(
-                user_agent='Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
-            )
+            context = browser.new_context(user_agent=USER_AGENT, **(CONTEXT_OPTIONS if text_only else {}))
             page = context.new_page()
+            traffic = new_traffic()
+            track_traffic(page, traffic)
+            if text_only:
+                install_text_only(page, traffic)
             
             print("載入頁面...")
             page.goto(url, wait_until='domcontentloaded', timeout=60000)
             
-            # 等待頁面載入
-            time.sleep(3)
-            
             # 滾動頁面以載入更多內容
             print("滾動頁面以載入貼文...")
             # 增加滾動次數以載入更多貼文（Threads 可能需要更多滾動）
             scroll_count = max(30, max_posts // 3)  # 根據需要的貼文數量調整滾動次數
             posts_data = []
-            seen_texts = set()
+            deduper = PostDeduper()
             
-            for i in range(scroll_count):
-                page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
-                time.sleep(3)  # 增加等待時間讓內容載入
-                print(f"已滾動 {i+1}/{scroll_count} 次...")
-                
-                # 每次滾動後嘗試提取新資料
-                page_source = page.content()
-                soup = BeautifulSoup(page_source, 'html.parser')
-                
+            def collect():
                 # 方法 1: 從 HTML 元素中提取（最可靠）
-                new_posts = extract_posts_from_elements_playwright(page, max_posts)
-                for post in new_posts:
-                    text = post.get('text', '').strip()
-                    if text and text not in seen_texts and len(text) > 10:
-                        seen_texts.add(text)
-                        posts_data.append(post)
-                
-                # 如果已經有足夠的資料，可以提前結束
-                if len(posts_data) >= max_posts:
-                    print(f"已收集到 {len(posts_data)} 則貼文，停止滾動")
-                    break
+                if incremental:
+                    new_posts = extract_new_posts_playwright(page)
+                else:
+                    new_posts = extract_posts_from_elements_playwright(page, max_posts)
+                return collect_posts(posts_data, new_posts, deduper, max_posts, sink)
+            
+            # 有新貼文節點或網路閒置就繼續，不用固定等待
+            selector = ','.join(POST_SELECTORS)
+            stats = adaptive_scroll(
+                probe=lambda: page.evaluate(PROBE_JS, selector),
+                scroll=lambda: page.evaluate(SCROLL_JS),
+                collect=collect,
+                target=max_posts,
+                max_scrolls=scroll_count,
+                max_empty_scrolls=max_empty_scrolls,
+                time_budget=time_budget,
+            )
+            print(format_stats(stats))
             
             # 如果元素提取沒有足夠資料，嘗試從 JSON 中提取
             if len(posts_data) < max_posts:
                 print("嘗試從頁面 JSON 資料中提取...")
                 page_source = page.content()
-                soup = BeautifulSoup(page_source, 'html.parser')
-                
-                json_posts = extract_posts_from_page_source(page_source)
-                for post in json_posts:
-                    text = post.get('text', '').strip()
-                    if text and text not in seen_texts and len(text) > 10:
-                        seen_texts.add(text)
-                        posts_data.append(post)
-                        if len(posts_data) >= max_posts:
-                            break
                 
-                # 方法 3: 從 script 標籤中提取
-                if len(posts_data) < max_posts:
-                    script_posts = extract_posts_from_scripts(soup)
-                    for post in script_posts:
-                        text = post.get('text', '').strip()
-                        if text and text not in seen_texts and len(text) > 10:
-                            seen_texts.add(text)
-                            posts_data.append(post)
-                            if len(posts_data) >= max_posts:
-                                break
+                # 方法 2: 單次掃描頁面原始碼中的內嵌 JSON (含 script 標籤內的資料)
+                collect_posts(posts_data, extract_posts_from_page_source(page_source), deduper, max_posts, sink)
             
-            # 限制貼文數量
-            if len(posts_data) > max_posts:
-                posts_data = posts_data[:max_posts]
-            
-            # 儲存結果
+            # 結果已經邊爬邊寫入
             if posts_data:
-                output_file = f"{username}_threads.json"
-                # 清理資料中的 Unicode 問題
-                cleaned_posts = []
-                for post in posts_data:
-                    try:
-                        text = post.get('text', '')
-                        # 確保文字可以正確編碼
-                        text = text.encode('utf-8', errors='ignore').decode('utf-8', errors='ignore')
-                        post['text'] = text
-                        cleaned_posts.append(post)
-                    except:
-                        continue
-                
-                with open(output_file, 'w', encoding='utf-8') as f:
-                    json.dump(cleaned_posts, f, ensure_ascii=False, indent=4)
-                print(f"成功抓取 {len(posts_data)} 則貼文，已存入 {output_file}")
+                if sink is not None:
+                    print(f"成功抓取 {len(posts_data)} 則貼文，新增 {sink.written} 則到 {sink.path}")
             else:
                 print("未能從頁面中提取到貼文資料")
                 # 儲存頁面原始碼供調試
@@ -117,108 +151,62 @@ def fetch_threads_data_playwright(username, max_posts=10, headless=True):
                     f.write(page_source)
                 print(f"已儲存頁面原始碼到 {username}_threads_debug.html 供調試")
             
+            print(format_traffic(traffic))
             browser.close()
             
         except Exception as e:
             print(f"抓取過程中發生錯誤: {e}")
             import traceback
             traceback.print_exc()
+        finally:
+            if sink is not None:
+                sink.close()
     
     return posts_data
 
 
-def extract_posts_from_page_source(page_source):
+def extract_new_posts_playwright(page):
     """
-    從頁面原始碼中提取 JSON 資料
+    增量提取：只取回上次呼叫之後新加入 DOM 的貼文節點 (單次 page.evaluate)
     """
-    posts_data = []
-    
-    # 尋找各種可能的 JSON 資料格式
-    patterns = [
-        r'__NEXT_DATA__\s*=\s*({.+?});',
-        r'window\.__initialData__\s*=\s*({.+?});',
-        r'"thread_items":\s*(\[.+?\])',
-    ]
-    
-    for pattern in patterns:
-        matches = re.finditer(pattern, page_source, re.DOTALL)
-        for match in matches:
-            try:
-                json_str = match.group(1)
-                data = json.loads(json_str)
-                posts = extract_posts_from_json(data)
-                if posts:
-                    posts_data.extend(posts)
-            except:
-                continue
-    
-    # 更積極地尋找所有包含 "text" 的 JSON 物件
-    # 尋找所有可能的貼文文字
-    text_pattern = r'"text"\s*:\s*"((?:[^"\\]|\\.)+)"'
-    text_matches = re.finditer(text_pattern, page_source)
-    for match in text_matches:
-        try:
-            text = match.group(1)
-            # 解碼 Unicode 轉義序列，處理錯誤
-            try:
-                text = text.encode('utf-8').decode('unicode_escape')
-            except:
-                # 如果解碼失敗，嘗試其他方法
-                try:
-                    text = text.encode('latin-1').decode('utf-8', errors='ignore')
-                except:
-                    pass
-            
-            # 清理代理對（surrogate pairs）問題
-            text = text.encode('utf-8', errors='ignore').decode('utf-8', errors='ignore')
-            
-            # 過濾太短或明顯不是貼文的文字
-            if len(text) > 15 and not text.startswith('http') and 'text' not in text.lower()[:10]:
-                posts_data.append({
-                    'text': text,
-                    'id': None,
-                    'like_count': None,
-                    'reply_count': None,
-                    'timestamp': None
-                })
-        except:
-            continue
+    try:
+        new_elements = page.evaluate(COLLECT_NEW_POSTS_JS, POST_SELECTORS)
+    except Exception as e:
+        print(f"從元素提取時發生錯誤: {e}")
+        return []
     
-    # 去重（基於文字內容）
-    seen = set()
-    unique_posts = []
-    for post in posts_data:
-        text = post.get('text', '').strip()
-        # 使用文字的前 100 個字符作為唯一標識
-        text_key = text[:100] if len(text) > 100 else text
-        if text and text_key not in seen and len(text) > 15:
-            seen.add(text_key)
-            unique_posts.append(post)
+    print(f"新增 {len(new_elements)} 個可能的貼文元素")
+    return posts_from_collected(new_elements)
+
+
+def posts_from_collected(new_elements):
+    """
+    把 COLLECT_NEW_POSTS_JS 回傳的元素整理成貼文 dict
+    """
+    posts_data = []
+    for elem in new_elements:
+        # 清理文字（移除多餘空白）
+        cleaned_text = ' '.join(elem['text'].split())
+        posts_data.append({
+            'text': cleaned_text,
+            'id': elem['id'],
+            'like_count': None,
+            'reply_count': None,
+            'timestamp': None
+        })
     
-    return unique_posts
+    return posts_data
 
 
 def extract_posts_from_elements_playwright(page, max_posts=100):
     """
-    使用 Playwright 從 HTML 元素中提取貼文
+    使用 Playwright 從 HTML 元素中提取貼文 (每次查詢整個 DOM)
     """
     posts_data = []
     
     try:
-        # 嘗試不同的選擇器（Threads 的常見結構）
-        selectors = [
-            'article',
-            '[role="article"]',
-            'div[data-testid*="post"]',
-            'div[class*="thread"]',
-            'div[class*="post"]',
-            'div[class*="Thread"]',
-            'div[class*="Post"]',
-            'div[dir="auto"]',  # Threads 經常使用這個屬性
-        ]
-        
         all_elements = []
-        for selector in selectors:
+        for selector in POST_SELECTORS:
             try:
                 elements = page.query_selector_all(selector)
                 if elements:
@@ -227,28 +215,27 @@ def extract_posts_from_elements_playwright(page, max_posts=100):
             except:
                 continue
         
-        # 去重元素（基於位置或 ID）
+        # 去重元素（基於位置或 ID），每個元素只讀一次 inner_text
         unique_elements = []
         seen_positions = set()
         for elem in all_elements:
             try:
                 elem_id = elem.get_attribute('id') or ''
+                text = elem.inner_text() or ''
                 # 使用元素的文字前 50 個字符作為唯一標識
-                text_preview = elem.inner_text()[:50] if elem.inner_text() else ''
-                unique_key = f"{elem_id}_{text_preview}"
+                unique_key = f"{elem_id}_{text[:50]}"
                 
                 if unique_key not in seen_positions:
                     seen_positions.add(unique_key)
-                    unique_elements.append(elem)
+                    unique_elements.append((elem, text))
             except:
                 continue
         
         print(f"去重後共有 {len(unique_elements)} 個唯一元素")
         
         # 提取貼文內容
-        for elem in unique_elements[:max_posts * 2]:  # 多提取一些以防過濾
+        for elem, text in unique_elements[:max_posts * 2]:  # 多提取一些以防過濾
             try:
-                text = elem.inner_text()
                 if text and len(text.strip()) > 15:  # 過濾太短的文字
                     # 清理文字（移除多餘空白）
                     cleaned_text = ' '.join(text.split())
@@ -271,66 +258,6 @@ def extract_posts_from_elements_playwright(page, max_posts=100):
     return posts_data
 
 
-def extract_posts_from_scripts(soup):
-    """
-    從 script 標籤中提取資料
-    """
-    posts_data = []
-    
-    scripts = soup.find_all('script')
-    for script in scripts:
-        if script.string:
-            # 尋找包含貼文資料的 JSON
-            json_matches = re.finditer(r'\{[^{}]*"text"[^{}]*\}', script.string)
-            for match in json_matches:
-                try:
-                    data = json.loads(match.group())
-                    if 'text' in data:
-                        text = data.get('text', '')
-                        if len(text) > 20:
-                            posts_data.append({
-                                'id': data.get('id'),
-                                'text': text,
-                                'like_count': data.get('like_count'),
-                                'reply_count': data.get('reply_count'),
-                                'timestamp': data.get('timestamp')
-                            })
-                except:
-                    continue
-    
-    return posts_data
-
-
-def extract_posts_from_json(data, posts_data=None):
-    """
-    遞迴搜尋 JSON 資料中的貼文資訊
-    """
-    if posts_data is None:
-        posts_data = []
-    
-    if isinstance(data, dict):
-        if 'text' in data or ('caption' in data and isinstance(data.get('caption'), dict) and 'text' in data.get('caption')):
-            text = data.get('text') or (data.get('caption', {}).get('text', '') if isinstance(data.get('caption'), dict) else '')
-            if text and len(text) > 20:
-                post = {
-                    'id': data.get('id') or data.get('pk'),
-                    'text': text,
-                    'like_count': data.get('like_count') or data.get('num_likes'),
-                    'reply_count': data.get('reply_count') or data.get('num_replies'),
-                    'timestamp': data.get('taken_at') or data.get('created_at')
-                }
-                posts_data.append(post)
-        
-        for value in data.values():
-            extract_posts_from_json(value, posts_data)
-    
-    elif isinstance(data, list):
-        for item in data:
-            extract_posts_from_json(item, posts_data)
-    
-    return posts_data
-
-
 if __name__ == "__main__":
     print("使用 Playwright 爬取 Threads 資料（不需要登入）")
     print("=" * 50)
@@ -343,13 +270,7 @@ if __name__ == "__main__":
         print(f"\n成功抓取 {len(posts)} 則貼文")
         print("\n前 3 則貼文預覽:")
         for i, post in enumerate(posts[:3], 1):
-            try:
-                text = post.get('text', '')[:100]
-                # 安全地處理 Unicode
-                text = text.encode('utf-8', errors='ignore').decode('utf-8', errors='ignore')
-                print(f"\n{i}. {text}...")
-            except:
-                print(f"\n{i}. [無法顯示文字]")
+            print(f"\n{i}. {post.text[:100]}...")
     else:
         print("\n未能抓取到資料")
         print("提示：")
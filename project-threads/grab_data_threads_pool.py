@@ -0,0 +1,157 @@
+import asyncio
+import time
+from playwright.async_api import async_playwright
+from threads_parser import extract_posts_from_page_source
+from threads_common import OUTPUT_FORMAT, PostDeduper, collect_posts, open_sink
+from scroll_scheduler import PROBE_JS, SCROLL_JS, adaptive_scroll_async, format_stats
+from text_only_mode import CONTEXT_OPTIONS, install_text_only_async, new_traffic, track_traffic_async
+from grab_data_threads_playwright import COLLECT_NEW_POSTS_JS, POST_SELECTORS, USER_AGENT, posts_from_collected
+
+# 多帳號版本：共用長時間存在的瀏覽器，同時爬取多個帳號
+#
+# 每個 worker 有自己的 context (相當於一個獨立的瀏覽器分頁環境)，
+# 從佇列中取帳號來爬；同一個 context 爬過 pages_per_context 個帳號後就關掉重開，
+# 避免記憶體持續增長。瀏覽器只在一開始啟動一次。
+
+# 您想爬取的目標帳號
+TARGET_USERNAMES = ["instagram", "threads", "zuck"]
+
+
+async def scrape_account(context, username, max_posts=10, max_empty_scrolls=3, time_budget=120,
+                         text_only=True, sink=None):
+    """
+    在給定的 context 中爬取一個帳號，回傳 (貼文列表, 滾動統計, 傳輸統計)
+    有提供 sink 時每則貼文通過去重後立即寫入
+    """
+    url = f"https://www.threads.net/@{username}"
+    page = await context.new_page()
+    traffic = new_traffic()
+    track_traffic_async(page, traffic)
+    if text_only:
+        await install_text_only_async(page, traffic)
+    posts_data = []
+    deduper = PostDeduper()
+
+    async def collect():
+        new_posts = posts_from_collected(await page.evaluate(COLLECT_NEW_POSTS_JS, POST_SELECTORS))
+        return collect_posts(posts_data, new_posts, deduper, max_posts, sink)
+
+    selector = ','.join(POST_SELECTORS)
+    try:
+        await page.goto(url, wait_until='domcontentloaded', timeout=60000)
+        stats = await adaptive_scroll_async(
+            probe=lambda: page.evaluate(PROBE_JS, selector),
+            scroll=lambda: page.evaluate(SCROLL_JS),
+            collect=collect,
+            target=max_posts,
+            max_scrolls=max(30, max_posts // 3),
+            max_empty_scrolls=max_empty_scrolls,
+            time_budget=time_budget,
+        )
+
+        # 元素提取不夠時，從頁面 JSON 資料中補齊
+        if len(posts_data) < max_posts:
+            collect_posts(posts_data, extract_posts_from_page_source(await page.content()), deduper, max_posts, sink)
+    finally:
+        await page.close()
+
+    return posts_data, stats, traffic
+
+
+async def crawl_accounts_async(usernames, concurrency=4, browsers=1, pages_per_context=20,
+                               max_posts=10, headless=True, time_budget=120, text_only=True, save=True,
+                               output_format=OUTPUT_FORMAT):
+    """
+    用一個瀏覽器池同時爬取多個帳號
+
+    concurrency: 同時爬取的帳號數 (每個 worker 一個 context)
+    browsers: 啟動幾個瀏覽器，worker 平均分配
+    pages_per_context: 每個 context 爬幾個帳號後重建
+    text_only: 只抓文字模式 (見 text_only_mode.py)
+    回傳 ({username: Post 列表}, {username: 計時資料})
+    """
+    results = {username: [] for username in usernames}
+    timings = {}
+    queue = asyncio.Queue()
+    for username in usernames:
+        queue.put_nowait(username)
+
+    async with async_playwright() as p:
+        start = time.perf_counter()
+        pool = await asyncio.gather(*(p.chromium.launch(headless=headless) for _ in range(browsers)))
+        print(f"啟動 {browsers} 個瀏覽器耗時 {time.perf_counter() - start:.1f} 秒")
+
+        async def worker(browser):
+            context = None
+            used = 0
+            while True:
+                try:
+                    username = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    break
+
+                # context 用滿就重建，限制記憶體增長
+                if context is None or used >= pages_per_context:
+                    if context is not None:
+                        await context.close()
+                    context = await browser.new_context(user_agent=USER_AGENT,
+                                                        **(CONTEXT_OPTIONS if text_only else {}))
+                    used = 0
+                used += 1
+
+                account_start = time.perf_counter()
+                print(f"正在爬取 @{username} ...")
+                sink = open_sink(username, output_format) if save else None
+                try:
+                    posts_data, stats, traffic = await scrape_account(context, username, max_posts=max_posts,
+                                                                      time_budget=time_budget, text_only=text_only,
+                                                                      sink=sink)
+                except Exception as e:
+                    print(f"爬取 @{username} 時發生錯誤: {e}")
+                    timings[username] = {'seconds': time.perf_counter() - account_start, 'posts': 0,
+                                         'bytes': 0, 'error': str(e)}
+                    continue
+                finally:
+                    if sink is not None:
+                        sink.close()
+
+                timings[username] = {'seconds': time.perf_counter() - account_start, 'posts': len(posts_data),
+                                     'bytes': traffic['bytes']}
+                print(f"@{username}: {format_stats(stats)}")
+                results[username] = posts_data
+                if sink is not None and posts_data:
+                    print(f"@{username}: 成功抓取 {len(posts_data)} 則貼文，新增 {sink.written} 則到 {sink.path}")
+
+            if context is not None:
+                await context.close()
+
+        try:
+            await asyncio.gather(*(worker(pool[i % browsers]) for i in range(concurrency)))
+        finally:
+            for browser in pool:
+                await browser.close()
+
+    return results, timings
+
+
+def print_timings(timings, total_seconds):
+    """
+    印出每個帳號的耗時與傳輸量
+    """
+    print("\n帳號                 貼文數    耗時 (秒)    傳輸 (KB)")
+    for username, timing in timings.items():
+        note = f"  錯誤: {timing['error']}" if 'error' in timing else ''
+        print(f"@{username:<20}{timing['posts']:>6}{timing['seconds']:>12.1f}{timing['bytes'] / 1024:>13.1f}{note}")
+    account_seconds = sum(timing['seconds'] for timing in timings.values())
+    total_kb = sum(timing['bytes'] for timing in timings.values()) / 1024
+    print(f"共 {len(timings)} 個帳號，總耗時 {total_seconds:.1f} 秒 (各帳號耗時合計 {account_seconds:.1f} 秒)，"
+          f"共傳輸 {total_kb:.1f} KB")
+
+
+if __name__ == "__main__":
+    print("使用 Playwright 瀏覽器池爬取多個 Threads 帳號（不需要登入）")
+    print("=" * 50)
+
+    start = time.perf_counter()
+    results, timings = asyncio.run(crawl_accounts_async(TARGET_USERNAMES, concurrency=4, max_posts=20))
+    print_timings(timings, time.perf_counter() - start)
@@ -1,17 +1,23 @@
-import json
-import time
-import re
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.chrome.service import Service
-from bs4 import BeautifulSoup
+from threads_parser import extract_posts_from_page_source
+from threads_common import save_posts, unique_posts
+from scroll_scheduler import PROBE_JS, SCROLL_JS, adaptive_scroll, format_stats
 
 # 您想爬取的目標帳號
 TARGET_USERNAME = "instagram"
 
+# 嘗試不同的選擇器（Threads 的結構可能會變化）
+POST_SELECTORS = [
+    'article',
+    '[role="article"]',
+    'div[data-testid]',
+    '.thread-item',
+    '.post'
+]
+
 def setup_driver(headless=True):
     """
     設定 Selenium WebDriver
@@ -34,9 +40,13 @@ def setup_driver(headless=True):
         return None
 
 
-def fetch_threads_data_selenium(username, max_posts=10, headless=True):
+def fetch_threads_data_selenium(username, max_posts=10, headless=True, max_scrolls=3,
+                                max_empty_scrolls=2, time_budget=60, save=True):
     """
     使用 Selenium 爬取 Threads 資料（不需要登入）
+    每次滾動後一看到新的貼文節點就繼續；連續 max_empty_scrolls 次沒有新節點、
+    或超過 time_budget 秒就停止滾動
+    回傳 Post 列表；save=True 時同時寫入 {username}_threads.jsonl (格式見 threads_common.OUTPUT_FORMAT)
     """
     url = f"https://www.threads.net/@{username}"
     
@@ -52,40 +62,36 @@ def fetch_threads_data_selenium(username, max_posts=10, headless=True):
         driver.get(url)
         print("等待頁面載入...")
         
-        # 等待頁面載入
-        time.sleep(5)
-        
-        # 嘗試滾動頁面以載入更多內容
+        # 嘗試滾動頁面以載入更多內容 (以新增的貼文節點數判斷是否有新內容)
         print("滾動頁面以載入更多貼文...")
-        for i in range(3):
-            driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-            time.sleep(2)
+        selector = ','.join(POST_SELECTORS)
+        stats = adaptive_scroll(
+            probe=lambda: driver.execute_script(f"return ({PROBE_JS})(arguments[0]);", selector),
+            scroll=lambda: driver.execute_script(SCROLL_JS),
+            max_scrolls=max_scrolls,
+            settle_timeout=5.0,
+            max_empty_scrolls=max_empty_scrolls,
+            time_budget=time_budget,
+        )
+        print(format_stats(stats))
         
         # 取得頁面原始碼
         page_source = driver.page_source
-        soup = BeautifulSoup(page_source, 'html.parser')
         
-        # 方法 1: 從頁面中提取 JSON 資料
+        # 方法 1: 單次掃描頁面原始碼中的內嵌 JSON (含 script 標籤內的資料)
         posts_data = extract_posts_from_page_source(page_source)
         
         # 方法 2: 如果方法 1 失敗，嘗試從 HTML 元素中提取
         if not posts_data:
             posts_data = extract_posts_from_elements(driver)
         
-        # 方法 3: 如果還是沒有，嘗試從 script 標籤中提取
-        if not posts_data:
-            posts_data = extract_posts_from_scripts(soup)
-        
-        # 限制貼文數量
-        if len(posts_data) > max_posts:
-            posts_data = posts_data[:max_posts]
+        # 整理、去重並限制貼文數量
+        posts_data = list(unique_posts(posts_data, max_posts=max_posts))
         
         # 儲存結果
         if posts_data:
-            output_file = f"{username}_threads.json"
-            with open(output_file, 'w', encoding='utf-8') as f:
-                json.dump(posts_data, f, ensure_ascii=False, indent=4)
-            print(f"成功抓取 {len(posts_data)} 則貼文，已存入 {output_file}")
+            if save:
+                save_posts(username, posts_data)
         else:
             print("未能從頁面中提取到貼文資料")
             # 儲存頁面原始碼供調試
@@ -103,53 +109,6 @@ def fetch_threads_data_selenium(username, max_posts=10, headless=True):
     return posts_data
 
 
-def extract_posts_from_page_source(page_source):
-    """
-    從頁面原始碼中提取 JSON 資料
-    """
-    posts_data = []
-    
-    # 尋找 __NEXT_DATA__ 或其他內嵌的 JSON
-    patterns = [
-        r'__NEXT_DATA__\s*=\s*({.+?});',
-        r'window\.__initialData__\s*=\s*({.+?});',
-        r'"thread_items":\s*(\[.+?\])',
-    ]
-    
-    for pattern in patterns:
-        matches = re.finditer(pattern, page_source, re.DOTALL)
-        for match in matches:
-            try:
-                json_str = match.group(1)
-                data = json.loads(json_str)
-                posts = extract_posts_from_json(data)
-                if posts:
-                    posts_data.extend(posts)
-            except:
-                continue
-    
-    # 尋找所有可能的 JSON 資料
-    json_pattern = r'\{[^{}]*"text"[^{}]*\}'
-    matches = re.finditer(json_pattern, page_source)
-    for match in matches:
-        try:
-            data = json.loads(match.group())
-            if 'text' in data or 'caption' in data:
-                post = {
-                    'id': data.get('id') or data.get('pk'),
-                    'text': data.get('text') or data.get('caption', {}).get('text', '') if isinstance(data.get('caption'), dict) else str(data.get('caption', '')),
-                    'like_count': data.get('like_count') or data.get('num_likes'),
-                    'reply_count': data.get('reply_count') or data.get('num_replies'),
-                    'timestamp': data.get('taken_at') or data.get('created_at')
-                }
-                if post['text']:
-                    posts_data.append(post)
-        except:
-            continue
-    
-    return posts_data
-
-
 def extract_posts_from_elements(driver):
     """
     從 HTML 元素中直接提取貼文
@@ -160,16 +119,7 @@ def extract_posts_from_elements(driver):
         # 等待貼文元素載入
         wait = WebDriverWait(driver, 10)
         
-        # 嘗試不同的選擇器（Threads 的結構可能會變化）
-        selectors = [
-            'article',
-            '[role="article"]',
-            'div[data-testid]',
-            '.thread-item',
-            '.post'
-        ]
-        
-        for selector in selectors:
+        for selector in POST_SELECTORS:
             try:
                 elements = driver.find_elements(By.CSS_SELECTOR, selector)
                 if elements:
@@ -201,64 +151,6 @@ def extract_posts_from_elements(driver):
     return posts_data
 
 
-def extract_posts_from_scripts(soup):
-    """
-    從 script 標籤中提取資料
-    """
-    posts_data = []
-    
-    scripts = soup.find_all('script')
-    for script in scripts:
-        if script.string:
-            # 尋找包含貼文資料的 JSON
-            json_matches = re.finditer(r'\{[^{}]*"text"[^{}]*\}', script.string)
-            for match in json_matches:
-                try:
-                    data = json.loads(match.group())
-                    if 'text' in data:
-                        posts_data.append({
-                            'id': data.get('id'),
-                            'text': data.get('text'),
-                            'like_count': data.get('like_count'),
-                            'reply_count': data.get('reply_count'),
-                            'timestamp': data.get('timestamp')
-                        })
-                except:
-                    continue
-    
-    return posts_data
-
-
-def extract_posts_from_json(data, posts_data=None):
-    """
-    遞迴搜尋 JSON 資料中的貼文資訊
-    """
-    if posts_data is None:
-        posts_data = []
-    
-    if isinstance(data, dict):
-        if 'text' in data or ('caption' in data and isinstance(data.get('caption'), dict) and 'text' in data.get('caption')):
-            text = data.get('text') or (data.get('caption', {}).get('text', '') if isinstance(data.get('caption'), dict) else '')
-            if text:
-                post = {
-                    'id': data.get('id') or data.get('pk'),
-                    'text': text,
-                    'like_count': data.get('like_count') or data.get('num_likes'),
-                    'reply_count': data.get('reply_count') or data.get('num_replies'),
-                    'timestamp': data.get('taken_at') or data.get('created_at')
-                }
-                posts_data.append(post)
-        
-        for value in data.values():
-            extract_posts_from_json(value, posts_data)
-    
-    elif isinstance(data, list):
-        for item in data:
-            extract_posts_from_json(item, posts_data)
-    
-    return posts_data
-
-
 if __name__ == "__main__":
     print("使用 Selenium 爬取 Threads 資料（不需要登入）")
     print("=" * 50)
@@ -269,8 +161,7 @@ if __name__ == "__main__":
         print(f"\n成功抓取 {len(posts)} 則貼文")
         print("\n前 3 則貼文預覽:")
         for i, post in enumerate(posts[:3], 1):
-            text = post.get('text', '')[:100]
-            print(f"\n{i}. {text}...")
+            print(f"\n{i}. {post.text[:100]}...")
     else:
         print("\n未能抓取到資料")
         print("提示：")
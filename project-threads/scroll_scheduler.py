@@ -0,0 +1,210 @@
+import asyncio
+import time
+
+# 瀏覽器爬蟲共用的自適應滾動排程 (Selenium / Playwright 版本共用)
+#
+# 取代固定的 time.sleep：每次滾動後持續觀察頁面，
+# 一看到新的貼文節點 (或頁面變高) 就立即繼續；
+# 網路已閒置一段時間仍沒有新內容、或等待超過上限時，視為一次「空滾動」。
+# 連續數次空滾動或超過每個帳號的時間預算就提前停止。
+
+# 回傳 [符合選擇器的節點數, 頁面高度, 網路閒置的毫秒數]
+# 第一次呼叫時包裝 fetch / XMLHttpRequest 來計算進行中的請求，
+# 還有請求進行中時閒置毫秒數為 0，否則為距離最後一個請求完成的時間
+PROBE_JS = """
+(selector) => {
+    if (!window.__threadsNetwork) {
+        const net = window.__threadsNetwork = {pending: 0};
+        const done = () => { net.pending = Math.max(0, net.pending - 1); };
+        const send = XMLHttpRequest.prototype.send;
+        XMLHttpRequest.prototype.send = function (...args) {
+            net.pending++;
+            this.addEventListener('loadend', done);
+            return send.apply(this, args);
+        };
+        const fetch = window.fetch;
+        if (fetch) {
+            window.fetch = function (...args) {
+                net.pending++;
+                return fetch.apply(this, args).finally(done);
+            };
+        }
+    }
+    const entries = performance.getEntriesByType('resource');
+    const lastEnd = entries.length ? entries[entries.length - 1].responseEnd : 0;
+    return [
+        document.querySelectorAll(selector).length,
+        document.body ? document.body.scrollHeight : 0,
+        window.__threadsNetwork.pending ? 0 : performance.now() - lastEnd
+    ];
+}
+"""
+
+SCROLL_JS = "window.scrollTo(0, document.body.scrollHeight)"
+
+
+def check_progress(observation, baseline, start, deadline, idle_time):
+    """
+    wait_for_progress 每次觀察後的判斷 (同步 / 非同步版本共用)
+    回傳 True (有新內容)、False (放棄等待) 或 None (繼續等待)
+    """
+    count, height, idle_ms = observation
+    if count > baseline[0] or height > baseline[1]:
+        return True
+    now = time.monotonic()
+    # 網路已閒置 idle_time 秒仍沒有新節點，不必等到上限
+    if now - start >= idle_time and idle_ms >= idle_time * 1000:
+        return False
+    if now >= deadline:
+        return False
+    return None
+
+
+def wait_for_progress(probe, baseline, deadline, idle_time=0.5, poll_interval=0.1):
+    """
+    等待頁面出現新內容
+    baseline: 上一次的 (節點數, 頁面高度)
+    回傳 (是否有新內容, 最新的 (節點數, 頁面高度))
+    """
+    start = time.monotonic()
+    while True:
+        observation = probe()
+        progress = check_progress(observation, baseline, start, deadline, idle_time)
+        if progress is not None:
+            return progress, tuple(observation[:2])
+        time.sleep(poll_interval)
+
+
+async def wait_for_progress_async(probe, baseline, deadline, idle_time=0.5, poll_interval=0.1):
+    """
+    wait_for_progress 的非同步版本 (probe 為 coroutine function)
+    """
+    start = time.monotonic()
+    while True:
+        observation = await probe()
+        progress = check_progress(observation, baseline, start, deadline, idle_time)
+        if progress is not None:
+            return progress, tuple(observation[:2])
+        await asyncio.sleep(poll_interval)
+
+
+def scroll_plan(collecting, target=None, max_scrolls=30, settle_timeout=3.0, idle_time=0.5,
+                max_empty_scrolls=3, time_budget=None, verbose=True):
+    """
+    自適應滾動的排程決策 (同步 / 非同步版本共用)，本身不碰瀏覽器：
+    產生要執行的步驟，由呼叫端執行後把結果 send 回來，結束時以 StopIteration.value 回傳統計資料
+    - ('wait', baseline, deadline, idle_time): 執行 wait_for_progress，送回最新的 (節點數, 頁面高度)
+    - ('scroll',): 滾動一次
+    - ('collect',): 收集新貼文，送回新增的貼文數
+    """
+    start = time.monotonic()
+    budget_end = start + time_budget if time_budget is not None else float('inf')
+    stats = {'scrolls': 0, 'empty_scrolls': 0, 'collected': 0, 'stop_reason': 'max_scrolls'}
+
+    # 先等第一批貼文出現 (取代一開始固定的等待)
+    # 頁面一開始發出的請求追蹤不到，所以這裡不用網路閒置提早結束
+    state = yield ('wait', (0, 0), min(start + settle_timeout, budget_end), settle_timeout)
+    if collecting:
+        stats['collected'] += yield ('collect',)
+
+    empty_streak = 0
+    for i in range(max_scrolls):
+        if target is not None and stats['collected'] >= target:
+            stats['stop_reason'] = 'target'
+            break
+        if time.monotonic() >= budget_end:
+            stats['stop_reason'] = 'time_budget'
+            break
+
+        previous_count = state[0]
+        yield ('scroll',)
+        stats['scrolls'] += 1
+        deadline = min(time.monotonic() + settle_timeout, budget_end)
+        state = yield ('wait', state, deadline, idle_time)
+
+        # 只有頁面變高但沒有新貼文也算空滾動
+        if collecting:
+            added = yield ('collect',)
+        else:
+            added = max(state[0] - previous_count, 0)
+        stats['collected'] += added
+        if verbose:
+            print(f"已滾動 {i+1}/{max_scrolls} 次，新增 {added} 則")
+
+        if added:
+            empty_streak = 0
+        else:
+            empty_streak += 1
+            stats['empty_scrolls'] += 1
+            if empty_streak >= max_empty_scrolls:
+                stats['stop_reason'] = 'no_new_content'
+                break
+    else:
+        if target is not None and stats['collected'] >= target:
+            stats['stop_reason'] = 'target'
+
+    stats['elapsed'] = time.monotonic() - start
+    return stats
+
+
+def adaptive_scroll(probe, scroll, collect=None, target=None, max_scrolls=30,
+                    settle_timeout=3.0, idle_time=0.5, poll_interval=0.1,
+                    max_empty_scrolls=3, time_budget=None):
+    """
+    自適應滾動，回傳統計資料 dict
+
+    probe(): 回傳 PROBE_JS 的結果
+    scroll(): 滾動一次
+    collect(): 每次滾動後呼叫，回傳新增的貼文數；沒有提供時以新增的節點數代替
+    target: 收集到這麼多則貼文就停止
+    settle_timeout: 每次滾動後最多等待的秒數
+    max_empty_scrolls: 連續幾次滾動沒有新貼文就停止
+    time_budget: 每個帳號的時間上限 (秒)
+    """
+    plan = scroll_plan(collect is not None, target, max_scrolls, settle_timeout, idle_time,
+                       max_empty_scrolls, time_budget)
+    result = None
+    try:
+        while True:
+            step = plan.send(result)
+            if step[0] == 'wait':
+                _, result = wait_for_progress(probe, *step[1:], poll_interval)
+            elif step[0] == 'scroll':
+                result = scroll()
+            else:
+                result = collect()
+    except StopIteration as done:
+        return done.value
+
+
+async def adaptive_scroll_async(probe, scroll, collect=None, target=None, max_scrolls=30,
+                                settle_timeout=3.0, idle_time=0.5, poll_interval=0.1,
+                                max_empty_scrolls=3, time_budget=None):
+    """
+    adaptive_scroll 的非同步版本 (probe / scroll / collect 皆為 coroutine function)
+    """
+    plan = scroll_plan(collect is not None, target, max_scrolls, settle_timeout, idle_time,
+                       max_empty_scrolls, time_budget, verbose=False)
+    result = None
+    try:
+        while True:
+            step = plan.send(result)
+            if step[0] == 'wait':
+                _, result = await wait_for_progress_async(probe, *step[1:], poll_interval)
+            elif step[0] == 'scroll':
+                result = await scroll()
+            else:
+                result = await collect()
+    except StopIteration as done:
+        return done.value
+
+
+def format_stats(stats):
+    reasons = {
+        'target': '已收集到足夠的貼文',
+        'no_new_content': '連續滾動沒有新內容',
+        'time_budget': '超過時間預算',
+        'max_scrolls': '達到滾動次數上限',
+    }
+    return (f"滾動 {stats['scrolls']} 次 (空滾動 {stats['empty_scrolls']} 次)，"
+            f"耗時 {stats['elapsed']:.1f} 秒，停止原因: {reasons[stats['stop_reason']]}")
@@ -0,0 +1,117 @@
+from urllib.parse import urlparse
+
+# Playwright 爬蟲共用的「只抓文字」模式
+#
+# 只需要貼文文字，所以圖片、影片、字型、CSS 與第三方追蹤腳本都直接中止 (route.abort)，
+# 並關閉動畫；同時統計每個頁面實際傳輸的位元組數，方便比較。
+# 以下函式的 target 可以是 page 或 context (兩者都有 route / on)。
+
+BLOCKED_RESOURCE_TYPES = {'image', 'media', 'font', 'stylesheet'}
+
+TRACKER_HOSTS = (
+    'google-analytics.com',
+    'googletagmanager.com',
+    'doubleclick.net',
+    'connect.facebook.net',
+    'facebook.com/tr',
+)
+
+# 關閉 CSS 動畫與轉場 (搭配 context 的 reduced_motion='reduce')
+# init script 在解析器建立 <html> 之前執行，此時 document.documentElement 還是 null，
+# 所以等 <html> 出現 (MutationObserver) 後再插入樣式
+DISABLE_ANIMATIONS_JS = """
+(() => {
+    const inject = () => {
+        const style = document.createElement('style');
+        style.textContent = '*, *::before, *::after { animation: none !important; transition: none !important; scroll-behavior: auto !important; }';
+        document.documentElement.appendChild(style);
+    };
+    if (document.documentElement) {
+        inject();
+        return;
+    }
+    const observer = new MutationObserver(() => {
+        if (document.documentElement) {
+            observer.disconnect();
+            inject();
+        }
+    });
+    observer.observe(document, {childList: true});
+})();
+"""
+
+CONTEXT_OPTIONS = {'reduced_motion': 'reduce'}
+
+
+def should_block(resource_type, url, tracker_hosts=TRACKER_HOSTS):
+    """
+    判斷一個請求在只抓文字模式下是否要中止
+    """
+    if resource_type in BLOCKED_RESOURCE_TYPES:
+        return True
+    parsed = urlparse(url)
+    target = parsed.netloc + parsed.path
+    return any(host in target for host in tracker_hosts)
+
+
+def new_traffic():
+    return {'requests': 0, 'bytes': 0, 'blocked': 0}
+
+
+def _add_sizes(traffic, sizes):
+    traffic['requests'] += 1
+    traffic['bytes'] += max(sizes.get('responseBodySize', 0), 0) + max(sizes.get('responseHeadersSize', 0), 0)
+
+
+def track_traffic(target, traffic):
+    """
+    統計完成的請求數與傳輸位元組數 (sync API)
+    """
+    target.on('requestfinished', lambda request: _add_sizes(traffic, request.sizes()))
+
+
+def install_text_only(target, traffic, tracker_hosts=TRACKER_HOSTS):
+    """
+    啟用只抓文字模式 (sync API)
+    """
+    def handle(route):
+        request = route.request
+        if should_block(request.resource_type, request.url, tracker_hosts):
+            traffic['blocked'] += 1
+            route.abort()
+        else:
+            route.continue_()
+
+    target.add_init_script(DISABLE_ANIMATIONS_JS)
+    target.route('**/*', handle)
+
+
+def track_traffic_async(target, traffic):
+    """
+    track_traffic 的非同步版本
+    """
+    async def on_finished(request):
+        _add_sizes(traffic, await request.sizes())
+
+    target.on('requestfinished', on_finished)
+
+
+async def install_text_only_async(target, traffic, tracker_hosts=TRACKER_HOSTS):
+    """
+    install_text_only 的非同步版本
+    """
+    async def handle(route):
+        request = route.request
+        if should_block(request.resource_type, request.url, tracker_hosts):
+            traffic['blocked'] += 1
+            await route.abort()
+        else:
+            await route.continue_()
+
+    await target.add_init_script(DISABLE_ANIMATIONS_JS)
+    await target.route('**/*', handle)
+
+
+def format_traffic(traffic):
+    return (f"傳輸 {traffic['bytes'] / 1024:.1f} KB ({traffic['requests']} 個請求)，"
+            f"中止 {traffic['blocked']} 個請求")
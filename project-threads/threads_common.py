@@ -0,0 +1,394 @@
+import gzip
+import hashlib
+import json
+import os
+import sys
+import time
+import zlib
+from collections import deque
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, asdict
+from threads_parser import clean_text
+
+# near_dup.py 和 YouTube 留言分析共用，只放在 project/ 一份
+PROJECT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'project')
+if PROJECT_DIR not in sys.path:
+    sys.path.append(PROJECT_DIR)
+from near_dup import NearDuplicateIndex
+
+# 各個 Threads 爬蟲共用的貼文格式、去重與輸出
+#
+# 爬蟲 (backend) 只負責產生貼文 dict 或 Post，
+# 之後統一經過 normalize_post -> PostDeduper -> sink 寫出。
+
+# 輸出格式: 'jsonl' (每行一則，邊爬邊寫)、'jsonl.gz' (gzip 壓縮的 jsonl)、'json' (結束時寫出整個陣列)
+OUTPUT_FORMAT = 'jsonl'
+
+OUTPUT_SUFFIXES = {
+    'json': '_threads.json',
+    'jsonl': '_threads.jsonl',
+    'jsonl.gz': '_threads.jsonl.gz',
+}
+
+
+@dataclass(slots=True)
+class Post:
+    text: str
+    id: str = None
+    like_count: int = None
+    reply_count: int = None
+    timestamp: int = None
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            text=data.get('text') or '',
+            id=data.get('id'),
+            like_count=data.get('like_count'),
+            reply_count=data.get('reply_count'),
+            timestamp=data.get('timestamp'),
+        )
+
+    def to_dict(self):
+        return asdict(self)
+
+
+def normalize_post(post):
+    """
+    把 dict 或 Post 整理成 Post：清理無法編碼的字元、合併多餘空白
+    """
+    if not isinstance(post, Post):
+        post = Post.from_dict(post)
+    post.text = ' '.join(clean_text(post.text).split())
+    if post.id is not None:
+        post.id = str(post.id)
+    return post
+
+
+class PostDeduper:
+    """
+    有 ID 的貼文只依 ID 去重 (不檢查長度或文字，API 回傳的短貼文也會保留)；
+    沒有 ID 的貼文以文字前 100 個字為鍵去重，並過濾太短的文字。
+    有 ID 的貼文文字也會記下，之後同樣文字但沒有 ID 的副本 (例如頁面中零散的 "text" 字串) 會被排除。
+    沒有 ID 的貼文在 near_duplicates=True 時另外排除空白不同或只差幾個字的近似重複
+    (SimHash 索引，最多記住 max_entries 則)。
+    不以「互相包含」判斷重複：父節點的文字包含子節點的貼文時，子節點的貼文仍要保留。
+    """
+    def __init__(self, min_length=10, near_duplicates=True, max_entries=100_000):
+        self.min_length = min_length
+        self.seen_ids = set()
+        self.seen_texts = set()
+        self.index = NearDuplicateIndex(max_entries=max_entries) if near_duplicates else None
+
+    def add(self, post):
+        """
+        回傳 True 代表是新的貼文
+        """
+        if post.id is not None:
+            if post.id in self.seen_ids:
+                return False
+            self.seen_ids.add(post.id)
+            self.seen_texts.add(post.text[:100])
+            if self.index is not None:
+                self.index.add(post.text)
+            return True
+
+        if len(post.text) <= self.min_length:
+            return False
+        text_key = post.text[:100]
+        if text_key in self.seen_texts:
+            return False
+        if self.index is not None and self.index.add(post.text):
+            return False
+        self.seen_texts.add(text_key)
+        return True
+
+
+class JsonFileSink:
+    """
+    把貼文寫成 {username}_threads.json (JSON 陣列，結束時一次寫出)
+    """
+    def __init__(self, path):
+        self.path = path
+        self.posts = []
+
+    @property
+    def written(self):
+        return len(self.posts)
+
+    def write(self, post):
+        self.posts.append(post.to_dict())
+        return True
+
+    def close(self):
+        if self.posts:
+            with open(self.path, 'w', encoding='utf-8') as f:
+                json.dump(self.posts, f, ensure_ascii=False, indent=4)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def text_hash(text):
+    return hashlib.blake2b(text.encode('utf-8', 'surrogatepass'), digest_size=8).digest()
+
+
+class JsonlSink:
+    """
+    每則貼文一行、附加寫入的 JSONL 檔 (.gz 結尾時以 gzip 壓縮)
+    每 flush_every 則或每 flush_interval 秒 flush 一次，程式中斷時最多只損失最後一小段。
+    檔案中已經有的貼文 (上次中斷前寫入的) 不會重複寫入：開檔時只讀出已有貼文的 ID，
+    沒有 ID 的貼文只記文字的 64-bit 雜湊 (最多 max_texts 則，超過時忘掉最舊的)，
+    不會把整個檔案的內容留在記憶體中。
+    """
+    def __init__(self, path, flush_every=50, flush_interval=5.0, max_texts=100_000):
+        self.path = path
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.file = None
+        self.written = 0
+        self.pending = 0
+        self.last_flush = time.monotonic()
+        self.existing_ids = set()
+        self.existing_texts = set()
+        self.text_order = deque()
+        self.max_texts = max_texts
+        if path.endswith('.gz') and os.path.exists(path):
+            repair_gzip(path)
+        for record in iter_jsonl(path):
+            if record.get('id') is not None:
+                self.existing_ids.add(str(record['id']))
+            elif record.get('text'):
+                self._remember_text(text_hash(record['text']))
+
+    def _remember_text(self, key):
+        self.existing_texts.add(key)
+        self.text_order.append(key)
+        if len(self.text_order) > self.max_texts:
+            self.existing_texts.discard(self.text_order.popleft())
+
+    def _is_written(self, post):
+        if post.id is not None:
+            if post.id in self.existing_ids:
+                return True
+            self.existing_ids.add(post.id)
+            return False
+        key = text_hash(post.text)
+        if key in self.existing_texts:
+            return True
+        self._remember_text(key)
+        return False
+
+    def _open(self):
+        if self.path.endswith('.gz'):
+            # gzip 附加寫入會產生新的 member，讀取時會自動接起來 (開檔時已經修復過中斷的 member)
+            self.file = gzip.open(self.path, 'at', encoding='utf-8')
+            return
+        needs_newline = False
+        if os.path.exists(self.path) and os.path.getsize(self.path):
+            with open(self.path, 'rb') as f:
+                f.seek(-1, os.SEEK_END)
+                needs_newline = f.read(1) != b'\n'
+        self.file = open(self.path, 'a', encoding='utf-8')
+        if needs_newline:
+            # 上次中斷時最後一行沒寫完，先換行避免和新資料黏在一起
+            self.file.write('\n')
+
+    def write(self, post):
+        """
+        回傳 True 代表有寫入 (檔案中還沒有這則貼文)
+        """
+        if self._is_written(post):
+            return False
+        if self.file is None:
+            self._open()
+        self.file.write(json.dumps(post.to_dict(), ensure_ascii=False) + '\n')
+        self.written += 1
+        self.pending += 1
+        if self.pending >= self.flush_every or time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+        return True
+
+    def flush(self):
+        if self.file is not None:
+            self.file.flush()
+        self.pending = 0
+        self.last_flush = time.monotonic()
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def gzip_member_end(path):
+    """
+    回傳 gzip 檔中完整的 member 結束的位置 (之後是寫入途中被中斷的 member)
+    """
+    good = offset = 0
+    decompressor = zlib.decompressobj(wbits=31)
+    with open(path, 'rb') as f:
+        while chunk := f.read(1 << 16):
+            while chunk:
+                try:
+                    decompressor.decompress(chunk)
+                except zlib.error:
+                    return good
+                if not decompressor.eof:
+                    offset += len(chunk)
+                    break
+                offset += len(chunk) - len(decompressor.unused_data)
+                good = offset
+                chunk = decompressor.unused_data
+                decompressor = zlib.decompressobj(wbits=31)
+    return good
+
+
+def repair_gzip(path):
+    """
+    把寫入途中被中斷的 gzip member 截掉：完整的行 (flush 過的部分) 重新寫成一個新的 member，
+    之後附加寫入的 member 才讀得到
+    """
+    end = gzip_member_end(path)
+    if end == os.path.getsize(path):
+        return
+    data = b''
+    decompressor = zlib.decompressobj(wbits=31)
+    with open(path, 'rb') as f:
+        f.seek(end)
+        while chunk := f.read(4096):
+            try:
+                data += decompressor.decompress(chunk)
+            except zlib.error:
+                break
+    lines = data[:data.rfind(b'\n') + 1]
+    print(f"修復中斷的 {path}：保留未完成區段中的 {len(lines.splitlines())} 行")
+    os.truncate(path, end)
+    if lines:
+        with gzip.open(path, 'ab') as f:
+            f.write(lines)
+
+
+def iter_jsonl(path):
+    """
+    逐行讀取 JSONL (或 .jsonl.gz)，不會把整個檔案載入記憶體
+    中斷時沒寫完的最後一行 (或 gzip member) 會被略過
+    """
+    if not os.path.exists(path):
+        return
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8') as f:
+        try:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+        except (EOFError, zlib.error, gzip.BadGzipFile):
+            # gzip 檔在寫入途中被中斷
+            return
+
+
+def output_path(username, output_format=OUTPUT_FORMAT):
+    return f"{username}{OUTPUT_SUFFIXES[output_format]}"
+
+
+def open_sink(username, output_format=OUTPUT_FORMAT):
+    """
+    依輸出格式建立 {username}_threads.* 的 sink
+    """
+    path = output_path(username, output_format)
+    if output_format == 'json':
+        return JsonFileSink(path)
+    return JsonlSink(path)
+
+
+def unique_posts(posts, deduper=None, max_posts=None):
+    """
+    依序整理並去重，產生 Post
+    """
+    deduper = deduper or PostDeduper()
+    count = 0
+    for post in posts:
+        if max_posts is not None and count >= max_posts:
+            return
+        post = normalize_post(post)
+        if deduper.add(post):
+            count += 1
+            yield post
+
+
+def collect_posts(posts_data, new_posts, deduper, max_posts, sink=None):
+    """
+    瀏覽器爬蟲邊滾動邊收集：新貼文整理、去重後加入 posts_data (最多 max_posts 則)，
+    有提供 sink 時立即寫入；回傳新增的貼文數
+    """
+    added = 0
+    for post in unique_posts(new_posts, deduper, max_posts=max_posts - len(posts_data)):
+        posts_data.append(post)
+        if sink is not None:
+            sink.write(post)
+        added += 1
+    return added
+
+
+def save_posts(username, posts, max_posts=None, output_format=OUTPUT_FORMAT):
+    """
+    整理、去重後逐則寫入 {username}_threads.*，回傳本次取得的 Post 列表
+    沒有任何貼文時不建立檔案
+    """
+    results = []
+    with open_sink(username, output_format) as sink:
+        for post in unique_posts(posts, max_posts=max_posts):
+            sink.write(post)
+            results.append(post)
+    if results:
+        print(f"成功抓取 {len(results)} 則貼文，新增 {sink.written} 則到 {sink.path}")
+    return results
+
+
+class Backend(ABC):
+    """
+    爬蟲後端的共同介面
+    name: 顯示用名稱
+    fetch(username, max_posts): 回傳貼文 dict 或 Post 的可迭代物件 (不需自行去重或存檔)
+    """
+    name = 'backend'
+
+    @abstractmethod
+    def fetch(self, username, max_posts):
+        ...
+
+
+def run_backends(username, backends, max_posts=10, save=True, output_format=OUTPUT_FORMAT):
+    """
+    依序嘗試各個後端 (應由便宜到昂貴排列)，第一個有產出貼文的就停止
+    回傳 (使用的後端名稱, Post 列表)
+    """
+    for backend in backends:
+        print(f"@{username}: 使用 {backend.name} ...")
+        try:
+            posts = list(unique_posts(backend.fetch(username, max_posts), max_posts=max_posts))
+        except Exception as e:
+            print(f"@{username}: {backend.name} 失敗: {e}")
+            continue
+
+        if posts:
+            if save:
+                save_posts(username, posts, output_format=output_format)
+            return backend.name, posts
+        print(f"@{username}: {backend.name} 沒有取得貼文，改用下一個方法")
+
+    return None, []
@@ -0,0 +1,286 @@
+import json
+import re
+
+# Threads 頁面內嵌資料的共用解析工具 (Selenium / Playwright 版本共用)
+#
+# 做法：用一個合併的 regex 找出所有 JSON 的起點 (錨點)，
+# 再用 json.JSONDecoder.raw_decode 從起點直接解析出一個完整的 JSON 值，
+# 解析成功後從該值的結尾繼續掃描，所以每個位元組最多只會被掃過兩次
+# (解析失敗時會從錨點後面重新掃描)。
+# 含有 "thread_items" 的 <script> 不整段解析，而是繼續掃描它的內容，
+# 只解析 thread_items 子樹，跳過使用者、圖片等大量不可能是貼文的資料。
+
+ANCHOR_PATTERN = re.compile(
+    r'<script\b[^>]*\btype="application/(?:ld\+)?json"[^>]*>'  # <script type="application/json">
+    r'|__NEXT_DATA__\s*=\s*'
+    r'|window\.__initialData__\s*=\s*'
+    r'|"thread_items"\s*:\s*'
+    r'|"text"\s*:\s*(?=")'                                      # 零散的 "text": "..." 字串
+)
+
+_decoder = json.JSONDecoder()
+
+
+def iter_json_payloads(page_source):
+    """
+    單次掃描頁面原始碼，依序產生 (種類, JSON 值)
+    種類為 'payload' (完整的 JSON 資料)、'thread_items' (thread_items 列表)
+    或 'text' (不在任何 JSON 資料內的 "text" 字串)
+    """
+    pos = 0
+    length = len(page_source)
+    while True:
+        match = ANCHOR_PATTERN.search(page_source, pos)
+        if not match:
+            return
+
+        start = match.end()
+        if match.group().startswith('<script'):
+            close = page_source.find('</script', start)
+            if page_source.find('"thread_items"', start, close if close != -1 else length) != -1:
+                pos = start
+                continue
+        while start < length and page_source[start] in ' \t\r\n':
+            start += 1
+
+        try:
+            value, end = _decoder.raw_decode(page_source, start)
+        except ValueError:
+            # 不是合法的 JSON (例如 script 裡是 JS 程式碼)，從錨點後繼續找
+            pos = match.end()
+            continue
+
+        anchor = match.group()
+        if anchor.startswith('"text"'):
+            kind = 'text'
+        elif anchor.startswith('"thread_items"'):
+            kind = 'thread_items'
+        else:
+            kind = 'payload'
+        yield kind, value
+        pos = end
+
+
+def clean_text(text):
+    """
+    清理代理對 (surrogate pairs) 問題，避免寫入 JSON 時發生 UnicodeEncodeError
+    """
+    return text.encode('utf-8', errors='ignore').decode('utf-8', errors='ignore')
+
+
+def _post_from_dict(data):
+    """
+    如果這個 dict 看起來是一則貼文 (有 text 或 caption.text)，回傳整理好的貼文 dict
+    """
+    caption = data.get('caption')
+    caption_is_dict = isinstance(caption, dict)
+    if 'text' not in data and not (caption_is_dict and 'text' in caption):
+        return None
+
+    text = data.get('text') or (caption.get('text', '') if caption_is_dict else '')
+    if not text or not isinstance(text, str):
+        return None
+
+    return {
+        'id': data.get('id') or data.get('pk'),
+        'text': text,
+        'like_count': data.get('like_count') or data.get('num_likes'),
+        'reply_count': data.get('reply_count') or data.get('num_replies'),
+        'timestamp': data.get('taken_at') or data.get('created_at')
+    }
+
+
+# --- 欄位路徑索引 ---
+# 路徑語法: "thread_items[*].post"，key 用 "." 分隔，"[*]" 代表列表中的每一項，
+# 開頭的 "**" 代表可以出現在任何深度。路徑結尾的 ".caption.text" / ".text" 可省略，
+# 指向的都是貼文本身的 dict。
+
+PATH_TOKEN_PATTERN = re.compile(r'\[\*\]|[^.\[\]]+')
+
+# Threads GraphQL 回應中貼文的常見位置
+DEFAULT_POST_PATHS = ['**.thread_items[*].post']
+
+
+def _parse_path(path):
+    tokens = PATH_TOKEN_PATTERN.findall(path)
+    for suffix in (['caption', 'text'], ['text']):
+        if tokens[-len(suffix):] == suffix:
+            tokens = tokens[:-len(suffix)]
+            break
+    return tokens
+
+
+def _format_path(tokens):
+    path = ''
+    for token in tokens:
+        if token == '[*]':
+            path += token
+        else:
+            path += ('.' if path else '') + token
+    return path
+
+
+def compile_post_paths(paths):
+    """
+    把路徑列表編譯成前綴樹 (trie)，None 代表「這裡是一則貼文」
+    """
+    index = {}
+    for path in paths:
+        node = index
+        for token in _parse_path(path):
+            node = node.setdefault(token, {})
+        node[None] = True
+    return index
+
+
+def learn_post_paths(data):
+    """
+    完整走訪一次 JSON，記錄每則貼文所在的路徑 (列表索引一律寫成 [*])
+    學到的路徑可以用 compile_post_paths 編譯後，讓之後同結構的頁面只走這些路徑
+    """
+    paths = set()
+    stack = [(data, ())]
+    while stack:
+        node, tokens = stack.pop()
+        if isinstance(node, dict):
+            if _post_from_dict(node) is not None:
+                paths.add(_format_path(tokens))
+            for key, value in node.items():
+                if isinstance(value, (dict, list)):
+                    stack.append((value, tokens + (key,)))
+        elif isinstance(node, list):
+            for item in node:
+                if isinstance(item, (dict, list)):
+                    stack.append((item, tokens + ('[*]',)))
+    return sorted(paths)
+
+
+def _iter_posts_indexed(data, index):
+    """
+    只沿著索引中的路徑走，其他不可能有貼文的子樹直接略過
+    """
+    emitted = set()
+    stack = [(data, index)]
+    while stack:
+        node, trie = stack.pop()
+        children = []
+        if '**' in trie:
+            # "**": 在這一層嘗試比對剩下的路徑，同時帶著 "**" 繼續往下找
+            children.append((node, trie['**']))
+            values = node.values() if isinstance(node, dict) else node if isinstance(node, list) else ()
+            children.extend((value, trie) for value in values if isinstance(value, (dict, list)))
+        if isinstance(node, dict):
+            if None in trie and id(node) not in emitted:
+                post = _post_from_dict(node)
+                if post is not None:
+                    emitted.add(id(node))
+                    yield post
+            for key, sub_trie in trie.items():
+                if key is not None and key != '**' and key != '[*]' and key in node:
+                    children.append((node[key], sub_trie))
+        elif isinstance(node, list) and '[*]' in trie:
+            sub_trie = trie['[*]']
+            children.extend((item, sub_trie) for item in node)
+        # 反向放入堆疊，維持文件中的順序
+        stack.extend(reversed(children))
+
+
+def iter_posts_from_json(data, index=None):
+    """
+    以明確的堆疊 (非遞迴) 走訪 JSON，依文件順序逐一產生貼文
+    深層巢狀的 GraphQL 回應也不會超過 Python 的遞迴上限
+
+    index: compile_post_paths() 的結果；有提供時只走索引中的路徑
+    """
+    if index is not None:
+        yield from _iter_posts_indexed(data, index)
+        return
+
+    # 堆疊中放的是各層容器的 iterator，不需要另外建立子節點列表
+    # (json.loads 只會產生 dict / list，所以直接比對型別；沒有 text / caption 的 dict 不必檢查)
+    stack = [iter((data,))]
+    push, pop = stack.append, stack.pop
+    while stack:
+        for node in stack[-1]:
+            node_type = type(node)
+            if node_type is dict:
+                if 'text' in node or 'caption' in node:
+                    post = _post_from_dict(node)
+                    if post is not None:
+                        yield post
+                push(iter(node.values()))
+                break
+            if node_type is list:
+                push(iter(node))
+                break
+        else:
+            pop()
+
+
+def iter_posts_from_thread_items(thread_items):
+    """
+    thread_items 列表中的貼文：每一項的 post (或該項本身)，不走訪使用者、圖片等其他子樹
+    """
+    if not isinstance(thread_items, list):
+        return
+    for item in thread_items:
+        if isinstance(item, dict):
+            post = item.get('post', item)
+            if isinstance(post, dict):
+                post = _post_from_dict(post)
+                if post is not None:
+                    yield post
+
+
+def extract_posts_from_json(data, posts_data=None, index=None):
+    """
+    搜尋 JSON 資料中的貼文資訊，回傳列表 (iter_posts_from_json 的列表版本)
+    """
+    if posts_data is None:
+        posts_data = []
+    posts_data.extend(iter_posts_from_json(data, index))
+    return posts_data
+
+
+def extract_posts_from_page_source(page_source, index=None):
+    """
+    從頁面原始碼中提取貼文 (內嵌 JSON 資料 + 零散的 "text" 字串)
+    """
+    posts_data = []
+
+    for kind, value in iter_json_payloads(page_source):
+        if kind == 'thread_items':
+            if index is None:
+                posts_data.extend(iter_posts_from_thread_items(value))
+            else:
+                # 索引的路徑是從包含 thread_items 的物件開始寫的
+                posts_data.extend(iter_posts_from_json({'thread_items': value}, index))
+            continue
+        if kind == 'payload':
+            posts_data.extend(iter_posts_from_json(value, index))
+            continue
+
+        text = clean_text(value)
+        # 過濾太短或明顯不是貼文的文字
+        if len(text) > 15 and not text.startswith('http') and 'text' not in text.lower()[:10]:
+            posts_data.append({
+                'text': text,
+                'id': None,
+                'like_count': None,
+                'reply_count': None,
+                'timestamp': None
+            })
+
+    # 去重（基於文字內容）
+    seen = set()
+    unique_posts = []
+    for post in posts_data:
+        text = clean_text(post.get('text', '')).strip()
+        # 使用文字的前 100 個字符作為唯一標識
+        text_key = text[:100]
+        if text and text_key not in seen and len(text) > 15:
+            seen.add(text_key)
+            post['text'] = text
+            unique_posts.append(post)
+
+    return unique_posts
@@ -0,0 +1,206 @@
+import os
+import json
+import time
+import asyncio
+import base64
+from cryptography.fernet import Fernet, InvalidToken
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+
+# 重複使用 Threads API 的登入狀態
+#
+# 登入是最慢、也最容易觸發驗證挑戰 (2FA) 的一步，所以登入成功後把 token、
+# 授權標頭與 instagrapi 的 session (cookies、裝置 ID) 加密存到本機檔案，
+# 下次執行直接還原，不需要任何網路請求；只有請求回報登入失效時才重新登入。
+#
+# 加密金鑰預設由帳號密碼 (PBKDF2) 推導，也可以用環境變數 THREADS_SESSION_KEY
+# 直接指定一把 Fernet 金鑰 (Fernet.generate_key())，省下推導的時間。
+
+SESSION_FILE = "threads_session.enc"
+SESSION_MAX_AGE = 30 * 24 * 3600  # 儲存超過 30 天的登入狀態直接重新登入
+KDF_ITERATIONS = 300_000
+SALT_SIZE = 16
+
+# 回應或例外訊息中出現這些字樣時視為登入失效
+AUTH_ERROR_MARKERS = ('login_required', 'not-logged-in', 'logged out', 'challenge_required',
+                      'can only be perfomed while logged-in')
+
+
+def is_auth_error(error):
+    if type(error).__name__ == 'LoggedOutException':
+        return True
+    message = str(error)
+    return any(marker in message for marker in AUTH_ERROR_MARKERS)
+
+
+class SessionStore:
+    """
+    加密的登入狀態檔：前 16 bytes 是 salt，後面是 Fernet token (內含寫入時間，用來判斷是否過期)
+    """
+    def __init__(self, path=SESSION_FILE, password=None, key=None, max_age=SESSION_MAX_AGE):
+        self.path = path
+        self.password = password
+        self.key = key or os.environ.get('THREADS_SESSION_KEY')
+        self.max_age = max_age
+        if not self.key and not password:
+            raise ValueError("需要 password 或 key 才能加密登入狀態")
+
+    def _fernet(self, salt):
+        if self.key:
+            return Fernet(self.key)
+        kdf = PBKDF2HMAC(algorithm=hashes.SHA256(), length=32, salt=salt, iterations=KDF_ITERATIONS)
+        return Fernet(base64.urlsafe_b64encode(kdf.derive(self.password.encode('utf-8'))))
+
+    def load(self):
+        """
+        回傳儲存的登入狀態 dict；沒有檔案、過期、金鑰不符或檔案損毀時回傳 None
+        """
+        try:
+            with open(self.path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        salt, token = data[:SALT_SIZE], data[SALT_SIZE:]
+        try:
+            return json.loads(self._fernet(salt).decrypt(token, ttl=self.max_age))
+        except (InvalidToken, ValueError):
+            print("已儲存的登入狀態過期或無法解密，重新登入")
+            return None
+
+    def save(self, state):
+        salt = os.urandom(SALT_SIZE)
+        token = self._fernet(salt).encrypt(json.dumps(state).encode('utf-8'))
+        # 先寫暫存檔再取代；檔案權限只給自己讀寫
+        tmp_path = self.path + '.tmp'
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(salt + token)
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def _instagrapi_client(api):
+    return getattr(getattr(api, '_auth_session', None), '_instagrapi_client', None)
+
+
+def export_session(api):
+    """
+    取出 ThreadsAPI 登入後的狀態 (可 JSON 序列化)
+    """
+    state = {
+        'username': api.username,
+        'token': api.token,
+        'user_id': api.user_id,
+        'auth_headers': api.auth_headers,
+        'saved_at': time.time(),
+    }
+    client = _instagrapi_client(api)
+    if client is not None and hasattr(client, 'get_settings'):
+        state['client_settings'] = client.get_settings()
+    return state
+
+
+def restore_session(api, state):
+    """
+    把 export_session 的結果還原到新的 ThreadsAPI (不發出任何請求)
+    """
+    api.username = state['username']
+    api.token = state['token']
+    api.user_id = state.get('user_id')
+    api.auth_headers = state['auth_headers']
+    api.is_logged_in = True
+    client = _instagrapi_client(api)
+    if client is not None and state.get('client_settings'):
+        client.set_settings(state['client_settings'])
+
+
+async def get_profile_page(api, user_id, count=10, max_id=None):
+    """
+    抓取一頁使用者貼文
+    threads_api 的 Threads 型別會丟掉 next_max_id，登入狀態下改直接呼叫同一個端點取得原始 dict
+    """
+    if getattr(api, 'is_logged_in', False) and hasattr(api, '_private_get'):
+        from threads_api.src.threads_api import BASE_URL
+        params = {'count': count} if max_id is None else {'count': count, 'max_id': max_id}
+        return await api._private_get(url=f'{BASE_URL}/text_feed/{user_id}/profile/',
+                                      headers=api.auth_headers, data=params)
+    return await api.get_user_threads(user_id, count=count, max_id=max_id)
+
+
+def default_api_factory():
+    # 只有真的要連線時才載入 threads_api
+    from threads_api.src.threads_api import ThreadsAPI
+    return ThreadsAPI()
+
+
+class ThreadsSession:
+    """
+    可重複使用登入狀態的 ThreadsAPI 包裝
+
+    start() 優先從 SessionStore 還原，沒有可用的狀態才登入；
+    call() 遇到登入失效時重新登入 (同時只有一個 coroutine 會登入) 並重試一次。
+    get_user_id_from_username / get_user_threads 與 ThreadsAPI 同名，可直接交給爬蟲使用。
+    """
+    def __init__(self, username, password, store=None, api_factory=default_api_factory):
+        self.username = username
+        self.password = password
+        self.store = store or SessionStore(password=password)
+        self.api_factory = api_factory
+        self.api = None
+        self.generation = 0
+        self.lock = asyncio.Lock()
+
+    async def start(self):
+        """
+        回傳 True 代表沿用了已儲存的登入狀態
+        """
+        state = self.store.load()
+        if state and state.get('username') == self.username and state.get('token'):
+            self.api = self.api_factory()
+            restore_session(self.api, state)
+            print(f"沿用已儲存的登入狀態: {self.username}")
+            return True
+        await self.login()
+        return False
+
+    async def login(self):
+        await self.close()
+        self.api = self.api_factory()
+        print(f"正在登入帳號: {self.username} ...")
+        # 登入 (注意：這一步最容易觸發驗證挑戰，如 2FA)
+        await self.api.login(self.username, self.password)
+        print("登入成功！")
+        self.store.save(export_session(self.api))
+        self.generation += 1
+
+    async def call(self, request):
+        """
+        request(api) 回傳 awaitable；登入失效時重新登入後再呼叫一次
+        """
+        generation = self.generation
+        try:
+            return await request(self.api)
+        except Exception as e:
+            if not is_auth_error(e):
+                raise
+            async with self.lock:
+                # 其他 coroutine 已經重新登入過就不再登入
+                if self.generation == generation:
+                    print(f"登入狀態已失效 ({e})，重新登入")
+                    self.store.clear()
+                    await self.login()
+        return await request(self.api)
+
+    async def get_user_id_from_username(self, username):
+        return await self.call(lambda api: api.get_user_id_from_username(username))
+
+    async def get_user_threads(self, user_id, count=10, max_id=None):
+        return await self.call(lambda api: get_profile_page(api, user_id, count=count, max_id=max_id))
+
+    async def close(self):
+        close = getattr(self.api, 'close_gracefully', None)
+        if close is not None:
+            await close()
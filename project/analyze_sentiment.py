@@ -1,36 +1,147 @@
+import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
-import sys
 import os
+import sys
+import hashlib
+import sqlite3
+import threading
+import time
+import unicodedata
+import importlib.util
+from collections import OrderedDict
 
-# Set font for Chinese characters in matplotlib
-plt.rcParams['font.sans-serif'] = ['Arial Unicode MS'] 
-plt.rcParams['axes.unicode_minus'] = False
+# Threads scraper output (.jsonl) is read with the scrapers' own helpers
+THREADS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'project-threads')
+if THREADS_DIR not in sys.path:
+    sys.path.append(THREADS_DIR)
 
-def install_and_import(package):
-    import importlib
-    try:
-        importlib.import_module(package)
-    except ImportError:
-        import subprocess
-        subprocess.check_call([sys.executable, "-m", "pip", "install", package])
-    finally:
-        globals()[package] = importlib.import_module(package)
-
-# Try to import snownlp, fallback to simple keyword analysis if fails
-try:
-    from snownlp import SnowNLP
-    HAS_SNOWNLP = True
-    print("SnowNLP imported successfully.")
-except ImportError:
-    HAS_SNOWNLP = False
+# Use snownlp if it is installed, fallback to simple keyword analysis if not.
+# Importing snownlp loads its segmentation and sentiment models (seconds), so
+# only look it up here; load_snownlp() imports it the first time a text is scored.
+HAS_SNOWNLP = importlib.util.find_spec('snownlp') is not None
+if not HAS_SNOWNLP:
     print("SnowNLP not found. Using keyword-based analysis.")
+SnowNLP = None
+snownlp_sentiment = None
+
+def load_snownlp():
+    # Returns whether SnowNLP scores are available, importing it on first call
+    global HAS_SNOWNLP, SnowNLP, snownlp_sentiment
+    if HAS_SNOWNLP and snownlp_sentiment is None:
+        try:
+            from snownlp import SnowNLP
+            from snownlp import sentiment as snownlp_sentiment
+            print("SnowNLP imported successfully.")
+        except ImportError as e:
+            HAS_SNOWNLP = False
+            print(f"SnowNLP could not be imported ({e}). Using keyword-based analysis.")
+    return HAS_SNOWNLP
+
+# Keyword lexicon for the fallback scorer: (word, weight) in scoring order
+POSITIVE_WORDS = ['感動', '恭喜', '加油', '喜歡', '讚', '好棒', '感謝', '溫暖', '舒服', '鬼', '強', '贏', '冠軍', '開心', '快樂', '愛', '支持', '期待', '笑死', '好笑']
+NEGATIVE_WORDS = ['水', '爛', '輸', '失望', '滾', '罵', '討厭', '廢', '假', '無聊', '生氣', '難過', '哭', '慘']
+DEFAULT_LEXICON = [(w, 0.1) for w in POSITIVE_WORDS] + [(w, -0.1) for w in NEGATIVE_WORDS]
+
+# Up to this many words a plain `word in text` scan beats the automaton
+# (benchmark_sentiment.py --only keywords: the crossover is ~65 words)
+SCAN_MAX_WORDS = 64
+
+class KeywordMatcher:
+    # Aho-Corasick automaton over the lexicon: one pass over the text finds
+    # every lexicon word it contains, however many words the lexicon has.
+    # Small lexicons (like the default one) are scanned word by word instead.
+    def __init__(self, lexicon):
+        self.words = []
+        self.weights = []
+        index = {}
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+        for word, weight in lexicon:
+            if not word:
+                continue
+            if word in index:
+                # Later entries override the weight of duplicated words
+                self.weights[index[word]] = weight
+                continue
+            index[word] = len(self.weights)
+            self.words.append(word)
+            self.weights.append(weight)
+            node = 0
+            for ch in word:
+                if ch not in self.goto[node]:
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append([])
+                    self.goto[node][ch] = len(self.goto) - 1
+                node = self.goto[node][ch]
+            self.output[node].append(index[word])
+
+        # Breadth-first pass to set the failure links and merge outputs
+        queue = list(self.goto[0].values())
+        for node in queue:
+            for ch, child in self.goto[node].items():
+                queue.append(child)
+                state = self.fail[node]
+                while state and ch not in self.goto[state]:
+                    state = self.fail[state]
+                self.fail[child] = self.goto[state].get(ch, 0)
+                self.output[child] = self.output[child] + self.output[self.fail[child]]
+
+        self.scan = list(zip(self.words, self.weights)) if len(self.words) <= SCAN_MAX_WORDS else None
+
+        # Identifies this lexicon in the score cache
+        lexicon_repr = repr(list(zip(self.words, self.weights))).encode('utf-8')
+        self.fingerprint = hashlib.sha1(lexicon_repr).hexdigest()[:12]
+
+    def find(self, text):
+        goto, fail, output = self.goto, self.fail, self.output
+        found = set()
+        node = 0
+        for ch in text:
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if output[node]:
+                found.update(output[node])
+        return found
+
+    def score(self, text):
+        # Each word counts once, applied in lexicon order so the result matches
+        # the original `for w in words: if w in text` loop exactly
+        score = 0.5
+        if self.scan is not None:
+            for word, weight in self.scan:
+                if word in text:
+                    score += weight
+        else:
+            for i in sorted(self.find(text)):
+                score += self.weights[i]
+        return max(0.0, min(1.0, score))
+
+def load_lexicon(path):
+    # One entry per line: "word<TAB>weight" (or "word,weight"); '#' starts a comment
+    lexicon = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.split('#', 1)[0].strip()
+            if not line:
+                continue
+            word, _, weight = line.replace(',', '\t', 1).partition('\t')
+            lexicon.append((word.strip(), float(weight) if weight.strip() else 0.1))
+    return lexicon
+
+def set_lexicon(lexicon):
+    global KEYWORD_MATCHER
+    KEYWORD_MATCHER = KeywordMatcher(lexicon)
+
+KEYWORD_MATCHER = KeywordMatcher(DEFAULT_LEXICON)
 
 def get_sentiment_score(text):
     if not isinstance(text, str):
         return 0.5
     
-    if HAS_SNOWNLP:
+    if load_snownlp():
         try:
             s = SnowNLP(text)
             return s.sentiments
@@ -38,52 +149,313 @@ def get_sentiment_score(text):
             return 0.5
     else:
         # Simple keyword fallback
-        positive_words = ['感動', '恭喜', '加油', '喜歡', '讚', '好棒', '感謝', '溫暖', '舒服', '鬼', '強', '贏', '冠軍', '開心', '快樂', '愛', '支持', '期待', '笑死', '好笑']
-        negative_words = ['水', '爛', '輸', '失望', '滾', '罵', '討厭', '廢', '假', '無聊', '生氣', '難過', '哭', '慘']
-        
-        score = 0.5
-        for w in positive_words:
-            if w in text:
-                score += 0.1
-        for w in negative_words:
-            if w in text:
-                score -= 0.1
-        return max(0.0, min(1.0, score))
+        return KEYWORD_MATCHER.score(text)
 
-def analyze_and_visualize(csv_path, output_dir):
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
-        
-    print(f"Reading {csv_path}...")
-    try:
-        df = pd.read_csv(csv_path)
-    except Exception as e:
-        print(f"Error reading CSV: {e}")
-        return
+def scorer_version():
+    # Cached scores are only valid for the scorer that produced them. Which
+    # scorer runs is only known once the SnowNLP import has been tried:
+    # find_spec alone would key keyword fallback scores as SnowNLP scores.
+    if load_snownlp():
+        from importlib.metadata import version
+        return 'snownlp-' + version('snownlp')
+    return 'keywords-' + KEYWORD_MATCHER.fingerprint
 
-    if 'Content' not in df.columns:
-        print("Error: 'Content' column not found in CSV.")
-        return
+class ScoreCache:
+    # Sentiment scores keyed by sha1(scorer version + NFC-normalized text).
+    # An in-memory LRU sits in front of a SQLite table; when the table grows
+    # past max_disk_entries the least recently used rows are evicted. The cache
+    # may be used from another thread than the one that opened it (pipeline.py).
+    # The scorer version is worked out on first use, which loads SnowNLP.
+    def __init__(self, path, version=None, max_memory_entries=100_000, max_disk_entries=1_000_000):
+        self.version = version
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self.memory = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('''CREATE TABLE IF NOT EXISTS scores (
+                                key TEXT PRIMARY KEY, score REAL, last_used REAL)''')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS idx_scores_last_used ON scores (last_used)')
+        self.disk_entries = self.conn.execute('SELECT COUNT(*) FROM scores').fetchone()[0]
 
-    print("Analyzing sentiment...")
-    df['Sentiment_Score'] = df['Content'].apply(get_sentiment_score)
-    
-    # Categorize
-    def categorize(score):
-        if score > 0.6:
-            return 'Positive'
-        elif score < 0.4:
-            return 'Negative'
+    def key(self, text):
+        if self.version is None:
+            self.version = scorer_version()
+        normalized = unicodedata.normalize('NFC', text)
+        return hashlib.sha1(f"{self.version}\0{normalized}".encode('utf-8', 'surrogatepass')).hexdigest()
+
+    def _remember(self, key, score):
+        self.memory[key] = score
+        self.memory.move_to_end(key)
+        if len(self.memory) > self.max_memory_entries:
+            self.memory.popitem(last=False)
+
+    def get_many(self, texts):
+        # Returns one score (or None on a miss) per text; non-strings are never cached
+        with self.lock:
+            results = [None] * len(texts)
+            disk_lookups = {}
+            for i, text in enumerate(texts):
+                if not isinstance(text, str):
+                    continue
+                key = self.key(text)
+                if key in self.memory:
+                    self.memory.move_to_end(key)
+                    results[i] = self.memory[key]
+                else:
+                    disk_lookups.setdefault(key, []).append(i)
+
+            keys = list(disk_lookups)
+            now = time.time()
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                placeholders = ','.join('?' * len(batch))
+                rows = self.conn.execute(f'SELECT key, score FROM scores WHERE key IN ({placeholders})', batch).fetchall()
+                for key, score in rows:
+                    for i in disk_lookups[key]:
+                        results[i] = score
+                    self._remember(key, score)
+                self.conn.executemany('UPDATE scores SET last_used = ? WHERE key = ?', [(now, key) for key, _ in rows])
+            self.conn.commit()
+
+            for text, score in zip(texts, results):
+                if isinstance(text, str):
+                    if score is None:
+                        self.misses += 1
+                    else:
+                        self.hits += 1
+            return results
+
+    def put_many(self, texts, scores):
+        with self.lock:
+            now = time.time()
+            rows = []
+            for text, score in zip(texts, scores):
+                if isinstance(text, str):
+                    key = self.key(text)
+                    self._remember(key, score)
+                    rows.append((key, float(score), now))
+            self.conn.executemany('INSERT OR REPLACE INTO scores (key, score, last_used) VALUES (?, ?, ?)', rows)
+            self.disk_entries += len(rows)
+            if self.disk_entries > self.max_disk_entries:
+                self.evict()
+            self.conn.commit()
+
+    def evict(self):
+        # Drop the least recently used rows, leaving 10% headroom
+        self.disk_entries = self.conn.execute('SELECT COUNT(*) FROM scores').fetchone()[0]
+        excess = self.disk_entries - int(self.max_disk_entries * 0.9)
+        if excess > 0:
+            self.conn.execute('''DELETE FROM scores WHERE key IN (
+                                    SELECT key FROM scores ORDER BY last_used LIMIT ?)''', (excess,))
+            self.disk_entries -= excess
+
+    def summary(self):
+        total = self.hits + self.misses
+        rate = self.hits / total if total else 0.0
+        return f"Score cache: {self.hits} hits, {self.misses} misses ({rate:.1%} hit rate)"
+
+    def close(self):
+        with self.lock:
+            self.conn.commit()
+            self.conn.close()
+
+def _score_unique(texts):
+    # Nothing to score (e.g. every text was cached) never loads the model
+    use_snownlp = len(texts) > 0 and load_snownlp()
+    scores = []
+    for text in texts:
+        if use_snownlp and isinstance(text, str):
+            try:
+                scores.append(snownlp_sentiment.classify(text))
+            except:
+                scores.append(0.5)
         else:
-            return 'Neutral'
-            
-    df['Sentiment_Category'] = df['Sentiment_Score'].apply(categorize)
-    
+            scores.append(get_sentiment_score(text))
+    return scores
+
+def _init_worker(matcher):
+    # Runs once per worker process: share the parent's lexicon and make sure
+    # the SnowNLP model is loaded before the first shard arrives
+    global KEYWORD_MATCHER
+    KEYWORD_MATCHER = matcher
+    if load_snownlp():
+        snownlp_sentiment.classify('')
+
+def make_pool(workers):
+    from concurrent.futures import ProcessPoolExecutor
+    return ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                               initargs=(KEYWORD_MATCHER,))
+
+def _score_sharded(texts, workers, executor):
+    # A few shards per worker keeps the pool busy when some shards are slower;
+    # executor.map returns them in submission order, i.e. the original order
+    n_shards = min(len(texts), workers * 4)
+    bounds = np.linspace(0, len(texts), n_shards + 1).astype(int)
+    shards = [list(texts[start:end]) for start, end in zip(bounds[:-1], bounds[1:])]
+    scores = []
+    for shard_scores in executor.map(_score_unique, shards):
+        scores.extend(shard_scores)
+    return scores
+
+def score_batch(texts, workers=1, executor=None, cache=None):
+    # Score a whole column at once: every distinct text is scored a single time
+    # and the scores are scattered back with the factorize codes.
+    # SnowNLP(text).sentiments is just sentiment.classify(text), so calling the
+    # classifier directly gives bit-identical scores without the per-row object.
+    # With workers > 1 the distinct texts are split into shards scored in
+    # separate processes; the scores are identical to the single-process run.
+    # Pass an executor from make_pool() to reuse one pool across many calls.
+    # With a ScoreCache only the texts it has not seen before are scored.
+    codes, uniques = pd.factorize(pd.Series(texts, dtype=object), use_na_sentinel=True)
+    unique_scores = np.empty(len(uniques) + 1, dtype=float)
+    todo = np.arange(len(uniques))
+    if cache is not None:
+        cached = cache.get_many(uniques)
+        todo = np.array([i for i, score in enumerate(cached) if score is None], dtype=int)
+        for i, score in enumerate(cached):
+            if score is not None:
+                unique_scores[i] = score
+    pending = uniques[todo]
+
+    if workers > 1 and len(pending) > workers:
+        if executor is None:
+            with make_pool(workers) as pool:
+                scores = _score_sharded(pending, workers, pool)
+        else:
+            scores = _score_sharded(pending, workers, executor)
+    else:
+        scores = _score_unique(pending)
+    unique_scores[todo] = scores
+
+    if cache is not None:
+        cache.put_many(pending, scores)
+    # Missing values get code -1, which lands on the trailing 0.5 slot
+    unique_scores[-1] = 0.5
+    return unique_scores[codes]
+
+def categorize_scores(scores):
+    scores = np.asarray(scores, dtype=float)
+    return np.select([scores > 0.6, scores < 0.4], ['Positive', 'Negative'], default='Neutral')
+
+HIST_BINS = 20
+
+# Columns kept in the Parquet results: the join keys back to the comments
+# dataset, plus the scores. The raw comment columns are not copied again.
+RESULT_KEY_COLUMNS = ['Video_ID', 'Comment_ID']
+
+# Threads scraper output (project-threads/threads_common.py) mapped onto the comment columns
+THREADS_COLUMNS = {'id': 'Comment_ID', 'text': 'Content', 'like_count': 'Likes',
+                   'reply_count': 'Replies', 'timestamp': 'Timestamp'}
+JSONL_CHUNKSIZE = 100_000
+
+def is_parquet(path):
+    return path.rstrip('/').endswith('.parquet')
+
+def is_jsonl(path):
+    return path.endswith(('.jsonl', '.jsonl.gz'))
+
+def iter_jsonl_records(path):
+    # One record per line, never the whole file in memory. The Threads
+    # scrapers own the format, so their reader (which skips what an
+    # interrupted scrape left half-written) is reused rather than copied.
+    if not os.path.exists(path):
+        raise FileNotFoundError(path)
+    from threads_common import iter_jsonl
+    return iter_jsonl(path)
+
+def jsonl_frame(records, columns=None):
+    df = pd.DataFrame.from_records(records).rename(columns=THREADS_COLUMNS)
+    if columns is not None:
+        df = df[[c for c in columns if c in df.columns]]
+    return df
+
+def iter_jsonl_chunks(path, chunksize, columns=None):
+    records = []
+    for record in iter_jsonl_records(path):
+        records.append(record)
+        if len(records) >= chunksize:
+            yield jsonl_frame(records, columns)
+            records = []
+    if records:
+        yield jsonl_frame(records, columns)
+
+def available_columns(path):
+    if is_parquet(path):
+        import pyarrow.dataset as ds
+        return ds.dataset(path, format='parquet', partitioning='hive').schema.names
+    if is_jsonl(path):
+        first = next(iter_jsonl_records(path), {})
+        return [THREADS_COLUMNS.get(key, key) for key in first]
+    return pd.read_csv(path, nrows=0).columns.tolist()
+
+def input_columns(path, output_format):
+    # Column projection: Parquet results only need the keys and Content
+    if output_format != 'parquet':
+        return None
+    columns = available_columns(path)
+    return [c for c in RESULT_KEY_COLUMNS + ['Content'] if c in columns]
+
+def read_comments(path, columns=None):
+    if is_parquet(path):
+        return pd.read_parquet(path, columns=columns)
+    if is_jsonl(path):
+        chunks = list(iter_jsonl_chunks(path, JSONL_CHUNKSIZE, columns=columns))
+        return pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame()
+    return pd.read_csv(path, usecols=columns)
+
+def iter_comment_chunks(path, chunksize, columns=None):
+    if is_parquet(path):
+        import pyarrow.dataset as ds
+        dataset = ds.dataset(path, format='parquet', partitioning='hive')
+        for batch in dataset.to_batches(columns=columns, batch_size=chunksize):
+            yield batch.to_pandas()
+    elif is_jsonl(path):
+        yield from iter_jsonl_chunks(path, chunksize, columns=columns)
+    else:
+        yield from pd.read_csv(path, chunksize=chunksize, usecols=columns)
+
+def save_results(df, output_dir, output_format, chunk_index=None, append=False):
+    # chunk_index None writes the whole result, 0.. appends streaming chunks;
+    # append=True keeps the results of earlier runs (incremental crawls)
+    fresh = not chunk_index and not append
+    if output_format == 'parquet':
+        import shutil
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        output_path = os.path.join(output_dir, 'analyzed_comments.parquet')
+        if fresh and os.path.isdir(output_path):
+            shutil.rmtree(output_path)
+        columns = [c for c in RESULT_KEY_COLUMNS if c in df.columns] + ['Sentiment_Score', 'Sentiment_Category']
+        if 'Near_Duplicate' in df.columns:
+            columns.append('Near_Duplicate')
+        table = pa.Table.from_pandas(df[columns].astype({c: str for c in RESULT_KEY_COLUMNS if c in df.columns}),
+                                     preserve_index=False)
+        partition_cols = ['Video_ID'] if 'Video_ID' in df.columns else None
+        # Earlier runs used the same chunk numbers, so appended parts also carry a timestamp
+        run_tag = f"{time.time_ns()}-" if append else ''
+        pq.write_to_dataset(table, output_path, partition_cols=partition_cols,
+                            basename_template=f"part-{run_tag}{chunk_index or 0:06d}-{{i}}.parquet")
+    else:
+        output_path = os.path.join(output_dir, 'analyzed_comments.csv')
+        header = fresh or not os.path.exists(output_path)
+        df.to_csv(output_path, index=False, mode='w' if fresh else 'a', header=header)
+    return output_path
+
+def save_charts(hist_counts, bin_edges, category_counts, output_dir):
+    # matplotlib is only imported by runs that draw charts
+    import matplotlib.pyplot as plt
+    # Set font for Chinese characters in matplotlib
+    plt.rcParams['font.sans-serif'] = ['Arial Unicode MS']
+    plt.rcParams['axes.unicode_minus'] = False
+
     print("Generating visualizations...")
     
-    # 1. Histogram of Sentiment Scores
+    # 1. Histogram of Sentiment Scores (pre-binned counts)
     plt.figure(figsize=(10, 6))
-    plt.hist(df['Sentiment_Score'], bins=20, color='skyblue', edgecolor='black')
+    plt.hist(bin_edges[:-1], bins=bin_edges, weights=hist_counts, color='skyblue', edgecolor='black')
     plt.title('Sentiment Score Distribution')
     plt.xlabel('Sentiment Score (0=Negative, 1=Positive)')
     plt.ylabel('Count')
@@ -92,20 +464,211 @@ def analyze_and_visualize(csv_path, output_dir):
     plt.close()
     
     # 2. Pie Chart of Categories
-    category_counts = df['Sentiment_Category'].value_counts()
     plt.figure(figsize=(8, 8))
     plt.pie(category_counts, labels=category_counts.index, autopct='%1.1f%%', startangle=140, colors=['#66b3ff','#99ff99','#ffcc99'])
     plt.title('Sentiment Categories')
     plt.savefig(os.path.join(output_dir, 'sentiment_pie_chart.png'))
     plt.close()
+
+def load_previous_scores(output_dir, output_format):
+    # Scores from the last run, indexed by Comment_ID (None when there are none)
+    try:
+        if output_format == 'parquet':
+            path = os.path.join(output_dir, 'analyzed_comments.parquet')
+            if not os.path.isdir(path):
+                return None
+            previous = pd.read_parquet(path, columns=['Comment_ID', 'Sentiment_Score'])
+        else:
+            path = os.path.join(output_dir, 'analyzed_comments.csv')
+            if not os.path.exists(path):
+                return None
+            # round_trip parsing keeps the reused scores bit-identical
+            previous = pd.read_csv(path, usecols=['Comment_ID', 'Sentiment_Score'], float_precision='round_trip')
+    except Exception as e:
+        print(f"Could not read previous results ({e}), scoring everything.")
+        return None
+    previous = previous.dropna(subset=['Comment_ID']).drop_duplicates('Comment_ID', keep='last')
+    return previous.set_index('Comment_ID')['Sentiment_Score']
+
+def mark_near_duplicates(df, index):
+    # Near_Duplicate is True for rows whose text is a near-copy of an earlier
+    # row (or of one already in the index, e.g. from previous chunks). Rows are
+    # keyed by Comment_ID, so rows already in the index from an earlier run are
+    # not checked again. Missing or blank texts are never near-duplicates.
+    content = df['Content']
+    has_text = content.map(lambda text: isinstance(text, str) and bool(text.strip())).to_numpy(dtype=bool)
+    keys = df.loc[has_text, 'Comment_ID'].tolist() if 'Comment_ID' in df.columns else None
+    flags = np.zeros(len(df), dtype=bool)
+    if has_text.any():
+        flags[has_text] = index.add_many(content[has_text], keys=keys)
+    df['Near_Duplicate'] = flags
+
+def load_near_dup_index(path):
+    from near_dup import NearDuplicateIndex
+    if path and os.path.exists(path):
+        return NearDuplicateIndex.load(path)
+    return NearDuplicateIndex()
+
+def analyze_and_visualize(csv_path, output_dir, workers=1, chunksize=None, cache=None, output_format='csv',
+                          incremental=False, near_dups=False, near_dup_index=None, charts=True):
+    # csv_path may also be a (Video_ID-partitioned) .parquet dataset or Threads .jsonl(.gz) output.
+    # With incremental=True, rows whose Comment_ID already appears in the
+    # previous results reuse their score and only unseen rows are scored.
+    # With near_dups=True, a Near_Duplicate column flags reposted / copy-pasted
+    # comments; near_dup_index is an optional .npz file that carries the
+    # fingerprints over to the next run. charts=False skips the PNG charts.
+    if chunksize and incremental:
+        print("Incremental mode reads the previous results in memory; ignoring --chunksize.")
+    elif chunksize:
+        return analyze_streaming(csv_path, output_dir, chunksize, workers=workers, cache=cache,
+                                 output_format=output_format, near_dups=near_dups,
+                                 near_dup_index=near_dup_index, charts=charts)
+
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+        
+    print(f"Reading {csv_path}...")
+    try:
+        df = read_comments(csv_path, columns=input_columns(csv_path, output_format))
+    except Exception as e:
+        print(f"Error reading CSV: {e}")
+        return
+
+    if 'Content' not in df.columns:
+        print("Error: 'Content' column not found in CSV.")
+        return
+
+    print("Analyzing sentiment...")
+    previous = load_previous_scores(output_dir, output_format) if incremental else None
+    if previous is not None and 'Comment_ID' in df.columns:
+        known = df['Comment_ID'].isin(previous.index).to_numpy()
+        scores = np.empty(len(df), dtype=float)
+        scores[known] = df.loc[known, 'Comment_ID'].map(previous).to_numpy(dtype=float)
+        scores[~known] = score_batch(df.loc[~known, 'Content'], workers=workers, cache=cache)
+        print(f"Incremental: reused {known.sum()} scores, scored {(~known).sum()} new rows")
+        df['Sentiment_Score'] = scores
+    else:
+        if incremental:
+            print("Incremental: no previous results with Comment_ID, scoring everything.")
+        df['Sentiment_Score'] = score_batch(df['Content'], workers=workers, cache=cache)
+    
+    # Categorize (>0.6 Positive, <0.4 Negative, otherwise Neutral)
+    df['Sentiment_Category'] = categorize_scores(df['Sentiment_Score'])
+
+    if near_dups:
+        index = load_near_dup_index(near_dup_index)
+        mark_near_duplicates(df, index)
+        print(f"Near-duplicates: {int(df['Near_Duplicate'].sum())} of {len(df)} rows")
+        if near_dup_index:
+            index.save(near_dup_index)
+    
+    # Same bins plt.hist(scores, bins=20) would use
+    hist_counts, bin_edges = np.histogram(df['Sentiment_Score'], bins=HIST_BINS)
+    category_counts = df['Sentiment_Category'].value_counts()
+    if charts:
+        save_charts(hist_counts, bin_edges, category_counts, output_dir)
     
     # 3. Save analyzed data
-    output_csv = os.path.join(output_dir, 'analyzed_comments.csv')
-    df.to_csv(output_csv, index=False)
+    save_results(df, output_dir, output_format)
+    print(f"Analysis complete. Results saved to {output_dir}")
+    print(f"Summary:\n{category_counts}")
+    if cache is not None:
+        print(cache.summary())
+
+def analyze_streaming(csv_path, output_dir, chunksize, workers=1, cache=None, output_format='csv',
+                      near_dups=False, near_dup_index=None, charts=True):
+    # Read, score and append one chunk at a time; only the histogram counts and
+    # category totals are kept across chunks, so memory does not grow with the
+    # input. Scores always lie in [0, 1], which fixes the histogram bin edges
+    # up front (the in-memory mode bins between the observed min and max).
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+
+    bin_edges = np.linspace(0.0, 1.0, HIST_BINS + 1)
+    hist_counts = np.zeros(HIST_BINS, dtype=np.int64)
+    category_counts = pd.Series(dtype=np.int64)
+    total_rows = 0
+    chunk_index = 0
+    # One index across all chunks, so duplicates spanning chunks are found too
+    index = load_near_dup_index(near_dup_index) if near_dups else None
+    near_dup_rows = 0
+
+    print(f"Streaming {csv_path} in chunks of {chunksize} rows...")
+    executor = make_pool(workers) if workers > 1 else None
+    try:
+        columns = input_columns(csv_path, output_format)
+        for chunk in iter_comment_chunks(csv_path, chunksize, columns=columns):
+            if 'Content' not in chunk.columns:
+                print("Error: 'Content' column not found in CSV.")
+                return
+
+            chunk['Sentiment_Score'] = score_batch(chunk['Content'], workers=workers, executor=executor, cache=cache)
+            chunk['Sentiment_Category'] = categorize_scores(chunk['Sentiment_Score'])
+
+            hist_counts += np.histogram(chunk['Sentiment_Score'], bins=bin_edges)[0]
+            category_counts = category_counts.add(chunk['Sentiment_Category'].value_counts(), fill_value=0)
+            if index is not None:
+                mark_near_duplicates(chunk, index)
+                near_dup_rows += int(chunk['Near_Duplicate'].sum())
+
+            # First chunk creates the output, later chunks append to it
+            save_results(chunk, output_dir, output_format, chunk_index=chunk_index)
+            chunk_index += 1
+            total_rows += len(chunk)
+            print(f"Analyzed {total_rows} rows...")
+    except Exception as e:
+        print(f"Error reading CSV: {e}")
+        return
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    if not total_rows:
+        print("Error: no rows found in CSV.")
+        return
+
+    if index is not None:
+        print(f"Near-duplicates: {near_dup_rows} of {total_rows} rows")
+        if near_dup_index:
+            index.save(near_dup_index)
+
+    category_counts = category_counts.astype(np.int64).sort_values(ascending=False)
+    category_counts = category_counts.rename_axis('Sentiment_Category').rename('count')
+    if charts:
+        save_charts(hist_counts, bin_edges, category_counts, output_dir)
     print(f"Analysis complete. Results saved to {output_dir}")
     print(f"Summary:\n{category_counts}")
+    if cache is not None:
+        print(cache.summary())
 
 if __name__ == "__main__":
-    csv_file = "project/tainanjosh_comments.csv"
-    output_folder = "project/sentiment_analysis_results"
-    analyze_and_visualize(csv_file, output_folder)
+    import argparse
+    parser = argparse.ArgumentParser(description="Sentiment analysis for scraped comments")
+    parser.add_argument('csv_file', nargs='?', default="project/tainanjosh_comments.csv",
+                        help="Comments CSV, Parquet dataset, or Threads .jsonl / .jsonl.gz output")
+    parser.add_argument('output_folder', nargs='?', default="project/sentiment_analysis_results")
+    parser.add_argument('--format', choices=['csv', 'parquet'], default='csv',
+                        help="Output format: full CSV (Excel friendly) or Video_ID-partitioned Parquet scores")
+    parser.add_argument('--incremental', action='store_true',
+                        help="Only score comments whose Comment_ID is not in the existing results")
+    parser.add_argument('--workers', type=int, default=1, help="Number of processes used for sentiment scoring")
+    parser.add_argument('--chunksize', type=int, help="Stream the CSV in chunks of this many rows (bounded memory)")
+    parser.add_argument('--cache', help="SQLite file for the persistent sentiment score cache")
+    parser.add_argument('--cache-size', type=int, default=1_000_000, help="Maximum number of scores kept in the cache file")
+    parser.add_argument('--lexicon', help="Weighted keyword lexicon for the fallback scorer (word<TAB>weight per line)")
+    parser.add_argument('--near-dups', action='store_true',
+                        help="Add a Near_Duplicate column flagging near-copies of earlier comments")
+    parser.add_argument('--near-dup-index', help="Fingerprint file (.npz) to find near-duplicates across runs")
+    parser.add_argument('--no-charts', action='store_true',
+                        help="Only write the scores; skip the charts (and loading matplotlib)")
+    args = parser.parse_args()
+
+    if args.lexicon:
+        set_lexicon(load_lexicon(args.lexicon))
+    cache = ScoreCache(args.cache, max_disk_entries=args.cache_size) if args.cache else None
+    analyze_and_visualize(args.csv_file, args.output_folder, workers=args.workers,
+                          chunksize=args.chunksize, cache=cache, output_format=args.format,
+                          incremental=args.incremental, near_dups=args.near_dups or bool(args.near_dup_index),
+                          near_dup_index=args.near_dup_index, charts=not args.no_charts)
+    if cache is not None:
+        cache.close()
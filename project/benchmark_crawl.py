@@ -0,0 +1,289 @@
+import argparse
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pandas as pd
+import requests
+
+import grab_data as gd
+import analyze_sentiment as sa
+import pipeline
+
+# Crawl get_channel_comments against a local stub server that throttles like
+# YouTube: every endpoint serves at most `capacity` requests/s (429 beyond
+# that) and fails a fraction of requests with 503. Reports whether every
+# video came back complete, how often we were throttled and the goodput.
+# The pipeline benchmark compares fetch-then-score with pipeline.run_pipeline,
+# then checks an incremental pipeline (score cache + checkpoint store) that is
+# interrupted and resumed.
+# The workers benchmark times max_workers=1 against a thread pool on a fake
+# downloader that only sleeps, so the speedup is not limited by the server.
+
+COMMENTS_PER_PAGE = 20
+
+def make_throttling_handler(capacity, burst, error_rate, retry_after, stats, seed=0, latency=0.0, texts=None):
+    lock = threading.Lock()
+    buckets = {}
+    rng = random.Random(seed)
+
+    def admit(endpoint):
+        # Server-side token bucket per endpoint
+        with lock:
+            now = time.monotonic()
+            tokens, updated = buckets.get(endpoint, (burst, now))
+            tokens = min(burst, tokens + (now - updated) * capacity)
+            admitted = tokens >= 1
+            buckets[endpoint] = (tokens - 1 if admitted else tokens, now)
+            failed = admitted and rng.random() < error_rate
+            stats['requests'] += 1
+            stats['throttled'] += not admitted
+            stats['errors'] += failed
+            return 429 if not admitted else 503 if failed else 200
+
+    class ThrottlingHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            status = admit(url.path)
+            if status != 200:
+                self.send_response(status)
+                if status == 429 and retry_after is not None:
+                    self.send_header('Retry-After', str(retry_after))
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            time.sleep(latency)
+            query = {key: values[0] for key, values in parse_qs(url.query).items()}
+            page = int(query.get('page', 0))
+            comments = [{'cid': f"{query['v']}-{page}-{i}",
+                         'text': (f"{texts[hash((query['v'], page, i)) % len(texts)]} #{query['v']}-{page}-{i}"
+                                  if texts else f"comment {i} on page {page}"),
+                         'author': 'stub', 'channel': 'UCstub', 'time': '1 天前', 'votes': '0', 'reply': False}
+                        for i in range(COMMENTS_PER_PAGE)]
+            body = json.dumps(comments).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return ThrottlingHandler
+
+def make_downloader_factory(base_url, pages):
+    # Stands in for YoutubeCommentDownloader: one watch page, then `pages`
+    # comment pages, all through a requests.Session like the real one
+    class StubDownloader:
+        def __init__(self):
+            self.session = requests.Session()
+
+        def get_comments_from_url(self, youtube_url, sort_by=None):
+            video_id = parse_qs(urlparse(youtube_url).query)['v'][0]
+            response = self.session.get(f"{base_url}/watch", params={'v': video_id})
+            if response.status_code != 200:
+                # The real downloader finds no ytcfg and silently yields nothing
+                return
+            for page in range(pages):
+                response = self.session.get(f"{base_url}/youtubei/v1/next", params={'v': video_id, 'page': page})
+                if response.status_code != 200:
+                    return
+                yield from response.json()
+
+    return StubDownloader
+
+def make_latency_downloader_factory(latency, pages):
+    # No HTTP at all: every comment page costs `latency` seconds of waiting
+    class LatencyDownloader:
+        def get_comments_from_url(self, youtube_url, sort_by=None):
+            video_id = parse_qs(urlparse(youtube_url).query)['v'][0]
+            time.sleep(latency)
+            for page in range(pages):
+                time.sleep(latency)
+                for i in range(COMMENTS_PER_PAGE):
+                    yield {'cid': f"{video_id}-{page}-{i}", 'text': f"comment {i} on page {page}",
+                           'author': 'stub', 'channel': 'UCstub', 'time': '1 天前', 'votes': '0', 'reply': False}
+
+    return LatencyDownloader
+
+def make_videos(n_videos):
+    return [{'videoId': f"vid{i:04d}", 'title': {'runs': [{'text': f"Video {i}"}]}} for i in range(n_videos)]
+
+def start_server(handler):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+def run_crawl(base_url, n_videos, pages, workers, scheduler, video_retries, retry_delay):
+    videos = make_videos(n_videos)
+    df = gd.get_channel_comments(None, n_videos, pages * COMMENTS_PER_PAGE, max_workers=workers,
+                                 downloader_factory=make_downloader_factory(base_url, pages), videos=videos,
+                                 scheduler=scheduler, video_retries=video_retries, retry_delay=retry_delay)
+    expected = pages * COMMENTS_PER_PAGE
+    counts = df.groupby('Video_ID').size() if len(df) else {}
+    return sum(counts.get(video['videoId'], 0) == expected for video in videos), len(df)
+
+def bench_crawl(n_videos, pages, workers, capacity, burst, error_rate, retry_after):
+    print(f"== {n_videos} videos x {pages + 1} requests, {workers} workers, "
+          f"server capacity {capacity}/s per endpoint, {error_rate:.0%} 503s ==")
+    strategies = [
+        # The original behaviour: no pacing, throttled responses end the video
+        ('no pacing', lambda: gd.RequestScheduler(None, max_retries=0), 0),
+        ('backoff only', lambda: gd.RequestScheduler(None, backoff=0.2), 2),
+        ('token buckets', lambda: gd.RequestScheduler(capacity * 4, burst=burst, backoff=0.2), 2),
+    ]
+    for name, make_scheduler, video_retries in strategies:
+        stats = {'requests': 0, 'throttled': 0, 'errors': 0}
+        server, base_url = start_server(make_throttling_handler(capacity, burst, error_rate, retry_after, stats))
+        start = time.perf_counter()
+        complete, rows = run_crawl(base_url, n_videos, pages, workers, make_scheduler(), video_retries, 0.5)
+        elapsed = time.perf_counter() - start
+        server.shutdown()
+        server.server_close()
+        served = stats['requests'] - stats['throttled'] - stats['errors']
+        print(f"{name:<14} complete {complete:>3}/{n_videos}  rows {rows:>6}  {elapsed:6.2f}s  "
+              f"requests {stats['requests']:>5}  429s {stats['throttled']:>5}  503s {stats['errors']:>4}  "
+              f"goodput {served / elapsed:6.1f} req/s")
+
+def bench_workers(n_videos, pages, latency, max_workers):
+    print(f"== {n_videos} videos x {pages + 1} pages, {latency * 1000:.0f} ms per page, fake downloader ==")
+    factory = make_latency_downloader_factory(latency, pages)
+    baseline = None
+    for workers in sorted({1, 2, max_workers}):
+        start = time.perf_counter()
+        df = gd.get_channel_comments(None, n_videos, pages * COMMENTS_PER_PAGE, max_workers=workers,
+                                     downloader_factory=factory, videos=make_videos(n_videos))
+        elapsed = time.perf_counter() - start
+        if baseline is None:
+            baseline = (df, elapsed)
+        identical = df.equals(baseline[0])
+        print(f"max_workers={workers:<3} {elapsed:6.2f}s  speedup {baseline[1] / elapsed:5.1f}x  "
+              f"rows {len(df)}  identical={identical}")
+        assert identical, "concurrent crawl changed the result"
+
+def sequential_refresh(base_url, n_videos, pages, workers, output_dir):
+    # Before the pipeline: crawl everything, then score, then write
+    start = time.perf_counter()
+    df = gd.get_channel_comments(None, n_videos, pages * COMMENTS_PER_PAGE, max_workers=workers,
+                                 downloader_factory=make_downloader_factory(base_url, pages),
+                                 videos=make_videos(n_videos), scheduler=gd.RequestScheduler(None))
+    fetch = time.perf_counter() - start
+    df['Sentiment_Score'] = sa.score_batch(df['Content'])
+    df['Sentiment_Category'] = sa.categorize_scores(df['Sentiment_Score'])
+    score = time.perf_counter() - start - fetch
+    sa.save_results(df, output_dir, 'csv')
+    return time.perf_counter() - start, fetch, score
+
+def bench_pipeline(corpus_csv, n_videos, pages, workers, latency, score_workers, queue_size):
+    print(f"== channel refresh: {n_videos} videos x {pages + 1} requests, {latency * 1000:.0f} ms per request, "
+          f"{workers} fetch workers ==")
+    texts = pd.read_csv(corpus_csv)['Content'].dropna().astype(str).tolist()
+    stats = {'requests': 0, 'throttled': 0, 'errors': 0}
+    server, base_url = start_server(make_throttling_handler(1e9, 1e9, 0.0, None, stats, latency=latency, texts=texts))
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        sequential_dir, pipeline_dir = os.path.join(tmp_dir, 'sequential'), os.path.join(tmp_dir, 'pipeline')
+        os.makedirs(sequential_dir)
+        # Load the SnowNLP model up front so neither side's timing includes it
+        sa.load_snownlp()
+        total, fetch, score = sequential_refresh(base_url, n_videos, pages, workers, sequential_dir)
+        print(f"fetch, then score   {total:6.2f}s  (fetch {fetch:.2f}s + score {score:.2f}s)")
+
+        result = pipeline.run_pipeline(None, pipeline_dir, n_videos, pages * COMMENTS_PER_PAGE, max_workers=workers,
+                                       workers=score_workers, queue_size=queue_size, charts=False,
+                                       downloader_factory=make_downloader_factory(base_url, pages),
+                                       videos=make_videos(n_videos), scheduler=gd.RequestScheduler(None))
+        print(f"pipeline            {result['wall']:6.2f}s  ({pipeline.format_stats(result)})")
+
+        sequential = pd.read_csv(os.path.join(sequential_dir, 'analyzed_comments.csv')).sort_values('Comment_ID')
+        piped = pd.read_csv(os.path.join(pipeline_dir, 'analyzed_comments.csv')).sort_values('Comment_ID')
+        identical = (len(sequential) == len(piped) and
+                     np.array_equal(sequential['Comment_ID'].to_numpy(), piped['Comment_ID'].to_numpy()) and
+                     np.allclose(sequential['Sentiment_Score'].to_numpy(), piped['Sentiment_Score'].to_numpy()))
+        print(f"same rows and scores={identical}")
+        check_incremental_pipeline(base_url, n_videos, pages, workers, score_workers, tmp_dir)
+    server.shutdown()
+    server.server_close()
+
+def check_incremental_pipeline(base_url, n_videos, pages, workers, score_workers, tmp_dir):
+    # --cache and --state together: a first run over half the videos, a run whose
+    # store stage fails after one batch, then a resumed run. Every comment must
+    # end up in the output exactly once, and the cache is used from the score thread.
+    output_dir = os.path.join(tmp_dir, 'incremental')
+    cache = sa.ScoreCache(os.path.join(tmp_dir, 'scores.sqlite'))
+    store = gd.CheckpointStore(os.path.join(tmp_dir, 'state.sqlite'))
+    videos = make_videos(n_videos)
+
+    def run(videos, charts=False):
+        return pipeline.run_pipeline(None, output_dir, len(videos), pages * COMMENTS_PER_PAGE, max_workers=workers,
+                                     workers=score_workers, charts=charts, cache=cache, store=store,
+                                     downloader_factory=make_downloader_factory(base_url, pages),
+                                     videos=videos, scheduler=gd.RequestScheduler(None))
+
+    save_results = sa.save_results
+    written = []
+
+    def failing_save_results(df, *args, **kwargs):
+        if written:
+            raise OSError("disk full")
+        written.append(len(df))
+        return save_results(df, *args, **kwargs)
+
+    try:
+        first = run(videos[:n_videos // 2])
+        sa.save_results = failing_save_results
+        try:
+            run(videos)
+            interrupted = False
+        except OSError:
+            interrupted = True
+        finally:
+            sa.save_results = save_results
+        # The resumed run draws its charts from the whole appended output
+        resumed = run(videos, charts=True)
+        output_path = os.path.join(output_dir, 'analyzed_comments.csv')
+        output = pd.read_csv(output_path)
+        expected = n_videos * pages * COMMENTS_PER_PAGE
+        charted = int(pipeline.output_totals(output_path, np.linspace(0.0, 1.0, sa.HIST_BINS + 1))[0].sum())
+        print(f"incremental: first run {first['rows']} rows, interrupted={interrupted} after {sum(written)} rows, "
+              f"resumed {resumed['rows']} rows; output {len(output)} rows "
+              f"({output['Comment_ID'].nunique()} unique, expected {expected}), charts over {charted} rows; "
+              f"{cache.summary()}")
+        assert interrupted
+        assert len(output) == output['Comment_ID'].nunique() == expected == charted
+        assert os.path.exists(os.path.join(output_dir, 'sentiment_distribution.png'))
+    finally:
+        cache.close()
+        store.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Crawl scheduling benchmark against a throttling stub server")
+    parser.add_argument('--videos', type=int, default=20)
+    parser.add_argument('--pages', type=int, default=5, help="Comment pages per video")
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--capacity', type=float, default=20, help="Requests/s the stub serves per endpoint")
+    parser.add_argument('--burst', type=int, default=5)
+    parser.add_argument('--error-rate', type=float, default=0.02, help="Fraction of requests failed with 503")
+    parser.add_argument('--retry-after', type=float, help="Send this Retry-After (seconds) with every 429")
+    parser.add_argument('--csv', default="project/tainanjosh_comments.csv", help="Comment texts for the pipeline benchmark")
+    parser.add_argument('--latency', type=float, default=0.1, help="Stub response time (seconds) for the pipeline benchmark")
+    parser.add_argument('--score-workers', type=int, default=1)
+    parser.add_argument('--queue-size', type=int, default=4)
+    parser.add_argument('--max-workers', type=int, default=8, help="Largest thread pool for the workers benchmark")
+    parser.add_argument('--only', choices=['workers', 'scheduler', 'pipeline'], help="Run a single benchmark")
+    args = parser.parse_args()
+
+    if args.only in (None, 'workers'):
+        bench_workers(args.videos, args.pages, args.latency, args.max_workers)
+    if args.only in (None, 'scheduler'):
+        bench_crawl(args.videos, args.pages, args.workers, args.capacity, args.burst, args.error_rate,
+                    args.retry_after)
+    if args.only in (None, 'pipeline'):
+        bench_pipeline(args.csv, args.videos, args.pages, args.workers, args.latency, args.score_workers,
+                       args.queue_size)
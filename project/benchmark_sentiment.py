@@ -0,0 +1,226 @@
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+
+import analyze_sentiment as sa
+from near_dup import NearDuplicateIndex
+
+# Benchmark the sentiment scoring paths on synthetic comment dumps built by
+# resampling the real comments, so duplicates appear at a realistic rate.
+
+def load_corpus(csv_path):
+    return pd.read_csv(csv_path)['Content']
+
+def make_sample(corpus, n_rows, seed=0):
+    rng = np.random.default_rng(seed)
+    return corpus.iloc[rng.integers(0, len(corpus), n_rows)].reset_index(drop=True)
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+def per_row_baseline(texts):
+    # The original implementation: one SnowNLP object per row + apply(categorize)
+    def categorize(score):
+        if score > 0.6:
+            return 'Positive'
+        elif score < 0.4:
+            return 'Negative'
+        else:
+            return 'Neutral'
+    scores = texts.apply(sa.get_sentiment_score)
+    return scores, scores.apply(categorize)
+
+def batch_path(texts):
+    scores = sa.score_batch(texts)
+    return scores, sa.categorize_scores(scores)
+
+def bench_batch(corpus, sizes, baseline_limit):
+    print("== score_batch vs per-row apply ==")
+    for n_rows in sizes:
+        texts = make_sample(corpus, n_rows)
+        (scores, categories), t_batch = timed(batch_path, texts)
+        line = f"{n_rows:>9} rows  batch {t_batch:8.2f}s ({n_rows / t_batch:,.0f} rows/s)"
+        if n_rows <= baseline_limit:
+            (base_scores, base_categories), t_base = timed(per_row_baseline, texts)
+            identical = np.array_equal(base_scores.to_numpy(), scores) and \
+                (base_categories.to_numpy() == categories).all()
+            line += f"  per-row {t_base:8.2f}s  speedup {t_base / t_batch:6.1f}x  identical={identical}"
+        else:
+            line += "  per-row skipped"
+        print(line)
+
+def substring_baseline(lexicon, text):
+    # The original fallback: one `w in text` scan per lexicon word
+    score = 0.5
+    for word, weight in lexicon:
+        if word in text:
+            score += weight
+    return max(0.0, min(1.0, score))
+
+def random_lexicon(n_words, seed=0):
+    rng = np.random.default_rng(seed)
+    lexicon = list(sa.DEFAULT_LEXICON)
+    while len(lexicon) < n_words:
+        word = ''.join(chr(c) for c in rng.integers(0x4e00, 0x9fa5, rng.integers(2, 5)))
+        lexicon.append((word, 0.1 if rng.random() < 0.5 else -0.1))
+    return lexicon
+
+def bench_keywords(corpus, lexicon_sizes):
+    print(f"== keyword fallback: KeywordMatcher vs substring scan (scans up to {sa.SCAN_MAX_WORDS} words) ==")
+    texts = [t for t in corpus if isinstance(t, str)]
+    matcher = sa.KeywordMatcher(sa.DEFAULT_LEXICON)
+    identical = all(matcher.score(t) == substring_baseline(sa.DEFAULT_LEXICON, t) for t in texts)
+    print(f"default lexicon ({len(sa.DEFAULT_LEXICON)} words) identical={identical}")
+    for n_words in lexicon_sizes:
+        lexicon = random_lexicon(n_words)
+        matcher, t_build = timed(sa.KeywordMatcher, lexicon)
+        _, t_matcher = timed(lambda: [matcher.score(t) for t in texts])
+        _, t_scan = timed(lambda: [substring_baseline(lexicon, t) for t in texts])
+        path = 'scan' if matcher.scan is not None else 'automaton'
+        print(f"{n_words:>7} words  build {t_build * 1000:7.1f}ms  "
+              f"matcher ({path:<9}) {len(texts) / t_matcher:>10,.0f} texts/s  "
+              f"substring {len(texts) / t_scan:>10,.0f} texts/s")
+
+def bench_workers(corpus, n_rows, max_workers):
+    print(f"== multiprocess scaling ({n_rows} distinct texts) ==")
+    # Suffix every text so deduplication does not hide the scoring cost
+    texts = make_sample(corpus, n_rows).astype(str) + pd.Series([f" #{i}" for i in range(n_rows)])
+    baseline = None
+    for workers in range(1, max_workers + 1):
+        scores, elapsed = timed(sa.score_batch, texts, workers)
+        if baseline is None:
+            baseline, t_single = scores, elapsed
+        print(f"{workers:>3} workers  {elapsed:8.2f}s  speedup {t_single / elapsed:5.2f}x  "
+              f"identical={np.array_equal(baseline, scores)}")
+
+def near_dup_texts(corpus, n_rows, seed=0):
+    # Resampled comments with a distinct suffix: near-copies of each other,
+    # never exact copies, so an exact set would not catch them
+    texts = make_sample(corpus, n_rows, seed).astype(str)
+    return (texts + pd.Series([f" #{i}" for i in range(n_rows)])).tolist()
+
+def bench_near_dup(corpus, n_rows, batch):
+    print(f"== near-duplicate index ({n_rows} texts, batches of {batch}) ==")
+    texts = near_dup_texts(corpus, n_rows)
+
+    _, t_exact = timed(lambda: len(set(texts)))
+    print(f"exact set   {t_exact:8.2f}s  {n_rows - len(set(texts)):>9} duplicates")
+
+    index = NearDuplicateIndex(max_entries=n_rows)
+    tracemalloc.start()
+    start = time.perf_counter()
+    duplicates = 0
+    for i in range(0, n_rows, batch):
+        duplicates += int(index.add_many(texts[i:i + batch]).sum())
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"simhash     {elapsed:8.2f}s  {duplicates:>9} near-duplicates ({duplicates / n_rows:.1%})  "
+          f"{n_rows / elapsed:,.0f} texts/s  index {index.nbytes / 2**20:.1f} MB  "
+          f"peak {peak / 2**20:.1f} MB")
+
+def check_near_dup_rerun(corpus, n_rows):
+    # Two runs over the same rows through a saved index: the second run must
+    # not flag every row as a copy of itself, and blank texts are never flagged
+    df = pd.DataFrame({'Comment_ID': [f"c{i}" for i in range(n_rows)],
+                       'Content': make_sample(corpus, n_rows).astype(object)})
+    df.loc[:2, 'Content'] = [None, '', '  ']
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, 'near_dups.npz')
+        flagged = []
+        for _ in range(2):
+            index = sa.load_near_dup_index(path)
+            sa.mark_near_duplicates(df, index)
+            index.save(path)
+            flagged.append(int(df['Near_Duplicate'].sum()))
+    print(f"rerun with a saved index: {flagged[0]} then {flagged[1]} of {n_rows} rows flagged, "
+          f"blank texts flagged={bool(df['Near_Duplicate'][:3].any())}")
+    assert flagged[1] == 0 and not df['Near_Duplicate'][:3].any()
+
+def run_python(code, cwd, repeats):
+    # Best wall time of a fresh interpreter running `code`, plus its last stdout line
+    best, output = None, ''
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, '-c', code], cwd=cwd, capture_output=True, text=True, check=True)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+        output = result.stdout.strip().splitlines()[-1] if result.stdout.strip() else ''
+    return best, output
+
+def bench_startup(corpus, n_rows, repeats):
+    print(f"== startup: fresh interpreter, best of {repeats} ==")
+    module_dir = os.path.dirname(os.path.abspath(sa.__file__))
+    text = str(corpus.dropna().iloc[0])
+    loaded = "import sys; print('snownlp loaded' if 'snownlp' in sys.modules else 'snownlp not loaded')"
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cache_path = os.path.join(tmp_dir, 'scores.sqlite')
+        cache = sa.ScoreCache(cache_path)
+        cache.put_many([text], sa.score_batch([text]))
+        cache.close()
+        csv_path = os.path.join(tmp_dir, 'comments.csv')
+        pd.DataFrame({'Content': make_sample(corpus, n_rows)}).to_csv(csv_path, index=False)
+        cli = f"import runpy, sys; sys.argv = ['analyze_sentiment.py', {csv_path!r}, {os.path.join(tmp_dir, 'out')!r}"
+
+        cases = [
+            # What importing the module cost before: matplotlib and SnowNLP up front
+            ('import, eager (before)', "import matplotlib.pyplot, snownlp; import analyze_sentiment"),
+            ('import, lazy', "import analyze_sentiment; " + loaded),
+            ('first score', f"import analyze_sentiment as sa; sa.score_batch([{text!r}]); " + loaded),
+            # Using the cache settles the scorer version, so it loads SnowNLP too
+            ('first score, cached', f"import analyze_sentiment as sa; "
+                                    f"sa.score_batch([{text!r}], cache=sa.ScoreCache({cache_path!r})); " + loaded),
+            (f'CLI {n_rows} rows', cli + "]; runpy.run_path('analyze_sentiment.py', run_name='__main__')"),
+            (f'CLI {n_rows} rows --no-charts',
+             cli + ", '--no-charts']; runpy.run_path('analyze_sentiment.py', run_name='__main__')"),
+        ]
+        for name, code in cases:
+            elapsed, output = run_python(code, module_dir, repeats)
+            note = output if output.startswith('snownlp') else ''
+            print(f"{name:<28} {elapsed * 1000:8.0f} ms  {note}")
+
+        # snownlp is installed but fails to import: the cache must key the
+        # keyword fallback scores as keyword scores
+        _, version = run_python("import sys, analyze_sentiment as sa; sys.modules['snownlp'] = None; "
+                                f"cache = sa.ScoreCache({cache_path!r}); sa.score_batch([{text!r}], cache=cache); "
+                                "print(cache.version)", module_dir, 1)
+        print(f"cache version when the SnowNLP import fails: {version}")
+        assert version.startswith('keywords-')
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sentiment scoring benchmarks")
+    parser.add_argument('--csv', default="project/tainanjosh_comments.csv")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--lexicon-sizes', type=int, nargs='+', default=[34, 1_000, 10_000, 100_000])
+    parser.add_argument('--distinct-rows', type=int, default=5_000)
+    parser.add_argument('--max-workers', type=int, default=os.cpu_count())
+    parser.add_argument('--near-dup-rows', type=int, default=1_000_000)
+    parser.add_argument('--near-dup-batch', type=int, default=100_000)
+    parser.add_argument('--startup-rows', type=int, default=1_000)
+    parser.add_argument('--startup-repeats', type=int, default=3)
+    parser.add_argument('--only', choices=['batch', 'keywords', 'workers', 'near_dup', 'startup'],
+                        help="Run a single benchmark")
+    parser.add_argument('--baseline-limit', type=int, default=10_000,
+                        help="Skip the (slow) per-row baseline above this many rows")
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.csv)
+    if args.only in (None, 'batch'):
+        bench_batch(corpus, args.sizes, args.baseline_limit)
+    if args.only in (None, 'keywords'):
+        bench_keywords(corpus, args.lexicon_sizes)
+    if args.only in (None, 'workers'):
+        bench_workers(corpus, args.distinct_rows, args.max_workers)
+    if args.only in (None, 'near_dup'):
+        bench_near_dup(corpus, args.near_dup_rows, args.near_dup_batch)
+        check_near_dup_rerun(corpus, 500)
+    if args.only in (None, 'startup'):
+        bench_startup(corpus, args.startup_rows, args.startup_repeats)
@@ -1,81 +1,533 @@
 import scrapetube
 from youtube_comment_downloader import YoutubeCommentDownloader, SORT_BY_RECENT
 import pandas as pd
+import os
+import random
+import re
+import requests
+import shutil
+import sqlite3
 import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
 
-def get_channel_comments(channel_url, video_limit=5, comments_per_video=50):
+class ThrottledError(Exception):
+    """
+    重試次數用完仍被限流 (429 / 5xx)
+    """
+
+
+class TokenBucket:
+    """
+    單一端點的 token bucket (執行緒安全)
+
+    平均每秒最多 rate 次請求，允許瞬間 burst 次。
+    速率會自動調整：每次成功加回 increase，被限流時減半 (但不低於 min_rate)，
+    所以會停在伺服器能接受的最高速率附近。rate 為 None 時不限速，只在退避期間暫停。
+    """
+    def __init__(self, rate=None, burst=1, min_rate=0.2, increase=0.5):
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min(min_rate, rate) if rate else min_rate
+        self.increase = increase
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.requests = 0
+        self.throttled = 0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        with self.lock:
+            now = time.monotonic()
+            self.requests += 1
+            wait_time = self.paused_until - now
+            if self.rate:
+                # 先預約一個 token，不夠時算出要等多久
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                self.tokens -= 1
+                wait_time = max(wait_time, -self.tokens / self.rate)
+        if wait_time > 0:
+            time.sleep(wait_time)
+
+    def on_success(self):
+        if self.rate:
+            with self.lock:
+                self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def on_throttle(self, delay):
+        """
+        被限流：整個端點暫停 delay 秒；同一段暫停期間內的多次限流只減速一次
+        """
+        with self.lock:
+            now = time.monotonic()
+            self.throttled += 1
+            if now >= self.paused_until and self.rate:
+                self.rate = max(self.min_rate, self.rate / 2)
+                # 減速後重新累積 token，避免暫停結束時一次湧出
+                self.tokens = min(self.tokens, 0.0)
+            self.paused_until = max(self.paused_until, now + delay)
+
+
+class RequestScheduler:
+    """
+    所有 worker 共用的請求排程器
+
+    - 每個端點 (主機 + 路徑，例如 /watch 與 /youtubei/v1/next) 有自己的 token bucket
+    - 429 / 5xx / 連線錯誤時以指數退避 (含 jitter) 重試，伺服器給了 Retry-After 就照它的時間
+    - 重試用完仍失敗時丟出 ThrottledError，由 get_channel_comments 把影片放回重試佇列
+    """
+    RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+    def __init__(self, rate=None, burst=1, max_retries=4, backoff=1.0, max_delay=60.0):
+        self.rate = rate
+        self.burst = burst
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_delay = max_delay
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def bucket(self, url):
+        parsed = urlparse(url)
+        endpoint = parsed.netloc + parsed.path
+        with self.lock:
+            if endpoint not in self.buckets:
+                self.buckets[endpoint] = TokenBucket(self.rate, self.burst)
+            return self.buckets[endpoint]
+
+    def retry_delay(self, attempt, response=None):
+        retry_after = response.headers.get('Retry-After') if response is not None else None
+        if retry_after:
+            try:
+                return min(float(retry_after), self.max_delay)
+            except ValueError:
+                pass  # HTTP 日期格式，改用退避時間
+        return min(self.backoff * (2 ** attempt) * (0.5 + random.random()), self.max_delay)
+
+    def request(self, send, method, url, *args, **kwargs):
+        """
+        透過 send (例如 session.request) 送出請求，依端點限速並在限流時重試
+        """
+        bucket = self.bucket(url)
+        for attempt in range(self.max_retries + 1):
+            bucket.acquire()
+            try:
+                response = send(method, url, *args, **kwargs)
+            except requests.ConnectionError as e:
+                response, error = None, str(e)
+            else:
+                if response.status_code not in self.RETRY_STATUSES:
+                    bucket.on_success()
+                    return response
+                error = f"HTTP {response.status_code}"
+            bucket.on_throttle(self.retry_delay(attempt, response))
+        raise ThrottledError(f"{method} {url} 失敗 ({error})，已重試 {self.max_retries} 次")
+
+    def summary(self):
+        return '，'.join(f"{endpoint}: {bucket.requests} 次請求，限流 {bucket.throttled} 次"
+                        + (f"，目前每秒 {bucket.rate:.1f} 次" if bucket.rate else '')
+                        for endpoint, bucket in self.buckets.items())
+
+
+COMMENT_COLUMNS = ['Video_Title', 'Video_ID', 'Comment_ID', 'User_ID', 'User_Name',
+                   'Content', 'Timestamp', 'Likes', 'Is_Reply']
+
+
+class CheckpointStore:
+    """
+    增量抓取用的本地狀態 (SQLite)
+
+    - comments: 抓過的所有留言 (Comment_ID 為主鍵)
+    - videos:   每部影片最新一則留言的 Comment_ID，以及最後完成抓取的 run
+    - runs:     每次執行的紀錄；未完成 (finished_at 為 NULL) 的 run 下次會接續執行
+    """
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.executescript('''
+            CREATE TABLE IF NOT EXISTS comments (
+                Comment_ID TEXT PRIMARY KEY,
+                Video_Title TEXT, Video_ID TEXT, User_ID TEXT, User_Name TEXT,
+                Content TEXT, Timestamp TEXT, Likes TEXT, Is_Reply INTEGER,
+                run_id INTEGER, position INTEGER
+            );
+            CREATE INDEX IF NOT EXISTS idx_comments_video ON comments (Video_ID);
+            CREATE TABLE IF NOT EXISTS videos (
+                Video_ID TEXT PRIMARY KEY,
+                newest_comment_id TEXT,
+                last_run_id INTEGER
+            );
+            CREATE TABLE IF NOT EXISTS runs (
+                run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                started_at REAL,
+                finished_at REAL
+            );
+        ''')
+        self.conn.commit()
+
+    def begin_run(self):
+        """
+        開始一次抓取；如果上次執行中斷，沿用該 run 以便從檢查點接續
+        """
+        with self.lock:
+            row = self.conn.execute(
+                'SELECT run_id FROM runs WHERE finished_at IS NULL ORDER BY run_id DESC LIMIT 1'
+            ).fetchone()
+            if row:
+                print(f"偵測到未完成的抓取 (run {row[0]})，從檢查點接續...")
+                return row[0]
+            cursor = self.conn.execute('INSERT INTO runs (started_at) VALUES (?)', (time.time(),))
+            self.conn.commit()
+            return cursor.lastrowid
+
+    def finish_run(self, run_id):
+        with self.lock:
+            self.conn.execute('UPDATE runs SET finished_at = ? WHERE run_id = ?', (time.time(), run_id))
+            self.conn.commit()
+
+    def is_video_done(self, run_id, video_id):
+        with self.lock:
+            row = self.conn.execute('SELECT last_run_id FROM videos WHERE Video_ID = ?', (video_id,)).fetchone()
+        return bool(row) and row[0] == run_id
+
+    def newest_comment_id(self, video_id):
+        with self.lock:
+            row = self.conn.execute('SELECT newest_comment_id FROM videos WHERE Video_ID = ?', (video_id,)).fetchone()
+        return row[0] if row else None
+
+    def has_comment(self, comment_id):
+        with self.lock:
+            row = self.conn.execute('SELECT 1 FROM comments WHERE Comment_ID = ?', (comment_id,)).fetchone()
+        return row is not None
+
+    def save_video(self, run_id, video_id, rows):
+        """
+        寫入一部影片新抓到的留言並更新檢查點 (同一個 transaction)
+        """
+        with self.lock:
+            self.conn.executemany(
+                '''INSERT OR IGNORE INTO comments
+                   (Comment_ID, Video_Title, Video_ID, User_ID, User_Name, Content, Timestamp, Likes, Is_Reply, run_id, position)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+                [(r['Comment_ID'], r['Video_Title'], r['Video_ID'], r['User_ID'], r['User_Name'],
+                  r['Content'], r['Timestamp'], r['Likes'], int(bool(r['Is_Reply'])), run_id, i)
+                 for i, r in enumerate(rows)]
+            )
+            # SORT_BY_RECENT 是新到舊，第一則非回覆的留言就是最新的留言
+            newest = next((r['Comment_ID'] for r in rows if not r['Is_Reply']), None)
+            self.conn.execute(
+                '''INSERT INTO videos (Video_ID, newest_comment_id, last_run_id) VALUES (?, ?, ?)
+                   ON CONFLICT (Video_ID) DO UPDATE SET
+                       newest_comment_id = COALESCE(excluded.newest_comment_id, videos.newest_comment_id),
+                       last_run_id = excluded.last_run_id''',
+                (video_id, newest, run_id)
+            )
+            self.conn.commit()
+
+    def load_comments(self, video_ids):
+        """
+        依影片順序讀出留言；同一部影片內較新的 run 排在前面 (維持新到舊)
+        """
+        frames = []
+        with self.lock:
+            for video_id in video_ids:
+                frames.append(pd.read_sql_query(
+                    f'''SELECT {', '.join(COMMENT_COLUMNS)} FROM comments
+                        WHERE Video_ID = ? ORDER BY run_id DESC, position''',
+                    self.conn, params=(video_id,)
+                ))
+        if not frames:
+            return pd.DataFrame(columns=COMMENT_COLUMNS)
+        df = pd.concat(frames, ignore_index=True)
+        df['Is_Reply'] = df['Is_Reply'].astype(bool)
+        return df
+
+    def close(self):
+        self.conn.close()
+
+
+def throttle_downloader(downloader, scheduler):
+    """
+    讓 downloader 底層 session 的每一次 HTTP 請求都經過排程器 (限速 + 限流重試)
+    (測試用的假 downloader 沒有 session，就直接略過)
+    """
+    session = getattr(downloader, 'session', None)
+    if session is None:
+        return downloader
+
+    original_request = session.request
+
+    def request(method, url, *args, **kwargs):
+        return scheduler.request(original_request, method, url, *args, **kwargs)
+
+    session.request = request
+    return downloader
+
+
+def get_video_title(video):
+    # 嘗試獲取標題，不同來源結構可能不同，這裡做簡單處理
+    return video.get('title', {}).get('runs', [{}])[0].get('text', 'No Title')
+
+
+def fetch_video_comments(downloader, video_id, title, comments_per_video, is_known=None):
+    """
+    抓取單一影片的留言，回傳整理好欄位的 dict 列表
+
+    is_known(comment_id) 回傳 True 時停止 (增量模式：遇到上次已抓過的留言)；
+    置頂留言即使用 SORT_BY_RECENT 也會排在第一則，所以第一則已知時只略過它 (和它的回覆)，
+    由下一則留言決定是否停止。
+    """
+    # 2. 抓取該影片的留言 (使用 youtube-comment-downloader)
+    # 使用 SORT_BY_RECENT 抓取最新留言，或移除參數抓取熱門留言
+    comments = downloader.get_comments_from_url(
+        f'https://www.youtube.com/watch?v={video_id}', 
+        sort_by=SORT_BY_RECENT
+    )
+
+    video_data = []
+    pinned = None
+    for position, comment in enumerate(comments or []):
+        cid = comment.get('cid') or ''
+        if pinned and cid.startswith(pinned + '.'):
+            continue
+        if is_known and is_known(cid):
+            if position == 0 and '.' not in cid:
+                pinned = cid
+                continue
+            break
+
+        # 3. 整理需要的欄位
+        # 注意：非官方 API 方式，"回覆數"有時可能抓不到或為 0，視 YouTube 頁面結構而定
+        comment_data = {
+            'Video_Title': title,
+            'Video_ID': video_id,
+            'Comment_ID': comment.get('cid'),
+            'User_ID': comment.get('channel'), # 這是使用者的 Channel ID
+            'User_Name': comment.get('author'),
+            'Content': comment.get('text'), # 留言內容
+            'Timestamp': comment.get('time'), # 發布時間 (例如: "2 hours ago")
+            'Likes': comment.get('votes'), # 按讚數
+            # 非官方 API 的 Reply 數通常需要進一步解析，這裡先抓是否有 reply 標記
+            'Is_Reply': comment.get('reply', False) 
+        }
+        video_data.append(comment_data)
+        # 收滿就停止，避免多抓下一頁
+        if len(video_data) >= comments_per_video:
+            break
+
+    return video_data
+
+
+def get_channel_comments(channel_url, video_limit=5, comments_per_video=50,
+                         max_workers=1, requests_per_second=None,
+                         downloader_factory=YoutubeCommentDownloader, videos=None,
+                         store=None, scheduler=None, video_retries=2, retry_delay=5.0, on_video=None):
     """
     抓取指定頻道最新影片的留言
+
+    max_workers > 1 時會同時抓取多部影片的留言 (執行緒池)，
+    requests_per_second 是所有 worker 對每個 YouTube 端點的請求速率上限 (被限流時自動降速)，
+    也可以直接傳入自訂的 scheduler (RequestScheduler)。
+    結果依影片順序合併，欄位與逐部抓取時完全相同。
+
+    抓取失敗的影片 (例如重試用完仍被限流) 會放進重試佇列，
+    等其他影片抓完、退避一段時間後再重抓，最多 video_retries 輪。
+
+    傳入 store (CheckpointStore) 時為增量模式：每部影片只抓到上次看過的留言為止，
+    每部影片完成後寫入檢查點，中斷後重跑會跳過已完成的影片；
+    回傳的 DataFrame 包含 store 中這些影片的所有留言 (新 + 舊)。
+
+    傳入 on_video 時為串流模式：每部影片抓完就把留言列表交給 on_video(rows, ack)
+    (在 worker 執行緒中呼叫，可以阻塞)，留言不會累積在記憶體中；on_video 回傳 False 時不再抓取剩下的影片。
+    增量模式下呼叫端把留言寫出後才呼叫 ack() 寫入檢查點 (中斷時還沒寫出的影片下次會重抓)，
+    最後回傳這次的 run_id (沒有 store 時為 None)，由呼叫端在所有 ack 之後呼叫 store.finish_run(run_id)。
     """
     print(f"正在搜尋頻道: {channel_url} 的最新影片...")
     
     # 1. 獲取頻道影片列表 (使用 scrapetube)
-    videos = scrapetube.get_channel(channel_url=channel_url, limit=video_limit)
-    
-    downloader = YoutubeCommentDownloader()
-    all_data = []
+    if videos is None:
+        videos = scrapetube.get_channel(channel_url=channel_url, limit=video_limit)
+
+    # 每個 worker 執行緒使用自己的 downloader (requests.Session 不保證執行緒安全)
+    scheduler = scheduler or RequestScheduler(requests_per_second)
+    local = threading.local()
+
+    def get_downloader():
+        if not hasattr(local, 'downloader'):
+            local.downloader = throttle_downloader(downloader_factory(), scheduler)
+        return local.downloader
+
+    run_id = store.begin_run() if store else None
+    video_ids = []
+    stopped = threading.Event()
 
-    video_count = 0
-    for video in videos:
-        video_count += 1
+    def save(video_id, video_data):
+        store.save_video(run_id, video_id, video_data)
+        print(f"影片 {video_id} 新增 {len(video_data)} 則留言")
+
+    def fetch(video_count, video):
         video_id = video['videoId']
-        # 嘗試獲取標題，不同來源結構可能不同，這裡做簡單處理
-        title = video.get('title', {}).get('runs', [{}])[0].get('text', 'No Title')
-        
+        title = get_video_title(video)
+
+        if stopped.is_set():
+            return []
+
+        if store and store.is_video_done(run_id, video_id):
+            print(f"[{video_count}/{video_limit}] 已完成，跳過影片: {title} (ID: {video_id})")
+            return []
+
         print(f"[{video_count}/{video_limit}] 正在抓取影片: {title} (ID: {video_id})")
-        
+
+        is_known = None
+        if store:
+            newest = store.newest_comment_id(video_id)
+            # 最新留言可能被刪除，所以任何已知的非回覆留言都視為停止點
+            is_known = lambda cid: cid == newest or ('.' not in (cid or '') and store.has_comment(cid))
+
         try:
-            # 2. 抓取該影片的留言 (使用 youtube-comment-downloader)
-            # 使用 SORT_BY_RECENT 抓取最新留言，或移除參數抓取熱門留言
-            comments = downloader.get_comments_from_url(
-                f'https://www.youtube.com/watch?v={video_id}', 
-                sort_by=SORT_BY_RECENT
-            )
-            
-            count = 0
-            for comment in comments:
-                if count >= comments_per_video:
-                    break
-                
-                # 3. 整理需要的欄位
-                # 注意：非官方 API 方式，"回覆數"有時可能抓不到或為 0，視 YouTube 頁面結構而定
-                comment_data = {
-                    'Video_Title': title,
-                    'Video_ID': video_id,
-                    'Comment_ID': comment.get('cid'),
-                    'User_ID': comment.get('channel'), # 這是使用者的 Channel ID
-                    'User_Name': comment.get('author'),
-                    'Content': comment.get('text'), # 留言內容
-                    'Timestamp': comment.get('time'), # 發布時間 (例如: "2 hours ago")
-                    'Likes': comment.get('votes'), # 按讚數
-                    # 非官方 API 的 Reply 數通常需要進一步解析，這裡先抓是否有 reply 標記
-                    'Is_Reply': comment.get('reply', False) 
-                }
-                all_data.append(comment_data)
-                count += 1
-                
+            video_data = fetch_video_comments(get_downloader(), video_id, title, comments_per_video, is_known)
         except Exception as e:
             print(f"抓取影片 {video_id} 時發生錯誤: {e}")
-            continue
+            return None
+
+        if on_video is not None:
+            ack = (lambda: save(video_id, video_data)) if store else (lambda: None)
+            if on_video(video_data, ack) is False:
+                stopped.set()
+            return []
+        if store:
+            save(video_id, video_data)
+        return video_data
+
+    # 重試佇列：每一輪抓取佇列中的影片，失敗的留到下一輪
+    results = {}
+    queue = []
+    for video_count, video in enumerate(videos, 1):
+        video_ids.append(video['videoId'])
+        queue.append((video_count, video))
+
+    executor = ThreadPoolExecutor(max_workers=max_workers) if max_workers > 1 else None
+    try:
+        for attempt in range(video_retries + 1):
+            if attempt:
+                delay = retry_delay * (2 ** (attempt - 1)) * (0.5 + random.random())
+                print(f"{len(queue)} 部影片抓取失敗，{delay:.1f} 秒後重試 (第 {attempt}/{video_retries} 輪)...")
+                time.sleep(delay)
+            if executor is None:
+                outcomes = [fetch(video_count, video) for video_count, video in queue]
+            else:
+                outcomes = list(executor.map(lambda item: fetch(*item), queue))
+            failed = []
+            for item, video_data in zip(queue, outcomes):
+                if video_data is None:
+                    failed.append(item)
+                else:
+                    results[item[0]] = video_data
+            queue = failed
+            if not queue:
+                break
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    for video_count, video in queue:
+        print(f"影片 {video['videoId']} 重試 {video_retries} 輪後仍失敗，略過")
+    if scheduler.buckets:
+        print(f"請求統計: {scheduler.summary()}")
+
+    if on_video is not None:
+        # 留言可能還沒寫出，由呼叫端結束這次 run；中途停止時不結束，下次執行從檢查點接續
+        return run_id
+
+    all_data = []
+    for video_count in sorted(results):
+        all_data.extend(results[video_count])
+
+    if store:
+        store.finish_run(run_id)
+        return store.load_comments(video_ids)
 
     # 4. 轉換為 DataFrame 並儲存
     df = pd.DataFrame(all_data)
     return df
 
+def parse_likes(value):
+    """
+    把按讚數轉成整數 (YouTube 可能顯示 "1.2K"、"3.4萬" 這類縮寫)
+    """
+    if value is None or (isinstance(value, float) and pd.isna(value)):
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    match = re.fullmatch(r'([\d.,]+)\s*([KkMm千萬万]?)', str(value).strip())
+    if not match:
+        return None
+    number = float(match.group(1).replace(',', ''))
+    multiplier = {'': 1, 'K': 1000, 'k': 1000, '千': 1000, 'M': 1000000, 'm': 1000000, '萬': 10000, '万': 10000}
+    return int(round(number * multiplier[match.group(2)]))
+
+
+def to_typed(df):
+    """
+    轉成固定的欄位型別 (CSV 讀回來時 Likes / Is_Reply 會變成字串或 object)
+    """
+    df = df.reindex(columns=COMMENT_COLUMNS)
+    for column in COMMENT_COLUMNS:
+        if column not in ('Likes', 'Is_Reply'):
+            df[column] = df[column].astype('string')
+    df['Likes'] = pd.array([parse_likes(v) for v in df['Likes']], dtype='Int64')
+    df['Is_Reply'] = df['Is_Reply'].fillna(False).astype(bool)
+    return df
+
+
+def save_comments(df, filename, output_format='csv'):
+    """
+    儲存留言資料
+    - csv:     Excel 打開不會亂碼 (utf-8-sig)
+    - parquet: 保留欄位型別、依 Video_ID 分區的欄式資料集 (資料夾)，讀取時可只讀需要的欄位
+    """
+    if output_format == 'parquet':
+        path = os.path.splitext(filename)[0] + '.parquet'
+        # 先清掉舊的資料集，避免同一分區留下重複的檔案
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        to_typed(df).to_parquet(path, partition_cols=['Video_ID'], index=False)
+    else:
+        path = filename
+        df.to_csv(path, index=False, encoding='utf-8-sig')
+    return path
+
+
 # --- 設定參數 ---
 CHANNEL_URL = "https://www.youtube.com/@tainanjosh"
 VIDEO_LIMIT = 5          # 抓取最新的 5 部影片
 COMMENTS_PER_VIDEO = 100 # 每部影片抓取多少則留言 (設多一點以免資料不夠)
+MAX_WORKERS = 4          # 同時抓取幾部影片的留言 (設為 1 則逐部抓取)
+REQUESTS_PER_SECOND = 5  # 對每個 YouTube 端點的請求速率上限，被限流時自動降速 (None 表示不限制)
+VIDEO_RETRIES = 2        # 抓取失敗的影片最多再重抓幾輪
+INCREMENTAL = True       # 增量模式：只抓上次之後的新留言，並可從中斷處接續
+STATE_DB = "crawl_state.sqlite" # 增量模式的狀態檔
+OUTPUT_FORMAT = "csv"    # "csv" (Excel 友善) 或 "parquet" (欄式儲存，依 Video_ID 分區)
 
 # --- 執行主程式 ---
 if __name__ == "__main__":
-    df_comments = get_channel_comments(CHANNEL_URL, VIDEO_LIMIT, COMMENTS_PER_VIDEO)
+    store = CheckpointStore(STATE_DB) if INCREMENTAL else None
+    df_comments = get_channel_comments(CHANNEL_URL, VIDEO_LIMIT, COMMENTS_PER_VIDEO,
+                                       max_workers=MAX_WORKERS,
+                                       requests_per_second=REQUESTS_PER_SECOND,
+                                       store=store, video_retries=VIDEO_RETRIES)
+    if store:
+        store.close()
     
     # 預覽資料
     print(f"抓取完成！共取得 {len(df_comments)} 則留言。")
     print(df_comments.head())
     
-    # 存成 CSV 檔，Excel 打開不會亂碼 (utf-8-sig)
-    filename = "tainanjosh_comments.csv"
-    df_comments.to_csv(filename, index=False, encoding='utf-8-sig')
-    print(f"檔案已儲存為: {filename}")
\ No newline at end of file
+    # 存成 CSV 檔 (Excel 打開不會亂碼) 或 Parquet 資料集
+    filename = save_comments(df_comments, "tainanjosh_comments.csv", OUTPUT_FORMAT)
+    print(f"檔案已儲存為: {filename}")
@@ -0,0 +1,254 @@
+import hashlib
+import re
+import unicodedata
+import numpy as np
+
+# Near-duplicate detection with 64-bit SimHash fingerprints over character
+# n-grams. Two texts count as near-duplicates when their fingerprints differ
+# in at most `distance` bits. Fingerprints are split into BANDS bands of 16
+# bits; by pigeonhole, fingerprints within distance < BANDS bits share at
+# least one band exactly, so lookups only compare against the few entries
+# in matching band buckets (sorted numpy arrays, searchsorted per band).
+#
+# Memory is bounded: the index keeps at most max_entries fingerprints
+# (oldest evicted first), about 48 bytes each, and can be saved to / loaded
+# from an .npz file to carry over between runs. Texts added with keys (e.g.
+# comment ids) also remember a 64-bit hash of the key, so a rerun over the
+# same rows does not match every row against its own earlier fingerprint.
+
+NGRAM = 3
+BANDS = 4
+BAND_BITS = 64 // BANDS
+BAND_MASK = np.uint64((1 << BAND_BITS) - 1)
+# simhash_many normalizes this many texts at a time and hashes at most
+# CHUNK_GRAMS grams at once (a few uint64 arrays of that length)
+CHUNK_TEXTS = 1 << 16
+CHUNK_GRAMS = 1 << 20
+# Pending fingerprints are merged into the sorted band tables past this size
+MERGE_MIN = 4096
+# Bit counts are accumulated in 16-bit lanes, so texts are cut at this length
+MAX_CHARS = 65535
+
+WHITESPACE = re.compile(r'\s+')
+
+_GRAM_MULTIPLIERS = [np.uint64(0x9E3779B97F4A7C15), np.uint64(0xC2B2AE3D27D4EB4F),
+                     np.uint64(0x165667B19E3779F9)]
+
+def normalize_text(text):
+    # NFKC + casefold with all whitespace dropped, so passes over the same
+    # content that differ only in spacing or line breaks fingerprint the same
+    if not isinstance(text, str):
+        return ''
+    return ''.join(unicodedata.normalize('NFKC', text).casefold().split())
+
+def normalize_many(texts):
+    # normalize_text for a whole batch in one pass over a NUL-joined string
+    joined = '\0'.join(t.replace('\0', '') if isinstance(t, str) else '' for t in texts)
+    joined = WHITESPACE.sub('', unicodedata.normalize('NFKC', joined).casefold())
+    return [t[:MAX_CHARS] for t in joined.split('\0')] if texts else []
+
+# _NIBBLE_LANES[v] spreads the 4 bits of v over four 16-bit lanes of a uint64
+_NIBBLE_LANES = np.array([sum(((v >> j) & 1) << (16 * j) for j in range(4)) for v in range(16)],
+                         dtype=np.uint64)
+
+def _mix(h):
+    # splitmix64 finalizer; numpy uint64 arithmetic wraps around
+    h = (h ^ (h >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    h = (h ^ (h >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return h ^ (h >> np.uint64(31))
+
+def _simhash_chunk(texts, counts):
+    # Every text is followed by NGRAM NUL characters, so each gram stays
+    # inside its own text (texts shorter than NGRAM get one NUL-padded gram).
+    pad = '\0' * NGRAM
+    codes = np.frombuffer((pad.join(texts) + pad).encode('utf-32-le'), dtype=np.uint32).astype(np.uint64)
+    lengths = np.fromiter(map(len, texts), dtype=np.int64, count=len(texts))
+    offsets = np.cumsum(lengths + NGRAM) - (lengths + NGRAM)
+    first_gram = np.cumsum(counts) - counts
+    positions = np.arange(counts.sum()) + np.repeat(offsets - first_gram, counts)
+
+    h = np.zeros(len(positions), dtype=np.uint64)
+    for k in range(NGRAM):
+        h ^= codes[positions + k] * _GRAM_MULTIPLIERS[k]
+    h = _mix(h)
+
+    # Majority vote per bit over the text's grams. Per-text bit counts are
+    # summed 4 bits at a time, one 16-bit lane per bit, with a 1-D
+    # reduceat (much faster than reducing a grams x 64 bit matrix).
+    fingerprints = np.zeros(len(texts), dtype=np.uint64)
+    for nibble in range(16):
+        lanes = _NIBBLE_LANES[(h >> np.uint64(4 * nibble)) & np.uint64(15)]
+        sums = np.add.reduceat(lanes, first_gram)
+        for lane in range(4):
+            ones = (sums >> np.uint64(16 * lane)) & np.uint64(0xFFFF)
+            set_bit = (ones * np.uint64(2) > counts.astype(np.uint64)).astype(np.uint64)
+            fingerprints |= set_bit << np.uint64(4 * nibble + lane)
+    return fingerprints
+
+def simhash_many(texts):
+    texts = list(texts)
+    fingerprints = np.empty(len(texts), dtype=np.uint64)
+    for batch_start in range(0, len(texts), CHUNK_TEXTS):
+        normalized = normalize_many(texts[batch_start:batch_start + CHUNK_TEXTS])
+        lengths = np.fromiter(map(len, normalized), dtype=np.int64, count=len(normalized))
+        counts = np.maximum(lengths - NGRAM + 1, 1)
+        # Split further on text boundaries so each chunk has about CHUNK_GRAMS grams
+        cumulative = np.cumsum(counts)
+        start = 0
+        while start < len(normalized):
+            done = cumulative[start - 1] if start else 0
+            end = max(int(np.searchsorted(cumulative, done + CHUNK_GRAMS, side='right')), start + 1)
+            fingerprints[batch_start + start:batch_start + end] = _simhash_chunk(normalized[start:end],
+                                                                                 counts[start:end])
+            start = end
+    return fingerprints
+
+def simhash(text):
+    return int(simhash_many([text])[0])
+
+def hash_keys(keys):
+    # 64-bit hashes of row keys; missing keys (None / NaN) hash to 0, which is never stored
+    return np.array([0 if key is None or key != key else
+                     int.from_bytes(hashlib.blake2b(str(key).encode('utf-8', 'surrogatepass'),
+                                                    digest_size=8).digest(), 'little') | 1
+                     for key in keys], dtype=np.uint64)
+
+def _band_keys(fingerprints, band):
+    return ((fingerprints >> np.uint64(band * BAND_BITS)) & BAND_MASK).astype(np.uint16)
+
+def _band_tables(fingerprints):
+    tables = []
+    for band in range(BANDS):
+        keys = _band_keys(fingerprints, band)
+        order = np.argsort(keys, kind='stable')
+        tables.append((keys[order], fingerprints[order]))
+    return tables
+
+class NearDuplicateIndex:
+    def __init__(self, max_entries=1_000_000, distance=3):
+        if not 0 <= distance < BANDS:
+            raise ValueError(f"distance must be between 0 and {BANDS - 1}")
+        self.max_entries = max_entries
+        self.distance = distance
+        self.fingerprints = np.empty(0, dtype=np.uint64)  # merged, oldest first
+        self.tables = _band_tables(self.fingerprints)
+        self.pending = np.empty(0, dtype=np.uint64)
+        self.keys = np.empty(0, dtype=np.uint64)  # hash_keys of added rows, oldest first
+
+    def __len__(self):
+        return len(self.fingerprints) + len(self.pending)
+
+    @property
+    def nbytes(self):
+        return (self.fingerprints.nbytes + self.pending.nbytes + self.keys.nbytes +
+                sum(keys.nbytes + fps.nbytes for keys, fps in self.tables))
+
+    def _merge(self):
+        merged = np.concatenate([self.fingerprints, self.pending])
+        self.fingerprints = merged[-self.max_entries:] if self.max_entries else merged[:0]
+        self.tables = _band_tables(self.fingerprints)
+        self.pending = np.empty(0, dtype=np.uint64)
+
+    def _close(self, a, b):
+        return np.bitwise_count(a ^ b) <= self.distance
+
+    def _hits(self, queries, tables):
+        # Band-bucket join: every query against the entries sharing a band
+        hits = np.zeros(len(queries), dtype=bool)
+        for band, (keys, fps) in enumerate(tables):
+            q = _band_keys(queries, band)
+            lo = np.searchsorted(keys, q, side='left')
+            counts = np.searchsorted(keys, q, side='right') - lo
+            total = int(counts.sum())
+            if not total:
+                continue
+            owner = np.repeat(np.arange(len(queries)), counts)
+            candidates = np.arange(total) + np.repeat(lo - (np.cumsum(counts) - counts), counts)
+            hits[owner[self._close(fps[candidates], queries[owner])]] = True
+        return hits
+
+    def _hits_within(self, fingerprints):
+        # Marks every fingerprint that is close to an earlier one in the same batch
+        n = len(fingerprints)
+        hits = np.zeros(n, dtype=bool)
+        for band in range(BANDS):
+            keys = _band_keys(fingerprints, band)
+            order = np.argsort(keys, kind='stable')
+            keys, fps = keys[order], fingerprints[order]
+            # Compare each entry with the one d places later while both are
+            # still in the same run of equal band keys
+            active = np.arange(n - 1)
+            d = 1
+            while active.size:
+                active = active[active + d < n]
+                active = active[keys[active] == keys[active + d]]
+                if not active.size:
+                    break
+                close = active[self._close(fps[active], fps[active + d])]
+                hits[np.maximum(order[close], order[close + d])] = True
+                d += 1
+        return hits
+
+    def add_fingerprints(self, fingerprints):
+        # Returns a bool array: True where the fingerprint is within `distance`
+        # bits of one seen before (in the index or earlier in this batch).
+        # Only the others are stored.
+        fingerprints = np.asarray(fingerprints, dtype=np.uint64)
+        unique, first = np.unique(fingerprints, return_index=True)
+        # Keep first-occurrence order so "earlier" means earlier in the input
+        by_position = np.argsort(first, kind='stable')
+        unique, first = unique[by_position], first[by_position]
+
+        duplicate = self._hits_within(unique) if len(unique) > 1 else np.zeros(len(unique), dtype=bool)
+        if len(self.fingerprints):
+            fresh = ~duplicate
+            duplicate[fresh] = self._hits(unique[fresh], self.tables)
+        if len(self.pending):
+            fresh = ~duplicate
+            if fresh.sum() * len(self.pending) <= 1 << 20:
+                # Few comparisons: brute force against the pending list
+                duplicate[fresh] = np.array([self._close(self.pending, fp).any() for fp in unique[fresh]],
+                                            dtype=bool)
+            else:
+                duplicate[fresh] = self._hits(unique[fresh], _band_tables(self.pending))
+
+        self.pending = np.concatenate([self.pending, unique[~duplicate]])
+        if len(self.pending) >= max(MERGE_MIN, len(self.fingerprints) // 8):
+            self._merge()
+
+        # Map back to input rows; repeats of the same fingerprint are duplicates
+        result = np.ones(len(fingerprints), dtype=bool)
+        result[first] = duplicate
+        return result
+
+    def add_many(self, texts, keys=None):
+        # With keys, rows whose key was added before are neither checked nor
+        # stored again (their result is False)
+        texts = list(texts)
+        if keys is None:
+            return self.add_fingerprints(simhash_many(texts))
+        hashed = hash_keys(keys)
+        new = (hashed == 0) | ~np.isin(hashed, self.keys)
+        result = np.zeros(len(texts), dtype=bool)
+        if new.any():
+            result[new] = self.add_fingerprints(simhash_many([text for text, fresh in zip(texts, new) if fresh]))
+            added = np.unique(hashed[new & (hashed != 0)])
+            self.keys = np.concatenate([self.keys, added])[-self.max_entries:] if self.max_entries else self.keys[:0]
+        return result
+
+    def add(self, text):
+        return bool(self.add_fingerprints([simhash(text)])[0])
+
+    def save(self, path):
+        np.savez(path, fingerprints=np.concatenate([self.fingerprints, self.pending]),
+                 distance=self.distance, keys=self.keys)
+
+    @classmethod
+    def load(cls, path, max_entries=1_000_000):
+        with np.load(path) as data:
+            index = cls(max_entries=max_entries, distance=int(data['distance']))
+            index.pending = data['fingerprints'].astype(np.uint64)
+            if 'keys' in data.files:
+                index.keys = data['keys'].astype(np.uint64)[-max_entries:] if max_entries else index.keys
+        index._merge()
+        return index
@@ -0,0 +1,205 @@
+import argparse
+import os
+import queue
+import threading
+import time
+import numpy as np
+import pandas as pd
+
+import grab_data as gd
+import analyze_sentiment as sa
+
+# Channel refresh as a fetch -> score -> store pipeline. The three stages run
+# concurrently and hand batches (one video's comments) over bounded queues:
+#
+#   fetch  get_channel_comments worker threads (network I/O), one batch per video
+#   score  one thread calling score_batch, sharded over a process pool when workers > 1
+#   store  the calling thread, appending to the analyzed results like analyze_streaming
+#
+# With a CheckpointStore (incremental crawl) each batch carries an ack that
+# checkpoints the video, called only once its rows are written; the output of
+# earlier runs is appended to, not replaced, and the run is finished last.
+# The charts then cover the whole appended output, not only this run's rows.
+#
+# A full queue blocks the stage feeding it, so at most about 2 * queue_size
+# batches are held in memory however large the channel is, and the refresh
+# takes roughly max(fetch, score) instead of fetch + score. Results are
+# written in the order videos finish, not in channel order.
+
+DONE = object()
+
+class PipelineStopped(Exception):
+    pass
+
+def put(q, item, stop, stats, name):
+    # Blocking put that gives up once another stage has failed
+    while True:
+        try:
+            q.put(item, timeout=0.1)
+            break
+        except queue.Full:
+            if stop.is_set():
+                raise PipelineStopped()
+    stats[name] = max(stats[name], q.qsize())
+
+def get(q, stop):
+    while True:
+        try:
+            return q.get(timeout=0.1)
+        except queue.Empty:
+            if stop.is_set():
+                raise PipelineStopped()
+
+def output_totals(path, bin_edges, chunksize=100_000):
+    # Histogram and category counts over a whole results file, a chunk at a time
+    hist_counts = np.zeros(len(bin_edges) - 1, dtype=np.int64)
+    category_counts = pd.Series(dtype=np.int64)
+    for chunk in sa.iter_comment_chunks(path, chunksize, columns=['Sentiment_Score', 'Sentiment_Category']):
+        hist_counts += np.histogram(chunk['Sentiment_Score'], bins=bin_edges)[0]
+        category_counts = category_counts.add(chunk['Sentiment_Category'].value_counts(), fill_value=0)
+    return hist_counts, category_counts
+
+def run_pipeline(channel_url, output_dir, video_limit=5, comments_per_video=100, max_workers=4,
+                 requests_per_second=None, workers=1, queue_size=4, output_format='csv', cache=None,
+                 store=None, charts=True, downloader_factory=gd.YoutubeCommentDownloader, videos=None,
+                 scheduler=None):
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+
+    fetched = queue.Queue(maxsize=queue_size)
+    scored = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+    errors = []
+    stats = {'fetch': 0.0, 'score': 0.0, 'store': 0.0, 'rows': 0, 'batches': 0,
+             'max_fetched': 0, 'max_scored': 0}
+
+    def on_video(rows, ack):
+        if not rows:
+            ack()
+            return True
+        try:
+            put(fetched, (rows, ack), stop, stats, 'max_fetched')
+        except PipelineStopped:
+            return False
+        return True
+
+    run = {}
+
+    def fetch_stage():
+        start = time.perf_counter()
+        try:
+            run['run_id'] = gd.get_channel_comments(channel_url, video_limit, comments_per_video, max_workers=max_workers,
+                                    requests_per_second=requests_per_second,
+                                    downloader_factory=downloader_factory, videos=videos, store=store,
+                                    scheduler=scheduler, on_video=on_video)
+        except Exception as e:
+            errors.append(e)
+            stop.set()
+        finally:
+            stats['fetch'] = time.perf_counter() - start
+            try:
+                put(fetched, DONE, stop, stats, 'max_fetched')
+            except PipelineStopped:
+                pass
+
+    def score_stage():
+        executor = sa.make_pool(workers) if workers > 1 else None
+        try:
+            # Load the SnowNLP model while the first video is still being fetched
+            sa.load_snownlp()
+            while (item := get(fetched, stop)) is not DONE:
+                rows, ack = item
+                start = time.perf_counter()
+                df = pd.DataFrame(rows)
+                df['Sentiment_Score'] = sa.score_batch(df['Content'], workers=workers, executor=executor,
+                                                       cache=cache)
+                df['Sentiment_Category'] = sa.categorize_scores(df['Sentiment_Score'])
+                stats['score'] += time.perf_counter() - start
+                put(scored, (df, ack), stop, stats, 'max_scored')
+            put(scored, DONE, stop, stats, 'max_scored')
+        except PipelineStopped:
+            pass
+        except Exception as e:
+            errors.append(e)
+            stop.set()
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+    threads = [threading.Thread(target=fetch_stage, daemon=True), threading.Thread(target=score_stage, daemon=True)]
+    wall_start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+
+    # Store stage: same outputs as analyze_streaming
+    bin_edges = np.linspace(0.0, 1.0, sa.HIST_BINS + 1)
+    hist_counts = np.zeros(sa.HIST_BINS, dtype=np.int64)
+    category_counts = pd.Series(dtype=np.int64)
+    try:
+        while (item := get(scored, stop)) is not DONE:
+            df, ack = item
+            start = time.perf_counter()
+            output_path = sa.save_results(df, output_dir, output_format, chunk_index=stats['batches'],
+                                          append=store is not None)
+            ack()
+            hist_counts += np.histogram(df['Sentiment_Score'], bins=bin_edges)[0]
+            category_counts = category_counts.add(df['Sentiment_Category'].value_counts(), fill_value=0)
+            stats['batches'] += 1
+            stats['rows'] += len(df)
+            stats['store'] += time.perf_counter() - start
+    except PipelineStopped:
+        pass
+    except BaseException:
+        stop.set()
+        raise
+    finally:
+        for thread in threads:
+            thread.join()
+    stats['wall'] = time.perf_counter() - wall_start
+    if errors:
+        raise errors[0]
+    if store is not None and not stop.is_set():
+        store.finish_run(run['run_id'])
+
+    if stats['rows'] and charts:
+        if store is not None:
+            hist_counts, category_counts = output_totals(output_path, bin_edges)
+        category_counts = category_counts.astype(np.int64).sort_values(ascending=False)
+        category_counts = category_counts.rename_axis('Sentiment_Category').rename('count')
+        sa.save_charts(hist_counts, bin_edges, category_counts, output_dir)
+    return stats
+
+def format_stats(stats):
+    return (f"{stats['rows']} rows in {stats['batches']} batches, wall {stats['wall']:.2f}s "
+            f"(fetch {stats['fetch']:.2f}s, score {stats['score']:.2f}s, store {stats['store']:.2f}s busy; "
+            f"max queued {stats['max_fetched']} fetched / {stats['max_scored']} scored batches)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fetch, score and store a channel's comments as a pipeline")
+    parser.add_argument('--channel', default=gd.CHANNEL_URL)
+    parser.add_argument('output_folder', nargs='?', default="project/sentiment_analysis_results")
+    parser.add_argument('--videos', type=int, default=gd.VIDEO_LIMIT)
+    parser.add_argument('--comments', type=int, default=gd.COMMENTS_PER_VIDEO, help="Comments per video")
+    parser.add_argument('--fetch-workers', type=int, default=gd.MAX_WORKERS)
+    parser.add_argument('--rate', type=float, default=gd.REQUESTS_PER_SECOND, help="Requests/s per YouTube endpoint")
+    parser.add_argument('--workers', type=int, default=1, help="Number of processes used for sentiment scoring")
+    parser.add_argument('--queue-size', type=int, default=4, help="Batches buffered between stages")
+    parser.add_argument('--format', choices=['csv', 'parquet'], default='csv')
+    parser.add_argument('--cache', help="SQLite file for the persistent sentiment score cache")
+    parser.add_argument('--state', help="Checkpoint store for an incremental crawl (e.g. crawl_state.sqlite)")
+    parser.add_argument('--no-charts', action='store_true', help="Only write the scores; skip the charts")
+    args = parser.parse_args()
+
+    cache = sa.ScoreCache(args.cache) if args.cache else None
+    store = gd.CheckpointStore(args.state) if args.state else None
+    try:
+        stats = run_pipeline(args.channel, args.output_folder, args.videos, args.comments,
+                             max_workers=args.fetch_workers, requests_per_second=args.rate, workers=args.workers,
+                             queue_size=args.queue_size, output_format=args.format, cache=cache, store=store,
+                             charts=not args.no_charts)
+        print(f"Pipeline complete: {format_stats(stats)}")
+    finally:
+        if cache is not None:
+            cache.close()
+        if store is not None:
+            store.close()